@@ -1,17 +1,20 @@
 import difflib
+import multiprocessing
 import os
 import random
 import re
 from pathlib import Path
 from shutil import copyfile
-from typing import List, Union
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
-import jsonlines
 import numpy as np
 import pandas as pd
 from pandas import DataFrame
 from PIL import Image, ImageEnhance, ImageFilter
 
+from comics_net.character_map import semicolon_aliases
+from comics_net.jsonl import CHUNK_SIZE, iter_frames, read_frame
+
 # flatten a list of lists
 flatten = lambda l: [item for sublist in l for item in sublist]
 
@@ -32,17 +35,28 @@ def save_im(im: Image, save_to: str, im_type: str = "jpeg") -> None:
 
 
 # TODO: deprecate this method in favor of load_jsonl()
-def load_metadata(metadata_path: str) -> DataFrame:
+def load_metadata(
+    metadata_path: str,
+    columns: Optional[List[str]] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> DataFrame:
     """
-    Given a path to some metadata return the metadata in a DataFrame.
+    Given a path to some metadata return the metadata in a DataFrame, with only the
+    given columns. Records are read `chunk_size` at a time.
     """
-    logged_metadata = []
+    return read_frame(metadata_path, columns, chunk_size)
 
-    with jsonlines.open(metadata_path, mode="r") as reader:
-        for item in reader:
-            logged_metadata.append(item)
 
-    return pd.DataFrame(logged_metadata)
+def load_metadata_chunks(
+    metadata_path: str,
+    chunk_size: int = CHUNK_SIZE,
+    columns: Optional[List[str]] = None,
+) -> Iterator[DataFrame]:
+    """
+    Given a path to some metadata yield the metadata in DataFrames of up to
+    `chunk_size` rows, with only the given columns.
+    """
+    return iter_frames(metadata_path, chunk_size, columns)
 
 
 def get_issue_number_from_title(title: str) -> Union[int, None]:
@@ -68,55 +82,52 @@ def match_brackets(characters: str) -> dict:
     return matches
 
 
+def literals_pattern(literals: List[str]) -> str:
+    """
+    Given a list of literal strings return a regex matching any of them, nested as
+    a trie so that matching costs the same however many literals there are.
+    """
+    trie: dict = {}
+    for literal in literals:
+        node = trie
+        for c in literal:
+            node = node.setdefault(c, {})
+        node[""] = {}
+
+    def to_pattern(node: dict) -> str:
+        # a literal ending here is a match, whatever follows it
+        if "" in node:
+            return ""
+        alternatives = [re.escape(c) + to_pattern(node[c]) for c in sorted(node)]
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    return to_pattern(trie) if len(trie) > 0 else "(?!)"
+
+
+BRACKETS = re.compile(r"\[(.*?)\]")
+
+SEMICOLON_ALIASES = re.compile(literals_pattern(semicolon_aliases))
+
+
 def replace_semicolons_in_brackets(characters: str):
     """
     Some character aliases contain a semicolon, for example: Superman [Clark Kent; Kal-El].
     Because we use semicolons as a character delimiter, we need to find and replace
-    instances where the semicolon is not a character delimiter.
+    instances where the semicolon is not a character delimiter; these are the
+    bracketed spans with a single semicolon matching one of
+    `character_map.semicolon_aliases`, rewritten wherever they appear.
     """
-    p = re.compile(r"\[(.*?)\]")
-    matches = []
-    for m in p.finditer(characters):
-        matches.append((m.start(), m.end(), m.group()))
-    for match in matches:
-        substring = characters[match[0] : match[1]]
-        if substring.count(";") == 1 and (
-            ("also as" in substring)
-            | ("Kal-El" in substring)
-            | ("Kal-L" in substring)
-            | ("Kara Zor-El" in substring)
-            | ("Martin Stein" in substring)
-            | ("Etrigan" in substring)
-            | ("James Howlett" in substring)
-            | ("Gwendolyne Stacy" in substring)
-            | ("Gwen Stacy" in substring)
-            | ("Katar Hol" in substring)
-            | ("Shayera Hol" in substring)
-            | ("Kon-El" in substring)
-            | ("Laura Kinney" in substring)
-            | ("Kory Ander" in substring)
-            | ("Bruce Banner" in substring)
-            | ("Eobard Thawne" in substring)
-            | ("Victor von Doom" in substring)
-            | ("as Cat-Woman" in substring)
-            | ("also as Task Force X" in substring)
-            | ("Diana Prince" in substring)
-            | ("Nathan Dayspring" in substring)
-            | ("Susan Storm; Susan Richards" in substring)
-            | ("Warren Worthington III" in substring)
-            | ("Copycat" in substring)
-            | ("Tornado Tyrant" in substring)
-            | ("Bro'Dee Walker" in substring)
-            | ("Ke'Haan" in substring)
-            | ("Flash; Barry Allen" in substring)
-            | ("Jennie-Lynn Hayden" in substring)
-            | ("Donald Blake" in substring)
-            | ("Thor Odinson; " in substring)
-        ):
-            characters = characters.replace(substring, substring.replace(";", "/"))
-        if substring.count(";") > 1:
-            pass
-    return characters
+    t = characters
+    for m in BRACKETS.finditer(characters):
+        # read the span back from the rewritten string, as an earlier rewrite of the
+        # same alias may have reached into it
+        substring = t[m.start() : m.end()]
+        if substring.count(";") == 1 and SEMICOLON_ALIASES.search(substring):
+            # rewrite the alias wherever it appears, nested in a team too
+            t = t.replace(substring, substring.replace(";", "/"))
+    return t
 
 
 def look_behind(s: str, end_idx: int) -> str:
@@ -161,90 +172,264 @@ def diff_strings(string1, string2):
     return diff
 
 
+# the delimiters of a character string: brackets around aliases or team members, and
+# semicolons between characters
+CHARACTER_DELIMITERS = re.compile(r"[\[\];]")
+
+
+def parse_characters(characters: str) -> dict:
+    """
+    Given a character string return a dict of its teams, by team name, and the
+    individuals outside of any team. The string is parsed in a single pass over its
+    brackets and semicolons; a bracketed span with more than one semicolon is a team,
+    and the rest of the string splits into individuals.
+    """
+    t = replace_semicolons_in_brackets(characters)
+
+    teams: dict = {}
+    remainder = []
+    depth = 0
+    after_semicolon = 0
+    name_start = 0
+    open_idx = 0
+    kept = 0
+    for m in CHARACTER_DELIMITERS.finditer(t):
+        c, i = m.group(), m.start()
+        if c == ";":
+            after_semicolon = i + 1
+        elif c == "[":
+            if depth == 0:
+                name_start = after_semicolon
+                open_idx = i + 1
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                entity = t[open_idx:i]
+                if entity.count(";") > 1:
+                    name = t[name_start : open_idx - 1]
+                    # a team named twice keeps the members of both
+                    teams.setdefault(name.strip(), []).extend(
+                        filter(lambda x: x != "", entity.split("; "))
+                    )
+                    # cut the team, name and all, out of the individuals
+                    cut = max(name_start + len(name) - len(name.lstrip()), kept)
+                    remainder.append(t[kept:cut])
+                    kept = i + 1
+    remainder.append(t[kept:])
+
+    return {
+        "Teams": teams,
+        "Individuals": list(filter(lambda x: x != "", "".join(remainder).split("; "))),
+    }
+
+
 def convert_characters_to_list(characters: str) -> list:
     """
     Given a character string return the parsed list of unique characters.
     """
-    t = replace_semicolons_in_brackets(characters)
+    character_dict = parse_characters(characters)
+
+    character_list = []
+    for k in character_dict["Teams"]:
+        character_list.append(character_dict["Teams"][k])
 
-    stack = 0
-    startIndex = None
-    results = []
+    character_list.append(character_dict["Individuals"])
 
-    # TODOL: pull this out into it's own function
-    matches = []
-    for i, c in enumerate(t):
-        if c == "[":
-            if stack == 0:
-                startIndex = i + 1  # string to extract starts one index later
+    return flatten(character_list)
 
-            # push to stack
-            stack += 1
-        elif c == "]":
-            # pop stack
-            stack -= 1
 
-            if stack == 0:
-                matches.append((startIndex, i))
-                results.append(t[startIndex:i])
+# a character name and its bracketed alias, e.g. Batman [Bruce Wayne]
+CHARACTER_ALIAS = re.compile(r"^(.*?)\s*\[(.*)\]\s*$", re.S)
 
-    character_dict: dict = {}
-    character_dict["Teams"] = {}
-    character_dict["Individuals"] = {}
+# columns of the table of parsed characters
+CHARACTER_COLUMNS = ["row_id", "team", "character", "alias"]
 
-    for span in matches:
-        entity = t[span[0] : span[1]]
-        if entity.count(";") == 0:
-            person_name = look_behind(t, span[0])
-            person_identity = entity
-            character_dict["Individuals"][person_name] = person_identity
+# number of distinct character strings sent to a parsing process at once
+PARSE_CHUNK_SIZE = 1000
 
-        elif entity.count(";") > 1:
-            team_name = look_behind(t, span[0])
-            team_members = list(filter(lambda x: x != "", entity.split("; ")))
-            character_dict["Teams"][team_name] = team_members
 
-    team_string = convert_character_dict_to_str(character_dict)
+def split_alias(name: str) -> Tuple[str, Optional[str]]:
+    """
+    Given a character name return the name without its bracketed alias, and the
+    alias (or None).
+    """
+    m = CHARACTER_ALIAS.match(name)
+    if m is None:
+        return name.strip(), None
+    return m.group(1).strip(), m.group(2).strip()
 
-    remainder = diff_strings(team_string, t)
 
-    remainder = list(filter(lambda x: x != "", remainder.split("; ")))
+def character_rows(characters: str) -> List[Tuple[Optional[str], str, Optional[str]]]:
+    """
+    Given a character string return a (team, character, alias) tuple for every
+    character in it, in the order of convert_characters_to_list; the team of an
+    individual is None.
+    """
+    character_dict = parse_characters(characters)
+    rows = []
+    for team, members in character_dict["Teams"].items():
+        rows.extend((team,) + split_alias(x) for x in members)
+    rows.extend((None,) + split_alias(x) for x in character_dict["Individuals"])
+    return rows
 
-    character_dict["Individuals"] = remainder
 
-    character_list = []
-    for k in character_dict["Teams"]:
-        character_list.append(character_dict["Teams"][k])
+def parse_characters_column(characters: pd.Series, processes: int = 1) -> DataFrame:
+    """
+    Given a column of character strings (e.g. cover_characters) return a table of
+    their characters, a (row_id, team, character, alias) row per character, where
+    row_id is the index of the string in the column. Missing values have no rows.
 
-    character_list.append(character_dict["Individuals"])
+    Each distinct string is parsed once, on `processes` processes if more than one,
+    and its rows are repeated for every row of the column with that string.
+    """
+    codes, uniques = pd.factorize(characters)
+    if processes > 1 and len(uniques) > PARSE_CHUNK_SIZE:
+        with multiprocessing.Pool(processes) as pool:
+            parsed = pool.map(character_rows, uniques, chunksize=PARSE_CHUNK_SIZE)
+    else:
+        parsed = [character_rows(x) for x in uniques]
+
+    # the rows of the distinct strings, one after another
+    table = [row for rows in parsed for row in rows]
+    lengths = np.array([len(rows) for rows in parsed] + [0], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+
+    # missing values have code -1, which takes the trailing 0 rows
+    counts = lengths[codes]
+    total = int(counts.sum())
+    starts = np.cumsum(counts) - counts
+    take = np.repeat(offsets[codes], counts) + (
+        np.arange(total) - np.repeat(starts, counts)
+    )
 
-    return flatten(character_list)
+    columns = list(zip(*table)) if len(table) > 0 else [(), (), ()]
+    df = pd.DataFrame({"row_id": np.repeat(characters.index.to_numpy(), counts)})
+    for name, values in zip(CHARACTER_COLUMNS[1:], columns):
+        df[name] = np.array(values, dtype=object)[take]
+    return df
 
 
-def get_random_sample_of_covers(df_covers: DataFrame, character: str, n: int) -> dict:
+class CharacterIndex:
+    """
+    Inverted index of the covers of a DataFrame by character: the positions of the
+    rows each character is in, ascending, so the covers of a character are
+    sampled without scanning the DataFrame. Also holds, for every row, the
+    position of the first row with the same image, whose characters are the ones
+    of the cover.
+
+    Build it once with `build` and keep it with `save`/`load`; it is only valid
+    for the DataFrame (and row order) it was built from.
+    """
+
+    def __init__(self, postings: Dict[str, np.ndarray], first_rows: np.ndarray) -> None:
+        self.postings = postings
+        self.first_rows = first_rows
+
+    @classmethod
+    def build(
+        cls, df_covers: DataFrame, column: str = "cover_characters_list_aliases"
+    ) -> "CharacterIndex":
+        """
+        Given a DataFrame of covers with a column of lists of characters return the
+        index of its rows by character.
+        """
+        exploded = pd.Series(list(df_covers[column]), dtype=object).explode()
+        exploded = exploded.dropna()
+        pairs = pd.DataFrame(
+            {"character": exploded.to_numpy(), "row": exploded.index.to_numpy()}
+        ).drop_duplicates()
+        rows = pairs["row"].to_numpy(dtype=np.int64)
+        postings = {
+            character: rows[i]
+            for character, i in pairs.groupby("character", sort=False).indices.items()
+        }
+
+        codes, uniques = pd.factorize(df_covers["save_to"])
+        positions = np.arange(len(codes), dtype=np.int64)
+        # the first position of each image; missing images (code -1) are their own
+        image_codes, first = np.unique(codes, return_index=True)
+        found = image_codes >= 0
+        first_of_image = np.zeros(len(uniques), dtype=np.int64)
+        first_of_image[image_codes[found]] = positions[first[found]]
+        first_rows = np.where(codes == -1, positions, first_of_image[codes])
+        return cls(postings, first_rows)
+
+    def rows(self, character: str) -> np.ndarray:
+        """
+        Given a character return the positions of the rows it is in.
+        """
+        return self.postings.get(character, np.zeros(0, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self.first_rows)
+
+    def save(self, path: str) -> None:
+        """
+        Save the index to a numpy archive at path.
+        """
+        characters = list(self.postings)
+        rows = [np.zeros(0, dtype=np.int64)] + [self.postings[c] for c in characters]
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                characters=np.array(characters, dtype=str),
+                offsets=np.cumsum([len(x) for x in rows], dtype=np.int64),
+                rows=np.concatenate(rows),
+                first_rows=self.first_rows,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "CharacterIndex":
+        """
+        Load an index saved at path.
+        """
+        with np.load(path) as archive:
+            characters = archive["characters"].tolist()
+            offsets = archive["offsets"]
+            rows = archive["rows"]
+            first_rows = archive["first_rows"]
+        postings = {
+            c: rows[offsets[i] : offsets[i + 1]] for i, c in enumerate(characters)
+        }
+        return cls(postings, first_rows)
+
+
+def get_random_sample_of_covers(
+    df_covers: DataFrame,
+    character: str,
+    n: int,
+    index: Optional[CharacterIndex] = None,
+) -> dict:
     """
     Given a DataFrame of covers (TODO: specify that schema) and a character return a
     dict (TODO: specify that schema) of n randomly sampled covers for that character.
+    The covers are looked up in the character index of the DataFrame, which is built
+    if not given.
     """
-    df_covers = df_covers[
-        df_covers["cover_characters_list_aliases"].apply(lambda x: character in x)
-    ].reset_index(drop=True)
-    s = list(range(0, max(df_covers.index)))
-    random.shuffle(s)
+    if index is None:
+        index = CharacterIndex.build(df_covers)
+    elif len(index) != len(df_covers):
+        raise ValueError(
+            "The character index has {} rows but the covers have {}".format(
+                len(index), len(df_covers)
+            )
+        )
+
+    rows = index.rows(character)
+    image_paths = df_covers["save_to"]
+    characters = df_covers["cover_characters_list_aliases"]
+    synopses = df_covers["synopsis"]
 
     covers: dict = dict()
-    for i in s[:n]:
+    for i in random.sample(range(len(rows)), min(n, len(rows))):
+        row = rows[i]
         covers["cover_{}".format(i)] = {}
-
-        image_path = df_covers["save_to"].iloc[i]
-        characters = df_covers[df_covers["save_to"] == image_path][
-            "cover_characters_list_aliases"
-        ].iloc[0]
-        synopsis = df_covers["synopsis"].iloc[i]
-
-        covers["cover_{}".format(i)]["image_path"] = image_path
-        covers["cover_{}".format(i)]["characters"] = characters
-        covers["cover_{}".format(i)]["synopsis"] = synopsis
+        covers["cover_{}".format(i)]["image_path"] = image_paths.iloc[row]
+        covers["cover_{}".format(i)]["characters"] = characters.iloc[
+            index.first_rows[row]
+        ]
+        covers["cover_{}".format(i)]["synopsis"] = synopses.iloc[row]
 
     return covers
 
@@ -263,17 +448,24 @@ def get_random_sample_of_covers(df_covers: DataFrame, character: str, n: int) ->
 
 
 def create_training_dirs(
-    df_cover_characters: DataFrame, characters_dict: dict, save_dir: str
+    df_cover_characters: DataFrame,
+    characters_dict: dict,
+    save_dir: str,
+    index: Optional[CharacterIndex] = None,
 ):
     """
     Given a DataFrame of covers (TODO: specify that schema) and a dict of characters to
     create a dataset for, create two directories  (images/ & annotations/) containing
     randomly sampled covers from those characters w/ annotations (labels & synopses).
+    The character index of the DataFrame is built once if not given.
     """
+    if index is None:
+        index = CharacterIndex.build(df_cover_characters)
+
     cover_samples = {}
     for character in characters_dict:
         cover_samples[character] = get_random_sample_of_covers(
-            df_cover_characters, character, n=characters_dict[character]
+            df_cover_characters, character, n=characters_dict[character], index=index
         )
         for cover in cover_samples[character]:
             indices = [
@@ -0,0 +1,276 @@
+"Asyncio crawl engine for scraping comic book covers and metadata from comics.org"
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional
+
+from bs4 import BeautifulSoup
+
+import comics_net.webscraper as webscraper
+from comics_net.downloader import CoverDownloader
+from comics_net.frontier import DONE, Frontier, Item, expand
+from comics_net.parse_pool import ParsePool
+from comics_net.sink import MetadataSink
+from comics_net.store import MetadataStore
+
+
+class _Turn:
+    """
+    The place of an issue in crawl order. An issue waits for the issue before it
+    to be deduped before deduping itself, and to be written before writing itself.
+    """
+
+    def __init__(self, previous: Optional["_Turn"] = None) -> None:
+        self.previous = previous
+        self.decided = asyncio.Event()
+        self.written = asyncio.Event()
+
+    async def wait(self, name: str) -> None:
+        if self.previous is not None:
+            await getattr(self.previous, name).wait()
+
+    async def finish(self) -> None:
+        for name in ["decided", "written"]:
+            if not getattr(self, name).is_set():
+                await self.wait(name)
+                getattr(self, name).set()
+        self.previous = None
+
+
+class AsyncScraper:
+    """
+    Crawl the frontier from a publisher page with a bounded number of requests in
+    flight.
+
+    Blocking page requests run on a thread pool over the shared pooled client, so
+    `concurrency` caps the pages in flight while the client's rate limiter keeps
+    to the politeness budget, and cover images download on the downloader's pool.
+    Issues are still deduped and written in crawl order, so the metadata and images
+    match the sync engine's. Pages the frontier has done are not fetched again.
+    Issue and cover pages are parsed on the parse pool, if given, keeping the event
+    loop and request threads free of parsing. Metadata is written in batches, and
+    an issue is only marked done once its metadata is written (and appended to the
+    metadata store, if given).
+    """
+
+    def __init__(
+        self,
+        downloader: CoverDownloader,
+        frontier: Frontier,
+        dedup_index: webscraper.DuplicateIndex,
+        metadata_path: str,
+        concurrency: int = 4,
+        parse_pool: Optional[ParsePool] = None,
+        store: Optional[MetadataStore] = None,
+    ) -> None:
+        self.downloader = downloader
+        self.frontier = frontier
+        self.dedup_index = dedup_index
+        self.metadata_path = metadata_path
+        self.sink = MetadataSink(metadata_path, store=store)
+        self.concurrency = concurrency
+        self.parse_pool = parse_pool
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def _call(self, fn, *args):
+        """
+        Run a blocking request on the thread pool.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def get_soup(self, url: str, page: Optional[str] = None) -> BeautifulSoup:
+        return await self._call(webscraper.get_soup, url, page)
+
+    async def parse(self, fn, *args):
+        """
+        Run a parse of raw HTML on the parse pool, or on the thread pool if it has no
+        processes.
+        """
+        if self.parse_pool is None or self.parse_pool.processes == 0:
+            return await self._call(fn, *args)
+        return await asyncio.wrap_future(self.parse_pool.submit(fn, *args))
+
+    async def get_cover_credits(self, cover_url: str, metadata: dict) -> dict:
+        """
+        Return the credits and image urls of the covers of an issue, fetching its
+        cover page and the issue pages of its variants concurrently.
+        """
+        raw_html = await self._call(webscraper.simple_get, cover_url)
+        covers = await self.parse(webscraper.parse_cover_page, raw_html)
+        variant_names = webscraper.get_variant_names(covers)
+
+        variant_pages = await asyncio.gather(
+            *[
+                self._call(webscraper.simple_get, covers[x]["cover_url"])
+                for x in variant_names
+            ]
+        )
+        cover_credits = await asyncio.gather(
+            *[
+                self.parse(
+                    webscraper.parse_variant_page,
+                    raw_html,
+                    metadata,
+                    variant_name,
+                    covers[variant_name]["image_url"],
+                )
+                for variant_name, raw_html in zip(variant_names, variant_pages)
+            ]
+        )
+        return {"covers": dict(cover_credits)}
+
+    async def visit(self, url: str, kind: str, payload: dict) -> List[Item]:
+        """
+        Return the urls found on a page, fetching it unless the frontier has it done.
+        """
+        if self.frontier.state(url) == DONE:
+            return self.frontier.children(url)
+
+        self.frontier.start(url)
+        try:
+            soup = await self.get_soup(url, kind)
+            children = expand(url, kind, payload, soup)
+        except Exception as e:
+            logging.exception("Failed to crawl {}".format(url))
+            self.frontier.fail(url, repr(e))
+            return []
+        self.frontier.done(url, children)
+        return children
+
+    async def get_issues(self, url: str, kind: str, payload: dict) -> List[Item]:
+        """
+        Return the issues to crawl under a page in crawl order, visiting the pages
+        in between concurrently.
+        """
+        children = await self.visit(url, kind, payload)
+        pages = [child for child in children if child[1] != "issue"]
+        page_issues = iter(
+            await asyncio.gather(*[self.get_issues(*page) for page in pages])
+        )
+
+        issues = []
+        for child in children:
+            if child[1] == "issue":
+                issues.append(child)
+            else:
+                issues.extend(next(page_issues))
+        return issues
+
+    async def scrape_issue(
+        self, issue_url: str, series_name: str, turn: _Turn
+    ) -> Optional[dict]:
+        """
+        Scrape the metadata and cover images of an issue, unless it is a duplicate of
+        an issue already pulled. Return the metadata saved, if any.
+        """
+        claimed = False
+        try:
+            self.frontier.start(issue_url)
+            raw_html = await self._call(webscraper.simple_get, issue_url)
+            metadata, cover_url = await self.parse(
+                webscraper.parse_issue_page, raw_html, series_name
+            )
+
+            logging.info("Scraping {} from {}".format(metadata["title"], issue_url))
+
+            # check if issue is redundant to an issue already pulled, claiming it if not
+            await turn.wait("decided")
+            title, on_sale_date = metadata["title"], metadata["on_sale_date"]
+            is_duplicate = self.dedup_index.is_duplicate(title, on_sale_date)
+            if not is_duplicate:
+                self.dedup_index.add(title, on_sale_date)
+                claimed = True
+            turn.decided.set()
+
+            if is_duplicate:
+                logging.info("Not pulling {} because it is a duplicate".format(title))
+                self.frontier.done(issue_url)
+                return None
+
+            metadata.update(await self.get_cover_credits(cover_url, metadata))
+
+            await asyncio.gather(
+                *[
+                    asyncio.wrap_future(future)
+                    for future in webscraper.save_cover_images(
+                        metadata, self.downloader
+                    )
+                ]
+            )
+
+            await turn.wait("written")
+            self.sink.write(metadata, partial(self.frontier.done, issue_url))
+            return metadata
+        except Exception as e:
+            logging.exception("Failed to crawl {}".format(issue_url))
+            self.frontier.fail(issue_url, repr(e))
+            if claimed:
+                self.dedup_index.discard(title, on_sale_date)
+            return None
+        finally:
+            await turn.finish()
+
+    async def run(self, root: str) -> int:
+        """
+        Crawl the frontier from `root`. Return the number of issues saved.
+        """
+        issues = await self.get_issues(*self.frontier.get(root))
+
+        jobs = []
+        turn = None
+        for issue_url, _, payload in issues:
+            if self.frontier.state(issue_url) != DONE:
+                turn = _Turn(turn)
+                jobs.append((issue_url, payload["series_name"], turn))
+
+        # a fixed set of workers takes issues in crawl order, so an issue is only
+        # started once every issue before it has been
+        saved = []
+        pending = iter(jobs)
+
+        async def worker() -> None:
+            for issue_url, series_name, turn in pending:
+                metadata = await self.scrape_issue(issue_url, series_name, turn)
+                if metadata is not None:
+                    saved.append(metadata)
+
+        await asyncio.gather(*[worker() for _ in range(self.concurrency)])
+        return len(saved)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.sink.close()
+
+
+def run_async_scraper(
+    root: str,
+    frontier: Frontier,
+    dedup_index: webscraper.DuplicateIndex,
+    downloader: CoverDownloader,
+    metadata_path: str,
+    concurrency: int = 4,
+    parse_pool: Optional[ParsePool] = None,
+    store: Optional[MetadataStore] = None,
+) -> int:
+    """
+    Run the asyncio crawl engine over the frontier from `root` to completion. Return
+    the number of issues saved.
+    """
+    scraper = AsyncScraper(
+        downloader,
+        frontier,
+        dedup_index,
+        metadata_path,
+        concurrency,
+        parse_pool,
+        store,
+    )
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(scraper.run(root))
+    finally:
+        loop.close()
+        scraper.close()
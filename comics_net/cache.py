@@ -0,0 +1,294 @@
+"On-disk cache of HTML pages fetched from htpps://www.comics.org"
+
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Callable, List, Optional, Pattern, Tuple
+
+# time to live (in seconds) of cached pages by url class, first match wins
+DAY = 24 * 3600
+DEFAULT_TTLS = [
+    (r"/publisher/", DAY),
+    (r"/series/\d+/covers/", DAY),
+    (r"/series/", DAY),
+    (r"/issue/\d+/cover/", 30 * DAY),
+    (r"/issue/", 7 * DAY),
+]
+
+
+class CacheEntry:
+    """
+    A cached response: the digest of its body plus the validators to revalidate it.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        digest: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        fetched_at: float,
+    ) -> None:
+        self.url = url
+        self.digest = digest
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = fetched_at
+
+    def validators(self) -> dict:
+        """
+        Return the headers of a conditional GET for this entry.
+        """
+        headers = {}
+        if self.etag is not None:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified is not None:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    A size-capped, content-addressed cache of response bodies.
+
+    Bodies are stored once per sha256 digest under `cache_dir/objects/` and an
+    SQLite index maps each url to its body, ETag/Last-Modified and fetch time.
+    Entries are fresh for the TTL of their url class; stale entries are revalidated
+    with a conditional GET, unless `replay` is set in which case any entry is served
+    as is. Once the bodies exceed `max_bytes` the least recently used are evicted.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_bytes: int = 1024 ** 3,
+        ttls: Optional[List[Tuple[str, float]]] = None,
+        default_ttl: float = DAY,
+        replay: bool = False,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttls: List[Tuple[Pattern, float]] = [
+            (re.compile(pattern), ttl)
+            for pattern, ttl in (DEFAULT_TTLS if ttls is None else ttls)
+        ]
+        self.default_ttl = default_ttl
+        self.replay = replay
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        # shared by the worker processes of a job, like the frontier
+        self._db = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite"), timeout=60, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries (url TEXT PRIMARY KEY, "
+                "digest TEXT, etag TEXT, last_modified TEXT, fetched_at REAL, "
+                "accessed_at REAL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed_at "
+                "ON entries (accessed_at)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS objects "
+                "(digest TEXT PRIMARY KEY, size INTEGER)"
+            )
+
+    def ttl(self, url: str) -> float:
+        """
+        Return the time to live of the url class of `url`.
+        """
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "objects", digest[:2], digest)
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        """
+        Return the cache entry of `url`, if any.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest, etag, last_modified, fetched_at FROM entries "
+                "WHERE url = ?",
+                (url,),
+            ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(url, *row)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """
+        Check if an entry can be served without revalidating it.
+        """
+        return self.replay or self._clock() - entry.fetched_at < self.ttl(entry.url)
+
+    def _read(self, entry: CacheEntry) -> Optional[bytes]:
+        """
+        Return the body of a cache entry and mark it as recently used.
+        """
+        try:
+            with open(self._object_path(entry.digest), "rb") as f:
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE entries SET accessed_at = ? WHERE url = ?",
+                (self._clock(), entry.url),
+            )
+        return body
+
+    def hit(self, entry: CacheEntry) -> Optional[bytes]:
+        """
+        Return the body of a fresh entry, if it is still on disk.
+        """
+        body = self._read(entry)
+        if body is not None:
+            self.hits += 1
+        return body
+
+    def revalidated(self, entry: CacheEntry) -> Optional[bytes]:
+        """
+        Restart the TTL of an entry the server said has not been modified and
+        return its body, if it is still on disk.
+        """
+        now = self._clock()
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE entries SET fetched_at = ? WHERE url = ?", (now, entry.url)
+            )
+        body = self._read(entry)
+        if body is not None:
+            self.revalidations += 1
+        return body
+
+    def store(self, url: str, body: bytes, headers) -> None:
+        """
+        Cache the body and validators of a response to `url`.
+        """
+        self.misses += 1
+        digest = hashlib.sha256(body).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            # a temporary file of its own, as other processes may store it too
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(object_path), suffix=".tmp"
+            )
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, object_path)
+
+        now = self._clock()
+        with self._lock, self._db:
+            replaced = self._db.execute(
+                "SELECT digest FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    digest,
+                    headers.get("ETag"),
+                    headers.get("Last-Modified"),
+                    now,
+                    now,
+                ),
+            )
+            self._db.execute(
+                "INSERT OR IGNORE INTO objects VALUES (?, ?)", (digest, len(body))
+            )
+            # the body the entry had before may no longer be used
+            released = []
+            if replaced is not None and self._release(replaced[0]) is not None:
+                released.append(replaced[0])
+        self._remove(released)
+        self.evict()
+
+    def size(self) -> int:
+        """
+        Return the total size of the cached bodies in bytes.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects")
+            return row.fetchone()[0]
+
+    def _release(self, digest: str) -> Optional[int]:
+        """
+        Drop the body of `digest` from the index if no entry uses it any more.
+        Return its size if it was dropped. Call in a transaction.
+        """
+        if self._db.execute(
+            "SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)
+        ).fetchone():
+            return None
+        row = self._db.execute(
+            "SELECT size FROM objects WHERE digest = ?", (digest,)
+        ).fetchone()
+        self._db.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+        return 0 if row is None else row[0]
+
+    def _remove(self, digests: List[str]) -> None:
+        for digest in digests:
+            try:
+                os.remove(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def evict(self) -> None:
+        """
+        Evict the least recently used entries until the bodies fit in `max_bytes`,
+        in one transaction that walks only as many entries as it evicts.
+        """
+        released = []
+        with self._lock, self._db:
+            row = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM objects")
+            excess = row.fetchone()[0] - self.max_bytes
+            while excess > 0:
+                rows = self._db.execute(
+                    "SELECT url, digest FROM entries ORDER BY accessed_at LIMIT 64"
+                ).fetchall()
+                if len(rows) == 0:
+                    break
+                for url, digest in rows:
+                    if excess <= 0:
+                        break
+                    self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                    size = self._release(digest)
+                    if size is not None:
+                        released.append(digest)
+                        excess -= size
+        self._remove(released)
+
+    def stats(self) -> dict:
+        """
+        Return the hit, revalidation and miss counts and the size of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "revalidations": self.revalidations,
+            "misses": self.misses,
+            "bytes": self.size(),
+        }
+
+    def close(self) -> None:
+        self._db.close()
@@ -1257,3 +1257,40 @@ aliases = {
     "Zatanna Zatara": "Zatanna [Zatanna Zatara]",
     "Zatanna": "Zatanna [Zatanna Zatara]",
 }
+
+# aliases containing a semicolon that doesn't delimit characters, e.g. Superman
+# [Clark Kent; Kal-El]; a bracketed span with one semicolon and any of these in it is
+# an alias
+semicolon_aliases = [
+    "also as",
+    "Kal-El",
+    "Kal-L",
+    "Kara Zor-El",
+    "Martin Stein",
+    "Etrigan",
+    "James Howlett",
+    "Gwendolyne Stacy",
+    "Gwen Stacy",
+    "Katar Hol",
+    "Shayera Hol",
+    "Kon-El",
+    "Laura Kinney",
+    "Kory Ander",
+    "Bruce Banner",
+    "Eobard Thawne",
+    "Victor von Doom",
+    "as Cat-Woman",
+    "also as Task Force X",
+    "Diana Prince",
+    "Nathan Dayspring",
+    "Susan Storm; Susan Richards",
+    "Warren Worthington III",
+    "Copycat",
+    "Tornado Tyrant",
+    "Bro'Dee Walker",
+    "Ke'Haan",
+    "Flash; Barry Allen",
+    "Jennie-Lynn Hayden",
+    "Donald Blake",
+    "Thor Odinson; ",
+]
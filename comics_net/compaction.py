@@ -0,0 +1,202 @@
+"Compaction of the append-only metadata of htpps://www.comics.org into shards"
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from pandas import DataFrame
+
+from comics_net.jsonl import iter_jsonl, iter_lines, read_frame
+from comics_net.webscraper import DuplicateIndex
+
+MANIFEST = "manifest.json"
+
+# max size of a shard by default
+MAX_SHARD_BYTES = 64 * 2 ** 20
+
+
+def issue_key(record: dict) -> Tuple[str, str]:
+    """
+    Return the key an issue is deduped by, the same one the scraper dedups by.
+    """
+    return DuplicateIndex.key(record["title"], record["on_sale_date"])
+
+
+def last_writes(metadata_path: str) -> Dict[Tuple[str, str], int]:
+    """
+    Return the number of the last line of each issue in a metadata file.
+    """
+    last: Dict[Tuple[str, str], int] = {}
+    for lineno, record in enumerate(iter_jsonl(metadata_path, DuplicateIndex.KEYS)):
+        last[issue_key(record)] = lineno
+    return last
+
+
+def shard_name(generation: int, shard: int) -> str:
+    return "part-{:05d}-{:05d}.jsonl".format(generation, shard)
+
+
+def compact(
+    metadata_path: str,
+    out_dir: str,
+    max_shard_bytes: int = MAX_SHARD_BYTES,
+    in_place: bool = False,
+) -> dict:
+    """
+    Rewrite a metadata file into shards of up to `max_shard_bytes` (or one record,
+    if bigger) in `out_dir`, keeping only the last record of each issue, in file
+    order. Return the manifest of the shards.
+
+    Each compaction writes a new generation of shards and then swaps in its
+    manifest, so readers of the manifest never see partial shards; the shards of
+    earlier generations are removed after.
+
+    With `in_place`, the metadata file is also replaced by the compacted records;
+    don't do that while a crawl is writing to it.
+    """
+    # only the keys are decoded, then the lines kept are copied as they are
+    keep = set(last_writes(metadata_path).values())
+    os.makedirs(out_dir, exist_ok=True)
+    generation = 0
+    if os.path.exists(os.path.join(out_dir, MANIFEST)):
+        generation = read_manifest(out_dir)["generation"] + 1
+
+    shards: List[dict] = []
+    out = None
+    lines = 0
+    for lineno, line in enumerate(iter_lines(metadata_path)):
+        lines += 1
+        if lineno not in keep:
+            continue
+
+        line = line.rstrip(b"\r") + b"\n"
+        if out is None or (
+            shards[-1]["bytes"] > 0
+            and shards[-1]["bytes"] + len(line) > max_shard_bytes
+        ):
+            if out is not None:
+                out.close()
+            shards.append(
+                {"path": shard_name(generation, len(shards)), "records": 0, "bytes": 0}
+            )
+            out = open(os.path.join(out_dir, shards[-1]["path"]), "wb")
+        out.write(line)
+        shards[-1]["records"] += 1
+        shards[-1]["bytes"] += len(line)
+    if out is not None:
+        out.close()
+
+    manifest = {
+        "generation": generation,
+        "source": metadata_path,
+        "records": len(keep),
+        "dropped": lines - len(keep),
+        "shards": shards,
+    }
+    tmp_path = os.path.join(out_dir, MANIFEST + ".part")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(out_dir, MANIFEST))
+
+    current = set(shard["path"] for shard in shards)
+    for name in os.listdir(out_dir):
+        if name.startswith("part-") and name not in current:
+            os.remove(os.path.join(out_dir, name))
+
+    if in_place:
+        tmp_path = metadata_path + ".part"
+        with open(tmp_path, "wb") as f:
+            for path in shard_paths(out_dir):
+                with open(path, "rb") as shard:
+                    f.write(shard.read())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, metadata_path)
+    return manifest
+
+
+def read_manifest(out_dir: str) -> dict:
+    with open(os.path.join(out_dir, MANIFEST), "r") as f:
+        return json.load(f)
+
+
+def shard_paths(out_dir: str) -> List[str]:
+    """
+    Return the paths of the shards of a compaction, in record order.
+    """
+    return [
+        os.path.join(out_dir, shard["path"])
+        for shard in read_manifest(out_dir)["shards"]
+    ]
+
+
+def iter_shards(out_dir: str, keys: Optional[List[str]] = None) -> Iterator[dict]:
+    """
+    Yield the records of the shards of a compaction one at a time, in order.
+    """
+    for path in shard_paths(out_dir):
+        yield from iter_jsonl(path, keys)
+
+
+def _read_shard(args: Tuple[str, Optional[List[str]]]) -> DataFrame:
+    path, columns = args
+    return read_frame(path, columns)
+
+
+def load_shards(
+    out_dir: str, columns: Optional[List[str]] = None, processes: Optional[int] = None
+) -> DataFrame:
+    """
+    Load the shards of a compaction into a DataFrame, reading them in parallel on
+    `processes` processes (one per core by default).
+    """
+    paths = shard_paths(out_dir)
+    if len(paths) == 0:
+        return pd.DataFrame(columns=columns)
+    processes = min(processes or multiprocessing.cpu_count(), len(paths))
+    if processes == 1:
+        frames = [_read_shard((path, columns)) for path in paths]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            frames = pool.map(_read_shard, [(path, columns) for path in paths])
+    return pd.concat(frames, ignore_index=True, sort=False).infer_objects()
+
+
+def main(main_args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("metadata_path", help="jsonlines metadata file to compact")
+    parser.add_argument("out_dir", help="directory to write the shards to")
+    parser.add_argument(
+        "--max_shard_mb",
+        required=False,
+        default=64,
+        help="max size of a shard in MB",
+    )
+    parser.add_argument(
+        "--in_place",
+        action="store_true",
+        help="also replace the metadata file by the compacted records",
+    )
+    args = parser.parse_args(main_args)
+
+    manifest = compact(
+        args.metadata_path,
+        args.out_dir,
+        int(float(args.max_shard_mb) * 2 ** 20),
+        args.in_place,
+    )
+    print(
+        "Compacted {} record(s) into {} shard(s), dropping {}".format(
+            manifest["records"], len(manifest["shards"]), manifest["dropped"]
+        )
+    )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
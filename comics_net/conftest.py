@@ -0,0 +1,72 @@
+"Fixtures shared by the tests, with the fakes of comics_net.testing"
+
+import os
+import threading
+from unittest import mock
+
+import pytest
+
+import comics_net.http_client as http_client
+import comics_net.webscraper as webscraper
+import comics_net.webscraper_main as webscraper_main
+from comics_net.testing import (
+    FakeClock,
+    FakeRedis,
+    FakeSite,
+    PageServer,
+    fake_download,
+    make_specs,
+)
+
+
+@pytest.fixture
+def fake_site():
+    return FakeSite()
+
+
+@pytest.fixture
+def crawl(monkeypatch):
+    """
+    Return a function crawling the fake site into a new directory with an engine,
+    which returns the metadata and covers scraped.
+    """
+
+    def crawl(path, engine: str, **kwargs):
+        path.mkdir()
+        monkeypatch.chdir(str(path))
+        os.makedirs("metadata")
+        os.makedirs("covers")
+
+        site = FakeSite()
+        specs = make_specs(engine=engine, **kwargs)
+        with mock.patch.object(webscraper, "simple_get", side_effect=site.get):
+            with mock.patch.object(http_client.HTTPClient, "download", fake_download):
+                webscraper_main.run_scraper(specs)
+
+        metadata = webscraper.read_jsonl("./metadata/covers.jsonl")
+        covers = {
+            name: open(os.path.join("covers", name), "rb").read()
+            for name in os.listdir("covers")
+        }
+        return metadata, covers
+
+    return crawl
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def page_server():
+    server = PageServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,223 @@
+"Coordinator and workers of a crawl of htpps://www.comics.org over a work queue"
+
+import logging
+import time
+from functools import partial
+from typing import Any, Callable, List, Optional, Tuple
+
+import comics_net.webscraper as webscraper
+from comics_net.downloader import CoverDownloader
+from comics_net.frontier import Frontier, Item, expand
+from comics_net.queues import DONE, FAILED, Lease, WorkQueue
+from comics_net.sink import MetadataSink
+from comics_net.store import MetadataStore
+
+# task kinds: scrape the metadata on the page of an issue, or scrape the credits
+# of its covers and download their images
+ISSUE = "issue"
+COVERS = "covers"
+
+
+def task_key(kind: str, issue_url: str) -> str:
+    return "{}:{}".format(kind, issue_url)
+
+
+class Coordinator:
+    """
+    Walk the publisher, series and gallery pages of a crawl and hand its issues out
+    to the workers over a work queue.
+
+    Workers scrape issue pages and covers without any shared state, so the
+    coordinator dedups the issues once their pages are scraped, queueing the covers
+    of new ones only (their cover and variant pages are the costly requests), and
+    writes their metadata (and appends it to the metadata store, if given) once the
+    covers are saved, all in crawl order. Tasks are keyed by issue url, so a
+    resumed crawl reuses the results workers already sent.
+    """
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        frontier: Frontier,
+        dedup_index: webscraper.DuplicateIndex,
+        metadata_path: str,
+        poll: float = 0.2,
+        sleep: Callable[[float], None] = time.sleep,
+        store: Optional[MetadataStore] = None,
+        task_timeout: Optional[float] = 3600.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.queue = queue
+        self.frontier = frontier
+        self.dedup_index = dedup_index
+        self.metadata_path = metadata_path
+        self.store = store
+        self.poll = poll
+        self.task_timeout = task_timeout
+        self._sleep = sleep
+        self._clock = clock
+
+    def submit(self, kind: str, issue_url: str, payload: dict) -> None:
+        """
+        Queue a task for the workers, or queue it again if it failed before.
+        """
+        key = task_key(kind, issue_url)
+        self.queue.put(key, dict(payload, kind=kind, url=issue_url))
+        task = self.queue.get(key)
+        if task is not None and task[0] == FAILED:
+            self.queue.retry(key)
+
+    def wait(self, kind: str, issue_url: str) -> Tuple[str, Any, Optional[str]]:
+        """
+        Wait until a task is done or failed, or for `task_timeout` seconds at most,
+        after which it counts as failed. Return its state, result and error.
+        """
+        start = self._clock()
+        while True:
+            task = self.queue.get(task_key(kind, issue_url))
+            if task is not None and task[0] in (DONE, FAILED):
+                return task
+            if (
+                self.task_timeout is not None
+                and self._clock() - start >= self.task_timeout
+            ):
+                return FAILED, None, "timed out after {}s".format(self.task_timeout)
+            self._sleep(self.poll)
+
+    def discover(self, root: str) -> List[Item]:
+        """
+        Crawl the frontier from `root` up to its issues, queueing them for the
+        workers. Return the issues in crawl order.
+        """
+        issues = []
+        item = self.frontier.next(root)
+        while item is not None:
+            url, kind, payload = item
+            if kind == "issue":
+                self.submit(ISSUE, url, {"series_name": payload["series_name"]})
+                issues.append(item)
+            else:
+                try:
+                    soup = webscraper.get_soup(url, kind)
+                    children = expand(url, kind, payload, soup)
+                except Exception as e:
+                    logging.exception("Failed to crawl {}".format(url))
+                    self.frontier.fail(url, repr(e))
+                else:
+                    self.frontier.done(url, children)
+            item = self.frontier.next(root)
+        return issues
+
+    def run(self, root: str) -> int:
+        """
+        Crawl the frontier from `root` with the workers. Return the number of issues
+        saved.
+        """
+        issues = self.discover(root)
+        logging.info("Queued {} issue(s) from {}".format(len(issues), root))
+
+        # dedup the issues in crawl order as the workers scrape them
+        pending = []
+        for issue_url, _, _ in issues:
+            state, issue, error = self.wait(ISSUE, issue_url)
+            if state == FAILED:
+                self.frontier.fail(issue_url, error or "")
+                continue
+
+            metadata = issue["metadata"]
+            title, on_sale_date = metadata["title"], metadata["on_sale_date"]
+            if self.dedup_index.is_duplicate(title, on_sale_date):
+                logging.info("Not pulling {} because it is a duplicate".format(title))
+                self.frontier.done(issue_url)
+                continue
+
+            self.dedup_index.add(title, on_sale_date)
+            self.submit(COVERS, issue_url, issue)
+            pending.append((issue_url, metadata))
+
+        # save the metadata of the issues in crawl order once their covers are saved
+        saved = 0
+        with MetadataSink(self.metadata_path, store=self.store) as sink:
+            for issue_url, metadata in pending:
+                state, result, error = self.wait(COVERS, issue_url)
+                if state == FAILED:
+                    self.frontier.fail(issue_url, error or "")
+                    self.dedup_index.discard(
+                        metadata["title"], metadata["on_sale_date"]
+                    )
+                    continue
+
+                sink.write(result, partial(self.frontier.done, issue_url))
+                saved += 1
+        return saved
+
+
+class Worker:
+    """
+    Scrape issues and download covers leased from a work queue until the
+    coordinator closes it.
+
+    A worker keeps no state between tasks, so any number of them can run on any
+    number of machines that can reach the queue (and share the covers directory).
+    """
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        downloader: CoverDownloader,
+        lease_seconds: float = 300.0,
+        poll: float = 0.2,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.queue = queue
+        self.downloader = downloader
+        self.lease_seconds = lease_seconds
+        self.poll = poll
+        self._sleep = sleep
+
+    def work(self, lease: Lease) -> Any:
+        """
+        Do a leased task. Return its result: the metadata on the issue page and the
+        url of its cover page for an issue task, the whole metadata of the issue for
+        a covers task.
+        """
+        task = lease.payload
+        if task["kind"] == ISSUE:
+            issue_soup = webscraper.get_soup(task["url"])
+            metadata = webscraper.init_issue_metadata(issue_soup, task["series_name"])
+            logging.info("Scraping {} from {}".format(metadata["title"], task["url"]))
+            metadata.update(webscraper.get_all_issue_metadata(issue_soup))
+            cover_url = webscraper.get_issue_cover_url(issue_soup)
+            return {"metadata": metadata, "cover_url": cover_url}
+
+        metadata = task["metadata"]
+        issue_cover_soup = webscraper.get_soup(task["cover_url"], "cover")
+        metadata.update(
+            webscraper.get_cover_credits_from_cover_page(issue_cover_soup, metadata)
+        )
+        downloads = webscraper.save_cover_images(metadata, self.downloader)
+        for download in downloads:
+            download.result()
+        return metadata
+
+    def run(self) -> int:
+        """
+        Work until the queue is closed and empty. Return the number of tasks done.
+        """
+        done = 0
+        while True:
+            lease = self.queue.lease(self.lease_seconds)
+            if lease is None:
+                if self.queue.is_closed():
+                    return done
+                self._sleep(self.poll)
+                continue
+
+            try:
+                result = self.work(lease)
+            except Exception as e:
+                logging.exception("Failed to do task {}".format(lease.key))
+                self.queue.fail(lease, repr(e))
+            else:
+                self.queue.complete(lease.key, result)
+                done += 1
@@ -0,0 +1,169 @@
+"Parallel downloader of the cover images of htpps://www.comics.org"
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Tuple
+
+from requests.exceptions import (
+    ChunkedEncodingError,
+    ConnectionError,
+    HTTPError,
+    RequestException,
+    Timeout,
+)
+
+from comics_net.http_client import HTTPClient
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover
+    Image = None
+
+# leading bytes of the image formats covers are published in
+IMAGE_SIGNATURES = [b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n", b"GIF87a", b"GIF89a"]
+
+
+class InvalidImage(Exception):
+    """
+    A downloaded file that is empty, truncated or not an image.
+    """
+
+
+def check_image(path: str) -> None:
+    """
+    Raise InvalidImage unless the file at `path` looks like a whole image; decode
+    it with PIL when it is installed.
+    """
+    if os.path.getsize(path) == 0:
+        raise InvalidImage("{} is empty".format(path))
+
+    with open(path, "rb") as f:
+        head = f.read(16)
+    if not any(head.startswith(signature) for signature in IMAGE_SIGNATURES):
+        raise InvalidImage("{} is not an image".format(path))
+
+    if Image is not None:
+        try:
+            with Image.open(path) as im:
+                im.load()
+        except Exception as e:
+            raise InvalidImage("{} could not be decoded: {}".format(path, e))
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Check if a failed download is worth retrying: the connection failed, timed out
+    or broke off, the server is overloaded or failed (429 or 5xx), or the image came
+    out truncated. Other 4xx errors, like a 404, are for good.
+    """
+    if isinstance(error, HTTPError):
+        status = None if error.response is None else error.response.status_code
+        return status is None or status == 429 or status >= 500
+    if isinstance(error, RequestException):
+        return isinstance(error, (ConnectionError, Timeout, ChunkedEncodingError))
+    return isinstance(error, (InvalidImage, OSError))
+
+
+class CoverDownloader:
+    """
+    Download cover images on a bounded pool of worker threads.
+
+    Each image is streamed over the shared client to a temporary file next to its
+    destination, checked, and only then renamed into place, so a failed download
+    never leaves a partial image behind. Downloads that failed for a transient
+    reason are retried `retries` times, waiting `backoff` seconds and doubling the
+    wait after each attempt.
+    """
+
+    def __init__(
+        self,
+        client: HTTPClient,
+        workers: int = 4,
+        retries: int = 3,
+        backoff: float = 1.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.client = client
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.downloaded = 0
+        self.retried = 0
+        self.failed = 0
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _download_once(self, url: str, save_to: str) -> None:
+        # a temporary file of its own, as other processes may save the cover too
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(save_to) or ".",
+            prefix=os.path.basename(save_to) + ".",
+            suffix=".part",
+        )
+        os.close(fd)
+        try:
+            self.client.download(url, tmp_path)
+            check_image(tmp_path)
+            # mkstemp makes files only their owner can read
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, save_to)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def download(self, url: str, save_to: str) -> str:
+        """
+        Download the image at `url` to `save_to`, retrying with backoff. Return the
+        path saved to.
+        """
+        attempt = 0
+        while True:
+            try:
+                self._download_once(url, save_to)
+                self._count("downloaded")
+                return save_to
+            except Exception as e:
+                if attempt == self.retries or not is_transient(e):
+                    self._count("failed")
+                    raise
+                wait = self.backoff * 2 ** attempt
+                logging.info(
+                    "Retrying download of {} in {}s after: {}".format(url, wait, e)
+                )
+                self._count("retried")
+                self._sleep(wait)
+                attempt += 1
+
+    def submit(self, url: str, save_to: str) -> Future:
+        """
+        Queue the download of the image at `url` to `save_to`.
+        """
+        return self._executor.submit(self.download, url, save_to)
+
+    def submit_all(self, images: List[Tuple[str, str]]) -> List[Future]:
+        """
+        Queue the download of each (url, save_to) pair.
+        """
+        return [self.submit(url, save_to) for url, save_to in images]
+
+    def stats(self) -> dict:
+        """
+        Return the number of images downloaded, retries and failed downloads.
+        """
+        return {
+            "downloaded": self.downloaded,
+            "retried": self.retried,
+            "failed": self.failed,
+        }
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
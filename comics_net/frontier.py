@@ -0,0 +1,249 @@
+"Persistent crawl frontier for resumable crawls of htpps://www.comics.org"
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from bs4 import BeautifulSoup
+
+import comics_net.webscraper as webscraper
+
+# url states
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+# url kinds in crawl order, deeper kinds are taken first so the crawl is depth first
+KINDS = ["publisher", "series", "gallery", "gallery_page", "issue"]
+
+# (url, kind, payload)
+Item = Tuple[str, str, dict]
+
+
+class Frontier:
+    """
+    An SQLite-backed record of every url of a crawl and its state.
+
+    Each url belongs to the `root` url of the crawl that found it, remembers the
+    page it was found on, and moves from pending to in flight to done (or failed).
+    Marking a page done saves the urls found on it in the same transaction, so an
+    interrupted crawl can pick up exactly where it stopped. Processes crawling
+    from different roots can share the same file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        # worker processes of a sharded crawl share the file, so wait on their locks
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS urls (seq INTEGER PRIMARY KEY, "
+                "url TEXT UNIQUE, root TEXT, parent TEXT, kind TEXT, depth INTEGER, "
+                "payload TEXT, state TEXT, attempts INTEGER DEFAULT 0, error TEXT, "
+                "updated_at REAL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS urls_next "
+                "ON urls (root, state, depth, seq)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS urls_parent ON urls (parent)"
+            )
+
+    def _insert(self, items: List[Item], root: str, parent: Optional[str]) -> None:
+        self._db.executemany(
+            "INSERT OR IGNORE INTO urls "
+            "(url, root, parent, kind, depth, payload, state, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    url,
+                    root,
+                    parent,
+                    kind,
+                    KINDS.index(kind),
+                    json.dumps(payload),
+                    PENDING,
+                    time.time(),
+                )
+                for url, kind, payload in items
+            ],
+        )
+
+    def add(self, url: str, kind: str, payload: dict, root: str) -> None:
+        """
+        Add a url to the frontier, unless it is already there.
+        """
+        with self._lock, self._db:
+            self._insert([(url, kind, payload)], root, None)
+
+    def reset(self, root: str) -> None:
+        """
+        Forget every url of the crawl from `root`, to crawl it from scratch.
+        """
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM urls WHERE root = ?", (root,))
+
+    def resume(self, root: str) -> None:
+        """
+        Put the urls of the crawl from `root` that were in flight when it stopped, or
+        that failed, back in the queue.
+        """
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE urls SET state = ? WHERE root = ? AND state IN (?, ?)",
+                (PENDING, root, IN_FLIGHT, FAILED),
+            )
+
+    def next(self, root: str) -> Optional[Item]:
+        """
+        Take the next pending url of the crawl from `root`, depth first, and mark it
+        in flight.
+        """
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT url, kind, payload FROM urls WHERE root = ? AND state = ? "
+                "ORDER BY depth DESC, seq LIMIT 1",
+                (root, PENDING),
+            ).fetchone()
+            if row is None:
+                return None
+            self._set_state(row[0], IN_FLIGHT)
+        return row[0], row[1], json.loads(row[2])
+
+    def _set_state(self, url: str, state: str, error: Optional[str] = None) -> None:
+        self._db.execute(
+            "UPDATE urls SET state = ?, error = ?, updated_at = ?, "
+            "attempts = attempts + ? WHERE url = ?",
+            (state, error, time.time(), int(state == IN_FLIGHT), url),
+        )
+
+    def start(self, url: str) -> None:
+        """
+        Mark a url in flight.
+        """
+        with self._lock, self._db:
+            self._set_state(url, IN_FLIGHT)
+
+    def done(self, url: str, children: Optional[List[Item]] = None) -> None:
+        """
+        Mark a url done and add the urls found on it to the frontier.
+        """
+        with self._lock, self._db:
+            root = self._db.execute(
+                "SELECT root FROM urls WHERE url = ?", (url,)
+            ).fetchone()[0]
+            self._insert(children or [], root, url)
+            self._set_state(url, DONE)
+
+    def fail(self, url: str, error: str) -> None:
+        """
+        Mark a url failed.
+        """
+        with self._lock, self._db:
+            self._set_state(url, FAILED, error)
+
+    def get(self, url: str) -> Optional[Item]:
+        """
+        Return the kind and payload of a url, if it is in the frontier.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, kind, payload FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        return None if row is None else (row[0], row[1], json.loads(row[2]))
+
+    def state(self, url: str) -> Optional[str]:
+        """
+        Return the state of a url, if it is in the frontier.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def children(self, url: str) -> List[Item]:
+        """
+        Return the urls found on a page, in the order they were found.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT url, kind, payload FROM urls WHERE parent = ? ORDER BY seq",
+                (url,),
+            ).fetchall()
+        return [(url, kind, json.loads(payload)) for url, kind, payload in rows]
+
+    def counts(self, root: str) -> dict:
+        """
+        Return the number of urls of the crawl from `root` in each state.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT state, COUNT(*) FROM urls WHERE root = ? GROUP BY state",
+                (root,),
+            ).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def expand(url: str, kind: str, payload: dict, soup: BeautifulSoup) -> List[Item]:
+    """
+    Return the urls to crawl found on a publisher, series or cover gallery page.
+    """
+    if kind == "publisher":
+        series_df = webscraper.parse_series_from_publisher_page(
+            soup, payload.get("series")
+        )
+        series_df = series_df[series_df["issue_count_int"] >= payload["issue_count"]]
+        logging.info("Found {} series to scrape on {}".format(len(series_df), url))
+        return [
+            (
+                webscraper.URL + href,
+                "series",
+                {"series_name": name, "issue_count": int(issue_count_int)},
+            )
+            for name, href, issue_count_int in zip(
+                series_df["name"], series_df["href"], series_df["issue_count_int"]
+            )
+        ]
+
+    elif kind == "series":
+        logging.info(
+            "Scraping {} issue(s) of {} from {}".format(
+                payload["issue_count"], payload["series_name"], url
+            )
+        )
+        cover_gallery_href = webscraper.get_cover_gallery_href(soup)
+        if cover_gallery_href is None:
+            logging.info("No cover gallery found at {}".format(url))
+            return []
+        payload = dict(payload, cover_gallery_href=cover_gallery_href)
+        return [(webscraper.URL + cover_gallery_href, "gallery", payload)]
+
+    logging.info("Cover gallery url = {}".format(url))
+
+    if kind == "gallery":
+        cover_gallery_range = webscraper.cover_gallery_pages(soup)
+        if cover_gallery_range > 1:
+            logging.info("Cover gallery range = {}".format(cover_gallery_range))
+            return [
+                (page_url, "gallery_page", payload)
+                for page_url in webscraper.get_cover_gallery_page_urls(
+                    payload["cover_gallery_href"], cover_gallery_range
+                )
+            ]
+
+    series_payload = {"series_name": payload["series_name"]}
+    return [
+        (issue_url, "issue", series_payload)
+        for issue_url in webscraper.get_issue_urls(soup)
+    ]
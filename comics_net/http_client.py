@@ -0,0 +1,135 @@
+"Pooled HTTP client shared by the requests made to htpps://www.comics.org"
+
+from contextlib import closing
+from typing import Optional, Tuple, Union
+
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+
+from comics_net.cache import ResponseCache
+from comics_net.throttle import RateLimiter
+
+# (connect, read) timeouts in seconds
+Timeout = Union[float, Tuple[float, float]]
+
+
+class HTTPClient:
+    """
+    A keep-alive HTTP client backed by a `requests.Session`.
+
+    Connections are pooled per host, `pool_maxsize` caps the number of open
+    connections to any one host (requests block until a connection is free) and
+    every request gets `timeout` unless one is given. With a `rate_limiter` every
+    request first waits for its turn with the host. The `cache`, if any, is where
+    `webscraper.simple_get` keeps the pages it fetched.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 4,
+        timeout: Timeout = (10, 30),
+        headers: Optional[dict] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        cache: Optional[ResponseCache] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.cache = cache
+        self.session = Session()
+        if headers is not None:
+            self.session.headers.update(headers)
+
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=True
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url: str, **kwargs) -> Response:
+        """
+        Make an HTTP GET request to `url` over a pooled connection.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        if self.rate_limiter is None:
+            return self.session.get(url, **kwargs)
+
+        self.rate_limiter.acquire(url)
+        resp = self.session.get(url, **kwargs)
+        self.rate_limiter.update(url, resp.status_code, resp.headers.get("Retry-After"))
+        return resp
+
+    def download(self, url: str, save_to: str, chunk_size: int = 64 * 1024) -> None:
+        """
+        Stream the content at `url` to the file `save_to`. Raise an IOError if the
+        body is shorter than its Content-Length.
+        """
+        with closing(self.get(url, stream=True)) as resp:
+            resp.raise_for_status()
+            size = 0
+            with open(save_to, "wb") as f:
+                for chunk in resp.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+                    size += len(chunk)
+
+            content_length = resp.headers.get("Content-Length")
+            if (
+                content_length is not None
+                and "Content-Encoding" not in resp.headers
+                and size != int(content_length)
+            ):
+                raise IOError(
+                    "Got {} of {} bytes from {}".format(size, content_length, url)
+                )
+
+    def stats(self) -> dict:
+        """
+        Return the connection pool statistics per host, where a hit is a request
+        that reused a pooled connection and a miss is one that opened a new one.
+        """
+        stats = {}
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                host = "{}://{}".format(pool.scheme, pool.host)
+                if pool.port not in (None, 80, 443):
+                    host += ":{}".format(pool.port)
+                stats[host] = {
+                    "requests": pool.num_requests,
+                    "hits": pool.num_requests - pool.num_connections,
+                    "misses": pool.num_connections,
+                }
+        return stats
+
+    def close(self) -> None:
+        """
+        Close all pooled connections (and the cache).
+        """
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+_client: Optional[HTTPClient] = None
+
+
+def get_client() -> HTTPClient:
+    """
+    Return the shared HTTP client, creating one with the defaults if need be.
+    """
+    global _client
+    if _client is None:
+        _client = HTTPClient()
+    return _client
+
+
+def configure(**kwargs) -> HTTPClient:
+    """
+    Replace the shared HTTP client with one built from `kwargs`.
+    """
+    global _client
+    if _client is not None:
+        _client.close()
+    _client = HTTPClient(**kwargs)
+    return _client
@@ -0,0 +1,89 @@
+"Job specs for crawling many publisher pages of htpps://www.comics.org at once"
+
+import hashlib
+import os
+import shutil
+from typing import List
+
+import jsonlines
+
+from comics_net.frontier import Item
+
+URL = "https://www.comics.org"
+SHARD_DIR = "./metadata/shards"
+
+
+def parse_pages(pages: str) -> List[int]:
+    """
+    Parse a page range like "1-3,7" into the list of pages [1, 2, 3, 7].
+    """
+    parsed = []
+    for part in str(pages).split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            parsed.extend(range(int(first), int(last) + 1))
+        elif part.strip() != "":
+            parsed.append(int(part))
+    return parsed
+
+
+def read_job_specs(path: str) -> List[dict]:
+    """
+    Read a jsonlines file of job specs, one per publisher, e.g.
+    {"publisher_id": "78", "publisher_pages": "40-84", "issue_count": "2"}.
+    """
+    with jsonlines.open(path, mode="r") as reader:
+        return [job_spec for job_spec in reader]
+
+
+def get_publisher_url(publisher_id: str, publisher_page: str) -> str:
+    """
+    Return the url of a page of a publisher's series.
+    """
+    return URL + "/publisher/{}/".format(publisher_id) + "?page={}".format(
+        publisher_page
+    )
+
+
+def get_roots(job_specs: List[dict]) -> List[Item]:
+    """
+    Return the publisher pages to crawl for the job specs, in job order.
+    """
+    roots = []
+    for job_spec in job_specs:
+        payload = {
+            "series": job_spec.get("series"),
+            "issue_count": int(job_spec.get("issue_count") or 0),
+        }
+        for publisher_page in parse_pages(job_spec["publisher_pages"]):
+            publisher_url = get_publisher_url(job_spec["publisher_id"], publisher_page)
+            roots.append((publisher_url, "publisher", payload))
+    return roots
+
+
+def shard_path(root: str) -> str:
+    """
+    Return the path of the metadata shard written by the crawl from `root`.
+    """
+    digest = hashlib.sha1(root.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SHARD_DIR, "{}.jsonl".format(digest))
+
+
+def merge_shards(roots: List[str], metadata_path: str) -> int:
+    """
+    Append the metadata shards of the crawls from `roots` to `metadata_path` in
+    root order, removing each shard once merged. Return the number of shards merged.
+    """
+    merged = 0
+    with open(metadata_path, "ab") as out:
+        for root in roots:
+            path = shard_path(root)
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as shard:
+                shutil.copyfileobj(shard, out)
+            out.flush()
+            os.fsync(out.fileno())
+            os.remove(path)
+            merged += 1
+    return merged
@@ -0,0 +1,147 @@
+"Streaming readers of the jsonlines metadata files of htpps://www.comics.org"
+
+import gc
+import json
+import mmap
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Iterator, List, Optional
+
+import jsonlines
+import pandas as pd
+from pandas import DataFrame
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# number of records read into each chunk by default
+CHUNK_SIZE = 10000
+
+# number of lines decoded at once, with the garbage collector paused
+DECODE_BATCH = 1000
+
+
+def select_keys(record: dict, keys: Optional[List[str]]) -> dict:
+    """
+    Return the record with only the given keys it has, or the whole record.
+    """
+    if keys is None:
+        return record
+    return {k: record[k] for k in keys if k in record}
+
+
+def loads(line: bytes) -> Any:
+    """
+    Decode a line of JSON with orjson when it is installed, falling back to the
+    json module for what orjson rejects (like NaN).
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(line.decode("utf-8"))
+
+
+def iter_lines(path: str) -> Iterator[bytes]:
+    """
+    Yield the non-blank lines of a file, splitting a memory map of it instead of
+    reading it line by line.
+    """
+    with open(path, "rb") as f:
+        # an empty file can't be mapped
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            size = len(mm)
+            while start < size:
+                end = mm.find(b"\n", start)
+                if end == -1:
+                    end = size
+                line = mm[start:end]
+                if len(line) > 0 and not line.isspace():
+                    yield line
+                start = end + 1
+
+
+@contextmanager
+def gc_paused():
+    """
+    Pause the garbage collector, which otherwise runs over and over while many
+    dicts are decoded (and finds nothing, as decoded records have no cycles).
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def iter_jsonl(path: str, keys: Optional[List[str]] = None) -> Iterator[dict]:
+    """
+    Yield the records of a jsonlines file one at a time, with only the given keys.
+    """
+    lines = enumerate(iter_lines(path), 1)
+    while True:
+        batch = list(islice(lines, DECODE_BATCH))
+        if len(batch) == 0:
+            return
+
+        records = []
+        with gc_paused():
+            for lineno, line in batch:
+                try:
+                    records.append(select_keys(loads(line), keys))
+                except ValueError as e:
+                    raise jsonlines.InvalidLineError(
+                        "line {} of {} is not valid JSON: {}".format(lineno, path, e),
+                        line,
+                        lineno,
+                    )
+        yield from records
+
+
+def iter_jsonl_chunks(
+    path: str, chunk_size: int = CHUNK_SIZE, keys: Optional[List[str]] = None
+) -> Iterator[List[dict]]:
+    """
+    Yield the records of a jsonlines file in lists of up to `chunk_size`, with only
+    the given keys.
+    """
+    records = iter_jsonl(path, keys)
+    while True:
+        with gc_paused():
+            chunk = list(islice(records, chunk_size))
+        if len(chunk) == 0:
+            return
+        yield chunk
+
+
+def iter_frames(
+    path: str, chunk_size: int = CHUNK_SIZE, columns: Optional[List[str]] = None
+) -> Iterator[DataFrame]:
+    """
+    Yield the records of a jsonlines file in DataFrames of up to `chunk_size` rows,
+    with only the given columns.
+    """
+    for chunk in iter_jsonl_chunks(path, chunk_size, columns):
+        yield pd.DataFrame(chunk, columns=columns)
+
+
+def read_frame(
+    path: str, columns: Optional[List[str]] = None, chunk_size: int = CHUNK_SIZE
+) -> DataFrame:
+    """
+    Read a jsonlines file into a DataFrame a chunk at a time, so only one chunk of
+    records is held as dicts at once.
+    """
+    frames = list(iter_frames(path, chunk_size, columns))
+    if len(frames) == 0:
+        return pd.DataFrame(columns=columns)
+    # a column missing from a whole chunk comes back as objects, so infer it again
+    return pd.concat(frames, ignore_index=True, sort=False).infer_objects()
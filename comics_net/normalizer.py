@@ -0,0 +1,116 @@
+"Normalization of the character names of htpps://www.comics.org to canonical names"
+
+import re
+import unicodedata
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+from pandas import Series
+
+from comics_net.character_map import aliases
+
+# characters dropped from a name in its key, e.g. Dr. Thirteen ~ Dr Thirteen
+DROPPED = re.compile(r"[\"'`.‘’“”]")
+
+# characters read as a space in the key of a name, e.g. Spider-Man ~ Spider Man
+SPACED = re.compile(r"[^\w\s\[\]()]")
+
+
+def name_key(name: str) -> str:
+    """
+    Given a character name return the key it is looked up by when it isn't a name
+    of the map as is: case, whitespace and most punctuation don't matter.
+    """
+    key = unicodedata.normalize("NFKC", name).casefold()
+    key = SPACED.sub(" ", DROPPED.sub("", key))
+    return " ".join(key.replace("[", " [ ").replace("]", " ] ").split())
+
+
+class CharacterNormalizer:
+    """
+    Alias map of character names compiled for lookups of whole columns of names.
+
+    Every canonical name (a value of the map) gets an ID. A name is looked up as is
+    first, so a name of the map maps the same as with `aliases.get`; a name that
+    isn't is looked up by its `name_key`, which catches the case, whitespace and
+    punctuation variants of both the aliases and the canonical names. Names not
+    found either way are left as they are.
+
+    Columns are looked up a distinct name at a time and mapped back onto the column
+    with an array take, so a column costs one lookup per distinct name.
+    """
+
+    def __init__(self, alias_map: Dict[str, str]) -> None:
+        self.names: List[str] = list(dict.fromkeys(alias_map.values()))
+        ids = {name: i for i, name in enumerate(self.names)}
+
+        self.exact: Dict[str, int] = dict(ids)
+        self.exact.update((alias, ids[name]) for alias, name in alias_map.items())
+
+        # the aliases take precedence over the canonical names of the same key
+        self.keys: Dict[str, int] = {}
+        for alias, name in alias_map.items():
+            self.keys.setdefault(name_key(alias), ids[name])
+        for name, i in ids.items():
+            self.keys.setdefault(name_key(name), i)
+
+    def id(self, name: str) -> int:
+        """
+        Given a character name return the ID of its canonical name, or -1.
+        """
+        i = self.exact.get(name)
+        if i is None:
+            i = self.keys.get(name_key(name), -1)
+        return i
+
+    def ids(self, names: Iterable[str]) -> np.ndarray:
+        """
+        Given a column of character names return an array of the IDs of their
+        canonical names, with -1 for the names (and missing values) not found.
+        """
+        codes, uniques = pd.factorize(pd.Series(names, dtype=object))
+        unique_ids = np.array([self.id(x) for x in uniques] + [-1], dtype=np.int64)
+        # missing values have code -1, which takes the trailing -1
+        return unique_ids[codes]
+
+    def normalize(self, names: Iterable[str]) -> Series:
+        """
+        Given a column of character names return a Series of their canonical names;
+        names not found, and missing values, are left as they are.
+        """
+        names = pd.Series(names, dtype=object)
+        codes, uniques = pd.factorize(names)
+        canonical = np.array(list(uniques) + [np.nan], dtype=object)
+        for j, i in enumerate(self.ids(uniques)):
+            if i != -1:
+                canonical[j] = self.names[i]
+        return pd.Series(canonical[codes], index=names.index, dtype=object)
+
+    def normalize_lists(self, lists: Series) -> Series:
+        """
+        Given a column of lists of character names return a Series of the lists of
+        their canonical names, normalizing the names of all the lists in one go.
+        Missing values are left as they are.
+        """
+        present = lists.notna()
+        flat = self.normalize(list(chain.from_iterable(lists[present]))).tolist()
+
+        names = iter(flat)
+        normalized = pd.Series(np.nan, index=lists.index, dtype=object)
+        normalized[present] = pd.Series(
+            [list(islice(names, len(x))) for x in lists[present]],
+            index=lists.index[present],
+            dtype=object,
+        )
+        return normalized
+
+
+@lru_cache(maxsize=None)
+def get_normalizer() -> CharacterNormalizer:
+    """
+    Return the normalizer of `character_map.aliases`, compiled on first use.
+    """
+    return CharacterNormalizer(aliases)
@@ -0,0 +1,93 @@
+"Pool of processes parsing the pages of htpps://www.comics.org"
+
+import multiprocessing
+import sys
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Tuple
+
+import comics_net.webscraper as webscraper
+
+
+def run_with_parser(parser: str, fn: Callable, *args):
+    """
+    Run a parse function of webscraper with the tree builder `parser` selected.
+    """
+    webscraper.set_parser(parser)
+    return fn(*args)
+
+
+class ParsePool:
+    """
+    Parse raw pages on a pool of `processes` worker processes.
+
+    Building a soup holds the GIL, so parsing on threads stops scaling once pages
+    are fetched concurrently. The pool ships raw HTML to its workers, which run
+    the extractors and send back plain dicts, so parsing scales with cores. With
+    no processes, pages are parsed on the calling thread.
+    """
+
+    def __init__(self, processes: int = 0) -> None:
+        self.processes = processes
+        self._executor = None
+        if processes > 0:
+            kwargs = {}
+            if sys.version_info >= (3, 7):
+                # spawn rather than fork, as forking a process running threads can
+                # deadlock; Python 3.6 can only fork
+                kwargs["mp_context"] = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(max_workers=processes, **kwargs)
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """
+        Queue a parse of raw HTML with one of the parse functions of webscraper.
+        """
+        if self._executor is not None:
+            # the parser is selected per task, as Python 3.6 pools have no initializer
+            return self._executor.submit(
+                run_with_parser, webscraper.PARSER, fn, *args
+            )
+
+        future: Future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def issue_page(self, raw_html: bytes, series_name: str) -> Tuple[dict, str]:
+        """
+        Return the metadata on an issue page and the url of its cover page.
+        """
+        return self.submit(webscraper.parse_issue_page, raw_html, series_name).result()
+
+    def cover_credits(self, cover_url: str, metadata: dict) -> dict:
+        """
+        Return the credits and image urls of the covers of an issue, fetching its
+        cover page and the issue pages of its variants.
+        """
+        covers = self.submit(
+            webscraper.parse_cover_page, webscraper.simple_get(cover_url)
+        ).result()
+        variant_names = webscraper.get_variant_names(covers)
+
+        # get the issue page of each variant concurrently, parsing them in the pool
+        variant_urls = [covers[x]["cover_url"] for x in variant_names]
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(webscraper.VARIANT_WORKERS, len(variant_urls)))
+        ) as executor:
+            variant_pages = list(executor.map(webscraper.simple_get, variant_urls))
+        parses = [
+            self.submit(
+                webscraper.parse_variant_page,
+                raw_html,
+                metadata,
+                variant_name,
+                covers[variant_name]["image_url"],
+            )
+            for variant_name, raw_html in zip(variant_names, variant_pages)
+        ]
+        return {"covers": dict(parse.result() for parse in parses)}
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,334 @@
+"Staged crawl engine for scraping comic book covers and metadata from comics.org"
+
+import logging
+import threading
+import time
+from functools import partial
+from queue import Queue
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import comics_net.webscraper as webscraper
+from comics_net.downloader import CoverDownloader
+from comics_net.frontier import Frontier, Item, expand
+from comics_net.parse_pool import ParsePool
+from comics_net.sink import MetadataSink
+from comics_net.store import MetadataStore
+
+# marks the end of the items a stage gets
+_END = object()
+
+
+class _Failed:
+    """
+    An item that failed at a stage, flowing through the later stages in its place.
+    """
+
+    def __init__(self, item: Any) -> None:
+        self.item = item
+
+
+class Stage:
+    """
+    A step of a pipeline, run on `workers` threads.
+
+    `fn` takes an item and returns the item for the next stage, or None to drop it.
+    An ordered stage gets its items in the order they entered the pipeline (and
+    runs on one thread). `on_failure`, if given, is called with every item that
+    failed at the stage or before it, in order too if the stage is ordered.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fn: Callable[[Any], Any],
+        workers: int = 1,
+        ordered: bool = False,
+        on_failure: Optional[Callable[[Any], None]] = None,
+    ) -> None:
+        self.name = name
+        self.fn = fn
+        self.on_failure = on_failure
+        self.workers = 1 if ordered else workers
+        self.ordered = ordered
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "busy": round(self.busy, 3),
+        }
+
+
+class Pipeline:
+    """
+    Stages connected by bounded queues.
+
+    Every stage runs on its own threads, so network, parsing and disk stages
+    overlap, and at most `max_in_flight` items are in the pipeline at once, so a
+    slow stage holds back the source instead of piling up items. Dropped and
+    failed items still flow through the later stages as gaps, so ordered stages
+    never wait for an item that is not coming; `on_error` is called as soon as an
+    item fails, and the `on_failure` of the later stages as the failure reaches
+    them.
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        max_in_flight: int = 16,
+        on_error: Optional[Callable[[Stage, Any, Exception], None]] = None,
+    ) -> None:
+        self.stages = stages
+        self.max_in_flight = max_in_flight
+        self.on_error = on_error
+        self._queues: List[Queue] = [Queue(max_in_flight) for _ in stages]
+        self._slots = threading.Semaphore(max_in_flight)
+
+    def _process(self, index: int, seq: int, item: Any) -> None:
+        """
+        Run an item through a stage and hand the result to the next one.
+        """
+        stage = self.stages[index]
+        if item is not None and not isinstance(item, _Failed):
+            start = time.monotonic()
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                result = _Failed(item)
+                with stage._lock:
+                    stage.failed += 1
+                logging.exception("Stage {} failed".format(stage.name))
+                if self.on_error is not None:
+                    self.on_error(stage, item, e)
+            else:
+                with stage._lock:
+                    stage.processed += 1
+                    stage.dropped += int(result is None)
+            with stage._lock:
+                stage.busy += time.monotonic() - start
+            item = result
+
+        if isinstance(item, _Failed) and stage.on_failure is not None:
+            try:
+                stage.on_failure(item.item)
+            except Exception:
+                logging.exception(
+                    "Stage {} failed to handle a failure".format(stage.name)
+                )
+
+        if index + 1 < len(self.stages):
+            self._queues[index + 1].put((seq, item))
+        else:
+            self._slots.release()
+
+    def _work(self, index: int, finished: List[int]) -> None:
+        stage = self.stages[index]
+        queue = self._queues[index]
+        waiting: Dict[int, Any] = {}
+        next_seq = 0
+        while True:
+            entry = queue.get()
+            if entry is _END:
+                break
+            seq, item = entry
+            if not stage.ordered:
+                self._process(index, seq, item)
+                continue
+
+            # hold items that came early until the ones before them are processed
+            waiting[seq] = item
+            while next_seq in waiting:
+                self._process(index, next_seq, waiting.pop(next_seq))
+                next_seq += 1
+
+        # the last worker of a stage to finish ends the next stage
+        with stage._lock:
+            finished[index] += 1
+            last = finished[index] == stage.workers
+        if last and index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                self._queues[index + 1].put(_END)
+
+    def run(self, items: Iterable[Any]) -> int:
+        """
+        Feed the items through the stages and wait for them. Return the number of
+        items fed.
+        """
+        finished = [0 for _ in self.stages]
+        threads = [
+            threading.Thread(target=self._work, args=(index, finished), daemon=True)
+            for index, stage in enumerate(self.stages)
+            for _ in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        count = 0
+        for seq, item in enumerate(items):
+            self._slots.acquire()
+            self._queues[0].put((seq, item))
+            count += 1
+        for _ in range(self.stages[0].workers):
+            self._queues[0].put(_END)
+
+        for thread in threads:
+            thread.join()
+        return count
+
+    def stats(self) -> dict:
+        """
+        Return the workers, item counts and busy time of each stage.
+        """
+        return {stage.name: stage.stats() for stage in self.stages}
+
+
+class IssuePipeline:
+    """
+    Crawl the frontier from a publisher page, scraping its issues in stages.
+
+    Listing pages are crawled as the issues on them are needed, then each issue is
+    fetched, parsed, deduped (in crawl order), has its cover and variant pages
+    fetched, its covers downloaded and its metadata written (in crawl order), each
+    stage with its own number of threads. Pages are parsed on the parse pool, if
+    given. Metadata is written in batches (and appended to the metadata store, if
+    given), and an issue is only marked done once its metadata is written.
+
+    An issue claims its title and on sale date when it is deduped, until it is
+    written, or until its failure reaches the write stage, which releases the claim
+    (both in crawl order). A later issue with the same title and date waits for
+    the claim to settle before it is deduped, so duplicates are pulled exactly as
+    the sync engine pulls them, whatever the timing of the stages.
+    """
+
+    def __init__(
+        self,
+        frontier: Frontier,
+        dedup_index: webscraper.DuplicateIndex,
+        downloader: CoverDownloader,
+        metadata_path: str,
+        fetch_workers: int = 4,
+        parse_workers: int = 2,
+        max_in_flight: int = 16,
+        parse_pool: Optional[ParsePool] = None,
+        store: Optional[MetadataStore] = None,
+    ) -> None:
+        self.frontier = frontier
+        self.dedup_index = dedup_index
+        self.downloader = downloader
+        self.metadata_path = metadata_path
+        self.store = store
+        self.sink: Optional[MetadataSink] = None
+        self.parse_pool = parse_pool or ParsePool()
+        # claims of the issues in flight, set once they are written or released
+        self._claims: Dict[Tuple[str, str], threading.Event] = {}
+        self.pipeline = Pipeline(
+            [
+                Stage("fetch", self.fetch, fetch_workers),
+                Stage("parse", self.parse, parse_workers),
+                Stage("dedup", self.dedup, ordered=True),
+                Stage("cover", self.cover, fetch_workers),
+                Stage("download", self.download, downloader.workers),
+                Stage("write", self.write, ordered=True, on_failure=self.release),
+            ],
+            max_in_flight=max_in_flight,
+            on_error=self.on_error,
+        )
+
+    def issues(self, root: str) -> Iterator[dict]:
+        """
+        Crawl the listing pages of the frontier from `root`, yielding its issues in
+        crawl order.
+        """
+        item = self.frontier.next(root)
+        while item is not None:
+            url, kind, payload = item
+            if kind == "issue":
+                yield {"url": url, "series_name": payload["series_name"]}
+            else:
+                try:
+                    soup = webscraper.get_soup(url, kind)
+                    children: List[Item] = expand(url, kind, payload, soup)
+                except Exception as e:
+                    logging.exception("Failed to crawl {}".format(url))
+                    self.frontier.fail(url, repr(e))
+                else:
+                    self.frontier.done(url, children)
+            item = self.frontier.next(root)
+
+    def fetch(self, issue: dict) -> dict:
+        issue["html"] = webscraper.simple_get(issue["url"])
+        return issue
+
+    def parse(self, issue: dict) -> dict:
+        issue["metadata"], issue["cover_url"] = self.parse_pool.issue_page(
+            issue.pop("html"), issue["series_name"]
+        )
+        return issue
+
+    def dedup(self, issue: dict) -> Optional[dict]:
+        title = issue["metadata"]["title"]
+        on_sale_date = issue["metadata"]["on_sale_date"]
+        logging.info("Scraping {} from {}".format(title, issue["url"]))
+
+        # wait for an issue in flight with the same claim to be written or released
+        key = webscraper.DuplicateIndex.key(title, on_sale_date)
+        claim = self._claims.get(key)
+        if claim is not None:
+            claim.wait()
+
+        # check if issue is redundant to an issue already pulled, claiming it if not
+        if self.dedup_index.is_duplicate(title, on_sale_date):
+            logging.info("Not pulling {} because it is a duplicate".format(title))
+            self.frontier.done(issue["url"])
+            return None
+        self.dedup_index.add(title, on_sale_date)
+        self._claims[key] = threading.Event()
+        issue["claim"] = key
+        return issue
+
+    def cover(self, issue: dict) -> dict:
+        issue["metadata"].update(
+            self.parse_pool.cover_credits(issue["cover_url"], issue["metadata"])
+        )
+        return issue
+
+    def download(self, issue: dict) -> dict:
+        for cover in issue["metadata"]["covers"].values():
+            self.downloader.download(cover["image_url"], cover["save_to"])
+        return issue
+
+    def write(self, issue: dict) -> dict:
+        self.sink.write(issue["metadata"], partial(self.frontier.done, issue["url"]))
+        self._claims.pop(issue["claim"]).set()
+        return issue
+
+    def release(self, issue: dict) -> None:
+        """
+        Release the claim of an issue that failed, if it got to claim one.
+        """
+        if "claim" in issue:
+            metadata = issue["metadata"]
+            self.dedup_index.discard(metadata["title"], metadata["on_sale_date"])
+            self._claims.pop(issue["claim"]).set()
+
+    def on_error(self, stage: Stage, issue: dict, error: Exception) -> None:
+        self.frontier.fail(issue["url"], repr(error))
+
+    def run(self, root: str) -> int:
+        """
+        Crawl the frontier from `root`. Return the number of issues crawled.
+        """
+        self.sink = MetadataSink(self.metadata_path, store=self.store)
+        try:
+            count = self.pipeline.run(self.issues(root))
+        finally:
+            self.sink.close()
+        logging.info("Pipeline stats = {}".format(self.pipeline.stats()))
+        return count
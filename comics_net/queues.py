@@ -0,0 +1,421 @@
+"Work queues shared by the coordinator and workers of a distributed crawl"
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Optional, Tuple
+from uuid import uuid4
+
+# task states
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class Lease:
+    """
+    A task leased to a worker until `expires`; only the holder of `token` can fail
+    it, while any worker can complete it.
+    """
+
+    def __init__(self, key: str, payload: Any, token: str, expires: float) -> None:
+        self.key = key
+        self.payload = payload
+        self.token = token
+        self.expires = expires
+
+
+class WorkQueue(ABC):
+    """
+    A queue of tasks keyed by a unique name, taken by workers on time-limited leases.
+
+    Putting a task that is already queued, leased or done is a no-op and the first
+    result a task is completed with is kept, so a task leased twice (say because a
+    worker stalled past its lease) is done once. A task whose lease expires is
+    queued again until it has been leased `max_attempts` times, then it fails.
+    """
+
+    def __init__(
+        self, max_attempts: int = 3, clock: Callable[[], float] = time.time
+    ) -> None:
+        self.max_attempts = max_attempts
+        self._clock = clock
+
+    @abstractmethod
+    def put(self, key: str, payload: Any) -> bool:
+        """
+        Queue a task, unless there is one with that key. Return True if queued.
+        """
+
+    @abstractmethod
+    def lease(self, lease_seconds: float = 300.0) -> Optional[Lease]:
+        """
+        Lease the oldest queued task, if any.
+        """
+
+    @abstractmethod
+    def complete(self, key: str, result: Any) -> bool:
+        """
+        Record the result of a task, unless it already has one. Return True if
+        recorded.
+        """
+
+    @abstractmethod
+    def fail(self, lease: Lease, error: str) -> None:
+        """
+        Give up a leased task, queueing it again if it has attempts left.
+        """
+
+    @abstractmethod
+    def retry(self, key: str) -> None:
+        """
+        Queue a failed task again with all its attempts.
+        """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Tuple[str, Any, Optional[str]]]:
+        """
+        Return the state, result and error of a task, if there is one with that key.
+        """
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """
+        Return the number of tasks in each state.
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Tell the workers no more tasks are coming.
+        """
+
+    @abstractmethod
+    def reopen(self) -> None:
+        """
+        Tell the workers tasks are coming again.
+        """
+
+    @abstractmethod
+    def is_closed(self) -> bool:
+        """
+        Check if the coordinator closed the queue.
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        """
+        Drop every task, to start a crawl from scratch.
+        """
+
+
+class SQLiteQueue(WorkQueue):
+    """
+    A work queue in an SQLite file, for workers on one machine (or sharing a
+    filesystem with working locks).
+    """
+
+    def __init__(self, path: str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks (seq INTEGER PRIMARY KEY, "
+                "key TEXT UNIQUE, payload TEXT, state TEXT, token TEXT, "
+                "expires REAL, attempts INTEGER DEFAULT 0, result TEXT, error TEXT)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, seq)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)"
+            )
+
+    def put(self, key: str, payload: Any) -> bool:
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO tasks (key, payload, state) VALUES (?, ?, ?)",
+                (key, json.dumps(payload), QUEUED),
+            )
+            return cursor.rowcount == 1
+
+    def lease(self, lease_seconds: float = 300.0) -> Optional[Lease]:
+        now = self._clock()
+        with self._lock, self._db:
+            # take the write lock up front, so no other process leases the same task
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute(
+                "UPDATE tasks SET state = ?, error = ? "
+                "WHERE state = ? AND expires < ? AND attempts >= ?",
+                (FAILED, "lease expired", LEASED, now, self.max_attempts),
+            )
+            row = self._db.execute(
+                "SELECT key, payload FROM tasks "
+                "WHERE state = ? OR (state = ? AND expires < ?) ORDER BY seq LIMIT 1",
+                (QUEUED, LEASED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            token = uuid4().hex
+            expires = now + lease_seconds
+            self._db.execute(
+                "UPDATE tasks SET state = ?, token = ?, expires = ?, "
+                "attempts = attempts + 1 WHERE key = ?",
+                (LEASED, token, expires, row[0]),
+            )
+        return Lease(row[0], json.loads(row[1]), token, expires)
+
+    def complete(self, key: str, result: Any) -> bool:
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "UPDATE tasks SET state = ?, result = ?, token = NULL, error = NULL "
+                "WHERE key = ? AND state != ?",
+                (DONE, json.dumps(result), key, DONE),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, lease: Lease, error: str) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE tasks SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                "token = NULL, error = ? WHERE key = ? AND token = ? AND state = ?",
+                (
+                    self.max_attempts,
+                    FAILED,
+                    QUEUED,
+                    error,
+                    lease.key,
+                    lease.token,
+                    LEASED,
+                ),
+            )
+
+    def retry(self, key: str) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE tasks SET state = ?, attempts = 0, error = NULL "
+                "WHERE key = ? AND state = ?",
+                (QUEUED, key, FAILED),
+            )
+
+    def get(self, key: str) -> Optional[Tuple[str, Any, Optional[str]]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT state, result, error FROM tasks WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        state, result, error = row
+        return state, None if result is None else json.loads(result), error
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT state, COUNT(*) FROM tasks GROUP BY state"
+            ).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('closed', '1')")
+
+    def reopen(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM meta WHERE name = 'closed'")
+
+    def is_closed(self) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM meta WHERE name = 'closed'"
+            ).fetchone()
+        return row is not None
+
+    def clear(self) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM tasks")
+            self._db.execute("DELETE FROM meta")
+
+
+class RedisQueue(WorkQueue):
+    """
+    A work queue on a Redis server (or anything speaking its protocol), for workers
+    on many machines. `redis` is a client with the redis-py API.
+
+    Tasks live under keys prefixed with `name`: a hash of payloads, a list of queued
+    keys, a list of keys being leased, a sorted set of leases by expiry and hashes of
+    lease tokens, attempts, results and errors.
+
+    A lease takes several commands, so a task is first moved atomically from the
+    queued list to the leasing list (with RPOPLPUSH) and only taken off it once its
+    lease is in the sorted set; a task is always in one of the two lists or the set.
+    A task left in the leasing list without a lease, by a worker that died halfway
+    through leasing it, is queued again once it has been seen there for a whole
+    lease.
+    """
+
+    def __init__(self, redis, name: str = "comics_net", **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.redis = redis
+        self.name = name
+
+    def _key(self, suffix: str) -> str:
+        return "{}:{}".format(self.name, suffix)
+
+    def put(self, key: str, payload: Any) -> bool:
+        if not self.redis.hsetnx(self._key("tasks"), key, json.dumps(payload)):
+            return False
+        self._queue(key)
+        return True
+
+    def _queue(self, key: str) -> None:
+        # tasks are pushed on the left and leased from the right, oldest first
+        self.redis.lpush(self._key("queued"), key)
+
+    def _expire_leases(self, now: float, lease_seconds: float) -> None:
+        """
+        Queue the tasks whose lease expired again, or fail them if out of attempts,
+        and queue again the tasks stuck in the leasing list.
+        """
+        for key in self.redis.zrangebyscore(self._key("leases"), "-inf", now):
+            key = _decode(key)
+            # only the caller that removes the lease requeues the task
+            if self.redis.zrem(self._key("leases"), key) == 1:
+                self._release(key, "lease expired")
+
+        for key in self.redis.lrange(self._key("leasing"), 0, -1):
+            key = _decode(key)
+            leased = self.redis.zscore(self._key("leases"), key) is not None
+            if leased or self.redis.hexists(self._key("results"), key):
+                # leased (or done) by a worker that died before taking it off
+                self._unstick(key)
+                continue
+            self.redis.hsetnx(self._key("stuck"), key, now)
+            stuck_since = float(self.redis.hget(self._key("stuck"), key) or now)
+            # only the caller that takes it off the list requeues the task
+            if now - stuck_since >= lease_seconds and (
+                self.redis.lrem(self._key("leasing"), 1, key) == 1
+            ):
+                self.redis.hdel(self._key("stuck"), key)
+                self._queue(key)
+
+    def _unstick(self, key: str) -> None:
+        self.redis.lrem(self._key("leasing"), 1, key)
+        self.redis.hdel(self._key("stuck"), key)
+
+    def _release(self, key: str, error: str) -> None:
+        self.redis.hdel(self._key("tokens"), key)
+        attempts = int(self.redis.hget(self._key("attempts"), key) or 0)
+        if attempts >= self.max_attempts:
+            self.redis.hset(self._key("errors"), key, error)
+        else:
+            self._queue(key)
+
+    def lease(self, lease_seconds: float = 300.0) -> Optional[Lease]:
+        now = self._clock()
+        self._expire_leases(now, lease_seconds)
+        while True:
+            key = self.redis.rpoplpush(self._key("queued"), self._key("leasing"))
+            if key is None:
+                return None
+            key = _decode(key)
+            if self.redis.hexists(self._key("results"), key):
+                self._unstick(key)
+                continue
+            token = uuid4().hex
+            expires = now + lease_seconds
+            self.redis.hincrby(self._key("attempts"), key, 1)
+            self.redis.hset(self._key("tokens"), key, token)
+            self.redis.zadd(self._key("leases"), {key: expires})
+            self._unstick(key)
+            payload = json.loads(_decode(self.redis.hget(self._key("tasks"), key)))
+            return Lease(key, payload, token, expires)
+
+    def complete(self, key: str, result: Any) -> bool:
+        recorded = self.redis.hsetnx(self._key("results"), key, json.dumps(result))
+        self.redis.zrem(self._key("leases"), key)
+        self.redis.hdel(self._key("tokens"), key)
+        self.redis.hdel(self._key("errors"), key)
+        return bool(recorded)
+
+    def fail(self, lease: Lease, error: str) -> None:
+        token = self.redis.hget(self._key("tokens"), lease.key)
+        if token is None or _decode(token) != lease.token:
+            return
+        if self.redis.zrem(self._key("leases"), lease.key) == 1:
+            self._release(lease.key, error)
+
+    def retry(self, key: str) -> None:
+        if self.redis.hdel(self._key("errors"), key) == 1:
+            self.redis.hset(self._key("attempts"), key, 0)
+            self._queue(key)
+
+    def get(self, key: str) -> Optional[Tuple[str, Any, Optional[str]]]:
+        result = self.redis.hget(self._key("results"), key)
+        if result is not None:
+            return DONE, json.loads(_decode(result)), None
+        error = self.redis.hget(self._key("errors"), key)
+        if error is not None:
+            return FAILED, None, _decode(error)
+        if self.redis.zscore(self._key("leases"), key) is not None:
+            return LEASED, None, None
+        if self.redis.hexists(self._key("tasks"), key):
+            return QUEUED, None, None
+        return None
+
+    def stats(self) -> dict:
+        done = self.redis.hlen(self._key("results"))
+        failed = self.redis.hlen(self._key("errors"))
+        leased = self.redis.zcard(self._key("leases"))
+        queued = self.redis.hlen(self._key("tasks")) - done - failed - leased
+        stats = {QUEUED: queued, LEASED: leased, DONE: done, FAILED: failed}
+        return {state: count for state, count in stats.items() if count > 0}
+
+    def close(self) -> None:
+        self.redis.set(self._key("closed"), 1)
+
+    def reopen(self) -> None:
+        self.redis.delete(self._key("closed"))
+
+    def is_closed(self) -> bool:
+        return self.redis.get(self._key("closed")) is not None
+
+    def clear(self) -> None:
+        for suffix in [
+            "tasks",
+            "queued",
+            "leasing",
+            "stuck",
+            "leases",
+            "tokens",
+            "attempts",
+            "results",
+            "errors",
+            "closed",
+        ]:
+            self.redis.delete(self._key(suffix))
+
+
+def _decode(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def open_queue(url: str, **kwargs) -> WorkQueue:
+    """
+    Open the work queue at `url`: redis://host:port/db for a Redis server, or the
+    path of an SQLite file.
+    """
+    if url.startswith("redis://"):
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("A redis:// work queue needs the redis package")
+        return RedisQueue(redis.Redis.from_url(url), **kwargs)
+    if url.startswith("sqlite://"):
+        url = url[len("sqlite://") :]
+    return SQLiteQueue(url, **kwargs)
@@ -0,0 +1,126 @@
+"Buffered writer of the jsonlines metadata files of a crawl"
+
+import json
+import os
+import threading
+import time
+from typing import Callable, List, Optional
+
+from comics_net.store import MetadataStore
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+# max number of records buffered before they are written
+BATCH_SIZE = 100
+
+# max number of seconds a record waits in the buffer before it is written, checked on
+# every write
+FLUSH_SECONDS = 5.0
+
+# the encoding jsonlines writes with, so files look the same whoever wrote them
+_encode = json.JSONEncoder(ensure_ascii=False).encode
+
+
+class MetadataSink:
+    """
+    Append records to a jsonlines file in batches, keeping the file open.
+
+    Records are buffered and written `batch_size` at a time, or once the oldest has
+    waited `flush_seconds`, each batch with a single write under an exclusive lock
+    on the file, so sinks of many processes appending to one file never interleave
+    records. A checkpoint (and closing the sink) also fsyncs the file. Callbacks
+    given with a record run once it is written, e.g. to mark its issue done only
+    when its metadata can no longer be lost with the buffer. Each batch is also
+    appended to the metadata store, if given.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = BATCH_SIZE,
+        flush_seconds: float = FLUSH_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        store: Optional[MetadataStore] = None,
+    ) -> None:
+        self.path = path
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.written = 0
+        self.flushes = 0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._lines: List[bytes] = []
+        self._records: List[dict] = []
+        self._callbacks: List[Callable[[], None]] = []
+        self._oldest = 0.0
+        self._file = open(path, "ab")
+
+    def write(
+        self, record: dict, on_flush: Optional[Callable[[], None]] = None
+    ) -> None:
+        """
+        Buffer a record, writing the buffer if it is full or old enough.
+        """
+        with self._lock:
+            if len(self._lines) == 0:
+                self._oldest = self._clock()
+            self._lines.append(_encode(record).encode("utf-8") + b"\n")
+            if self.store is not None:
+                self._records.append(record)
+            if on_flush is not None:
+                self._callbacks.append(on_flush)
+            full = len(self._lines) >= self.batch_size
+            old = self._clock() - self._oldest >= self.flush_seconds
+        if full or old:
+            self.flush()
+
+    def _write(self, data: bytes, sync: bool) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        try:
+            self._file.write(data)
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+    def flush(self, sync: bool = False) -> None:
+        """
+        Write the buffered records, then run their callbacks.
+        """
+        with self._lock:
+            lines, self._lines = self._lines, []
+            records, self._records = self._records, []
+            callbacks, self._callbacks = self._callbacks, []
+            if len(lines) > 0 or sync:
+                self._write(b"".join(lines), sync)
+                if len(records) > 0:
+                    self.store.append(records)
+                self.written += len(lines)
+                self.flushes += 1
+        for callback in callbacks:
+            callback()
+
+    def checkpoint(self) -> None:
+        """
+        Write the buffered records and fsync the file.
+        """
+        self.flush(sync=True)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.checkpoint()
+        self._file.close()
+
+    def __enter__(self) -> "MetadataSink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
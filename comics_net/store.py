@@ -0,0 +1,200 @@
+"Columnar store of the cover metadata scraped from htpps://www.comics.org"
+
+import argparse
+import operator
+import os
+import sys
+import time
+from glob import glob
+from typing import Iterable, List, Optional, Tuple, Union
+from uuid import uuid4
+
+import pandas as pd
+from pandas import DataFrame
+
+from comics_net.jsonl import iter_jsonl_chunks
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+
+# tables of the store: one row per issue, and one row per cover of an issue
+ISSUES = "issues"
+COVERS = "covers"
+
+# keys of the metadata of an issue holding its covers, by cover name; older
+# metadata has variant_covers
+COVER_KEYS = ["covers", "variant_covers"]
+
+# columns of the issue a cover row is keyed by
+COVER_ISSUE_COLUMNS = ["series_name", "title", "on_sale_date"]
+
+# comparisons of the (column, op, value) filter tuples of a read
+FILTER_OPS = {
+    "=": operator.eq,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def flatten_metadata(metadata: dict) -> Tuple[dict, List[dict]]:
+    """
+    Split the metadata of an issue into its issue row and a row per cover.
+    """
+    issue = {k: _to_str(v) for k, v in metadata.items() if k not in COVER_KEYS}
+
+    covers = []
+    for key in COVER_KEYS:
+        for cover_name, cover in (metadata.get(key) or {}).items():
+            row = {k: issue.get(k) for k in COVER_ISSUE_COLUMNS}
+            row["cover_name"] = cover_name
+            row.update({k: _to_str(v) for k, v in cover.items()})
+            covers.append(row)
+    return issue, covers
+
+
+def _to_str(value) -> Optional[str]:
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def filters_to_expression(filters: list) -> "ds.Expression":
+    """
+    Given a list of (column, op, value) tuples return the pyarrow expression of
+    them and-ed together; the op is a comparison, "in" or "not in".
+    """
+    expression = None
+    for column, op, value in filters:
+        field = ds.field(column)
+        if op == "in":
+            condition = field.isin(value)
+        elif op == "not in":
+            condition = ~field.isin(value)
+        elif op in FILTER_OPS:
+            condition = FILTER_OPS[op](field, value)
+        else:
+            raise ValueError("Unknown filter op {}".format(op))
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+class MetadataStore:
+    """
+    Parquet tables of the issues and covers in the metadata, in a directory.
+
+    Every batch appended is written to new part files of each table (moved into
+    place once whole), so the store grows incrementally and writers of many
+    processes never touch the same file. Every column is a string; a column can be
+    missing from the parts written before it showed up. Reads only decode the
+    columns asked for, and skip the row groups a filter rules out. Needs pyarrow.
+    """
+
+    def __init__(self, path: str) -> None:
+        if pa is None:
+            raise ImportError("A metadata store needs the pyarrow package")
+        self.path = path
+        for table in [ISSUES, COVERS]:
+            os.makedirs(os.path.join(path, table), exist_ok=True)
+
+    def parts(self, table: str = ISSUES) -> List[str]:
+        """
+        Return the part files of a table, in the order they were written.
+        """
+        return sorted(glob(os.path.join(self.path, table, "*.parquet")))
+
+    def _write(self, table: str, rows: List[dict], name: str) -> None:
+        if len(rows) == 0:
+            return
+        columns = list(dict.fromkeys(k for row in rows for k in row))
+        schema = pa.schema([(column, pa.string()) for column in columns])
+        arrays = [pa.array([row.get(c) for row in rows], pa.string()) for c in columns]
+        path = os.path.join(self.path, table, name)
+        pq.write_table(pa.Table.from_arrays(arrays, schema=schema), path + ".part")
+        os.replace(path + ".part", path)
+
+    def append(self, records: Iterable[dict]) -> int:
+        """
+        Append the metadata of issues to the store. Return the number appended.
+        """
+        issues, covers = [], []
+        for metadata in records:
+            issue, issue_covers = flatten_metadata(metadata)
+            issues.append(issue)
+            covers.extend(issue_covers)
+
+        name = "{:020d}-{}.parquet".format(int(time.time() * 1e9), uuid4().hex)
+        self._write(ISSUES, issues, name)
+        self._write(COVERS, covers, name)
+        return len(issues)
+
+    def schema(self, table: str = ISSUES):
+        """
+        Return the schema of a table, reading only the footers of its parts.
+        """
+        return pa.unify_schemas([pq.read_schema(part) for part in self.parts(table)])
+
+    def read(
+        self,
+        table: str = ISSUES,
+        columns: Optional[List[str]] = None,
+        filters: Union[None, list, "ds.Expression"] = None,
+    ) -> DataFrame:
+        """
+        Read the columns of a table, or all of them, into a DataFrame. `filters` is
+        a pyarrow expression, or a list of (column, op, value) tuples and-ed
+        together, e.g. [("on_sale_date", ">=", "1990")].
+        """
+        parts = self.parts(table)
+        if len(parts) == 0:
+            return pd.DataFrame(columns=columns or [])
+
+        schema = self.schema(table)
+        for column in columns or []:
+            if schema.get_field_index(column) == -1:
+                schema = schema.append(pa.field(column, pa.string()))
+        if isinstance(filters, list):
+            filters = filters_to_expression(filters)
+
+        dataset = ds.dataset(parts, schema=schema, format="parquet")
+        return dataset.to_table(columns=columns, filter=filters).to_pandas()
+
+
+def convert_jsonl(
+    metadata_path: str, store: MetadataStore, batch_size: int = 10000
+) -> int:
+    """
+    Append the issues of a jsonlines metadata file to a store, `batch_size` at a
+    time. Return the number of issues appended.
+    """
+    converted = 0
+    for batch in iter_jsonl_chunks(metadata_path, batch_size):
+        converted += store.append(batch)
+    return converted
+
+
+def main(main_args):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("metadata_path", help="jsonlines metadata file to convert")
+    parser.add_argument("store_path", help="directory of the metadata store")
+    parser.add_argument(
+        "--batch_size",
+        required=False,
+        default=10000,
+        help="number of issues to write to each part file",
+    )
+    args = parser.parse_args(main_args)
+
+    converted = convert_jsonl(
+        args.metadata_path, MetadataStore(args.store_path), int(args.batch_size)
+    )
+    print("Converted {} issue(s) to {}".format(converted, args.store_path))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,3 +1,9 @@
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
 import comics_net.analyzer as analyzer
 
 metadata_path = "./comics_net/resources/metadata.jsonl"
@@ -40,6 +46,18 @@ def test_load_metadata():
     assert set(metadata.keys()).difference(expected_keys) == set()
 
 
+def test_load_metadata_columns():
+    metadata = analyzer.load_metadata(metadata_path)
+    columns = ["title", "on_sale_date", "cover_characters"]
+
+    selected = analyzer.load_metadata(metadata_path, columns=columns, chunk_size=1)
+    assert list(selected.columns) == columns
+    assert selected.equals(metadata[columns])
+
+    chunks = list(analyzer.load_metadata_chunks(metadata_path, 1, columns))
+    assert [len(chunk) for chunk in chunks] == [1] * len(metadata)
+
+
 def test_get_issue_number_from_title():
     title = "Superman #12"
     results = analyzer.get_issue_number_from_title(title)
@@ -65,6 +83,33 @@ def test_replace_semicolons_in_brackets():
     results = analyzer.replace_semicolons_in_brackets(test)
     assert results == """Superman [Clark Kent/ Kal-El]"""
 
+    test = "Thor [Donald Blake; Thor Odinson]; Avengers [Thor; Hulk]; X [Logan; Y]"
+    results = analyzer.replace_semicolons_in_brackets(test)
+    assert results == (
+        "Thor [Donald Blake/ Thor Odinson]; Avengers [Thor; Hulk]; X [Logan; Y]"
+    )
+
+    # an alias nested in a team is rewritten too, as it appears on its own elsewhere
+    test = (
+        "Justice League [Lois Lane [James Howlett; Logan]; Batman; Superman]; "
+        "Lois Lane [James Howlett; Logan]"
+    )
+    results = analyzer.replace_semicolons_in_brackets(test)
+    assert results == (
+        "Justice League [Lois Lane [James Howlett/ Logan]; Batman; Superman]; "
+        "Lois Lane [James Howlett/ Logan]"
+    )
+
+
+def test_literals_pattern():
+    p = re.compile(analyzer.literals_pattern(["Kal-El", "Kal-L", "Kara Zor-El", "Kal"]))
+    assert [m.group() for m in p.finditer("Kal-El; Kara Zor-El; Ka; Kal-L")] == [
+        "Kal",
+        "Kara Zor-El",
+        "Kal",
+    ]
+    assert re.search(analyzer.literals_pattern([]), "anything") is None
+
 
 def test_look_behind():
     s = "Superman; Batman; Wonder Woman"
@@ -99,8 +144,169 @@ def test_convert_characters_to_list():
     ]
 
 
+def test_convert_characters_to_list_teams():
+    s = (
+        "Hugo Strange; Justice League of America [Batman [Bruce Wayne]; "
+        "Superman [Clark Kent; Kal-El]; Flash [Barry Allen]]; Alfred Pennyworth; "
+        "Teen Titans [Robin [Dick Grayson]; Cyborg; Raven]; Joker"
+    )
+    results = analyzer.convert_characters_to_list(s)
+    assert results == [
+        "Batman [Bruce Wayne]",
+        "Superman [Clark Kent/ Kal-El]",
+        "Flash [Barry Allen]",
+        "Robin [Dick Grayson]",
+        "Cyborg",
+        "Raven",
+        "Hugo Strange",
+        "Alfred Pennyworth",
+        "Joker",
+    ]
+
+
+def test_parse_characters():
+    s = "Avengers [Iron Man [Tony Stark]; Thor; Hulk]; Spider-Man [Peter Parker]"
+    results = analyzer.parse_characters(s)
+    assert results == {
+        "Teams": {"Avengers": ["Iron Man [Tony Stark]", "Thor", "Hulk"]},
+        "Individuals": ["Spider-Man [Peter Parker]"],
+    }
+
+    # the same as diffing out the teams, as convert_characters_to_list used to
+    team_string = analyzer.convert_character_dict_to_str(results)
+    remainder = analyzer.diff_strings(team_string, s)
+    assert results["Individuals"] == list(
+        filter(lambda x: x != "", remainder.split("; "))
+    )
+
+    assert analyzer.parse_characters("") == {"Teams": {}, "Individuals": []}
+
+
+def test_parse_characters_repeated_team():
+    s = (
+        "Avengers [Thor; Iron Man; Hulk]; Spider-Man; "
+        "Avengers [Hawkeye; Vision; Wasp]"
+    )
+    assert analyzer.parse_characters(s) == {
+        "Teams": {
+            "Avengers": ["Thor", "Iron Man", "Hulk", "Hawkeye", "Vision", "Wasp"]
+        },
+        "Individuals": ["Spider-Man"],
+    }
+
+
+def test_split_alias():
+    assert analyzer.split_alias("Batman [Bruce Wayne]") == ("Batman", "Bruce Wayne")
+    assert analyzer.split_alias("Iron Man [Tony Stark [Anthony]] ") == (
+        "Iron Man",
+        "Tony Stark [Anthony]",
+    )
+    assert analyzer.split_alias("Thor") == ("Thor", None)
+
+
+def test_parse_characters_column():
+    avengers = "Avengers [Iron Man [Tony Stark]; Thor; Hulk]; Spider-Man [Peter Parker]"
+    characters = pd.Series(
+        [avengers, None, "Batman [Bruce Wayne]", avengers, ""], index=[5, 6, 7, 8, 9]
+    )
+
+    df = analyzer.parse_characters_column(characters)
+    assert list(df.columns) == ["row_id", "team", "character", "alias"]
+    rows = [
+        ("Avengers", "Iron Man", "Tony Stark"),
+        ("Avengers", "Thor", None),
+        ("Avengers", "Hulk", None),
+        (None, "Spider-Man", "Peter Parker"),
+    ]
+    expected = (
+        [(5,) + row for row in rows]
+        + [(7, None, "Batman", "Bruce Wayne")]
+        + [(8,) + row for row in rows]
+    )
+    assert [
+        tuple(None if pd.isna(x) else x for x in row)
+        for row in df.itertuples(index=False)
+    ] == expected
+
+    # the characters of each row are those of convert_characters_to_list
+    for row_id, group in df.groupby("row_id"):
+        assert len(group) == len(
+            analyzer.convert_characters_to_list(characters[row_id])
+        )
+
+    assert len(analyzer.parse_characters_column(pd.Series([None, None]))) == 0
+
+
+def test_parse_characters_column_processes(monkeypatch):
+    monkeypatch.setattr(analyzer, "PARSE_CHUNK_SIZE", 2)
+    characters = pd.Series(
+        ["Batman [Bruce Wayne]; Robin #{}".format(i % 7) for i in range(50)]
+    )
+
+    df = analyzer.parse_characters_column(characters, processes=2)
+    assert df.equals(analyzer.parse_characters_column(characters))
+    assert len(df) == 100
+
+
+def make_covers() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "save_to": ["a.jpg", "b.jpg", "a.jpg", "c.jpg", "d.jpg"],
+            "cover_characters_list_aliases": [
+                ["Batman [Bruce Wayne]", "Robin [Dick Grayson]"],
+                ["Superman [Clark Kent]"],
+                ["Batman [Bruce Wayne]"],
+                ["Batman [Bruce Wayne]", "Batman [Bruce Wayne]"],
+                np.nan,
+            ],
+            "synopsis": ["a", "b", "a again", "c", "d"],
+        },
+        index=[10, 11, 12, 13, 14],
+    )
+
+
+def test_character_index(tmp_path):
+    df_covers = make_covers()
+    index = analyzer.CharacterIndex.build(df_covers)
+
+    assert len(index) == 5
+    assert index.rows("Batman [Bruce Wayne]").tolist() == [0, 2, 3]
+    assert index.rows("Superman [Clark Kent]").tolist() == [1]
+    assert index.rows("Wonder Woman").tolist() == []
+    assert index.first_rows.tolist() == [0, 1, 0, 3, 4]
+
+    path = str(tmp_path / "characters.npz")
+    index.save(path)
+    loaded = analyzer.CharacterIndex.load(path)
+    assert loaded.postings.keys() == index.postings.keys()
+    for character in index.postings:
+        assert loaded.rows(character).tolist() == index.rows(character).tolist()
+    assert loaded.first_rows.tolist() == index.first_rows.tolist()
+
+
 def test_get_random_sample_of_covers():
-    assert True
+    df_covers = make_covers()
+    index = analyzer.CharacterIndex.build(df_covers)
+
+    covers = analyzer.get_random_sample_of_covers(
+        df_covers, "Batman [Bruce Wayne]", n=10, index=index
+    )
+    assert sorted(covers) == ["cover_0", "cover_1", "cover_2"]
+    assert covers["cover_1"] == {
+        "image_path": "a.jpg",
+        # the characters of a cover are those of the first row of its image
+        "characters": ["Batman [Bruce Wayne]", "Robin [Dick Grayson]"],
+        "synopsis": "a again",
+    }
+
+    covers = analyzer.get_random_sample_of_covers(
+        df_covers, "Batman [Bruce Wayne]", n=2
+    )
+    assert len(covers) == 2
+    assert analyzer.get_random_sample_of_covers(df_covers, "Joker", n=2) == {}
+
+    with pytest.raises(ValueError):
+        analyzer.get_random_sample_of_covers(df_covers[:2], "Joker", n=2, index=index)
 
 
 def test_create_training_dirs():
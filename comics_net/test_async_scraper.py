@@ -0,0 +1,22 @@
+def test_async_engine_matches_sync_engine(tmp_path, crawl):
+    sync_metadata, sync_covers = crawl(tmp_path / "sync", "sync")
+    async_metadata, async_covers = crawl(tmp_path / "async", "async")
+
+    assert [x["title"] for x in sync_metadata] == [
+        "Action Comics #1",
+        "Action Comics #2 [Direct]",
+        "Action Comics #3",
+    ]
+    assert async_metadata == sync_metadata
+    assert len(sync_covers) == 6
+    assert async_covers == sync_covers
+
+
+def test_async_engine_parses_on_processes(tmp_path, crawl):
+    sync_metadata, sync_covers = crawl(tmp_path / "sync", "sync")
+    async_metadata, async_covers = crawl(
+        tmp_path / "async", "async", parse_processes=2
+    )
+
+    assert async_metadata == sync_metadata
+    assert async_covers == sync_covers
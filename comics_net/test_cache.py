@@ -0,0 +1,137 @@
+import os
+
+import comics_net.http_client as http_client
+import comics_net.webscraper as webscraper
+from comics_net.cache import DAY, ResponseCache
+
+
+def test_ttl_by_url_class(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    assert cache.ttl("https://www.comics.org/publisher/54/?page=1") == DAY
+    assert cache.ttl("https://www.comics.org/issue/36858/cover/4/") == 30 * DAY
+    assert cache.ttl("https://www.comics.org/issue/370657/") == 7 * DAY
+    assert cache.ttl("https://www.comics.org/searchNew/") == DAY
+
+
+def test_store_and_lookup(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path), clock=clock)
+    url = "https://www.comics.org/issue/370657/"
+
+    assert cache.lookup(url) is None
+
+    cache.store(url, b"<html></html>", {"ETag": '"v1"'})
+    entry = cache.lookup(url)
+    assert entry.validators() == {"If-None-Match": '"v1"'}
+    assert cache.is_fresh(entry)
+    assert cache.hit(entry) == b"<html></html>"
+
+    clock.now += 7 * DAY
+    assert not cache.is_fresh(entry)
+    assert cache.revalidated(entry) == b"<html></html>"
+    assert cache.is_fresh(cache.lookup(url))
+
+    # a cache reopened from disk keeps its entries
+    cache = ResponseCache(str(tmp_path), clock=clock)
+    assert cache.hit(cache.lookup(url)) == b"<html></html>"
+
+
+def test_identical_bodies_are_stored_once(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.store("https://www.comics.org/issue/1/", b"<html></html>", {})
+    cache.store("https://www.comics.org/issue/2/", b"<html></html>", {})
+    assert cache.size() == len(b"<html></html>")
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path), max_bytes=25, clock=clock)
+    urls = ["https://www.comics.org/issue/{}/".format(i) for i in range(3)]
+
+    cache.store(urls[0], b"issue 0 page", {})
+    clock.now += 1
+    cache.store(urls[1], b"issue 1 page", {})
+    clock.now += 1
+    cache.hit(cache.lookup(urls[0]))
+    clock.now += 1
+    cache.store(urls[2], b"issue 2 page", {})
+
+    assert cache.size() == 24
+    assert cache.lookup(urls[0]) is not None
+    assert cache.lookup(urls[1]) is None
+    assert cache.lookup(urls[2]) is not None
+
+
+def test_evicts_as_many_entries_as_needed(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path), max_bytes=40, clock=clock)
+    urls = ["https://www.comics.org/issue/{}/".format(i) for i in range(4)]
+    for i, url in enumerate(urls[:3]):
+        cache.store(url, "issue {} page".format(i).encode("utf-8"), {})
+        clock.now += 1
+
+    # a big body pushes out the two least recently used
+    cache.store(urls[3], b"issue 3 page, a long one", {})
+
+    assert cache.size() == 36
+    assert [cache.lookup(url) is not None for url in urls] == [False, False, True, True]
+    objects = os.walk(os.path.join(str(tmp_path), "objects"))
+    assert sum(len(files) for _, _, files in objects) == 2
+
+
+def test_store_releases_replaced_bodies(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    url = "https://www.comics.org/issue/1/"
+    cache.store(url, b"first version", {})
+    first = cache.lookup(url).digest
+    cache.store(url, b"second version", {})
+
+    assert cache.size() == len(b"second version")
+    assert not os.path.exists(cache._object_path(first))
+
+
+def test_index_is_opened_for_many_processes(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    assert cache._db.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_simple_get_revalidates_stale_pages(tmp_path, clock, page_server):
+    url = page_server.url + "/issue/370657/"
+
+    cache = ResponseCache(str(tmp_path), clock=clock)
+    http_client.configure(timeout=5, cache=cache)
+    try:
+        html = webscraper.simple_get(url)
+        assert webscraper.simple_get(url) == html
+        clock.now += 8 * DAY
+        assert webscraper.simple_get(url) == html
+    finally:
+        http_client.configure()
+
+    assert page_server.requests == [
+        ("/issue/370657/", None),
+        ("/issue/370657/", '"v1"'),
+    ]
+    assert cache.hits == 1
+    assert cache.revalidations == 1
+    assert cache.misses == 1
+
+
+def test_simple_get_refetches_evicted_pages(tmp_path, clock, page_server):
+    url = page_server.url + "/issue/370657/"
+
+    cache = ResponseCache(str(tmp_path), clock=clock)
+    http_client.configure(timeout=5, cache=cache)
+    try:
+        html = webscraper.simple_get(url)
+        # the body is evicted while the entry is stale
+        os.remove(cache._object_path(cache.lookup(url).digest))
+        clock.now += 8 * DAY
+        assert webscraper.simple_get(url) == html
+        # and stored again
+        assert cache.hit(cache.lookup(url)) == html
+    finally:
+        http_client.configure()
+
+    assert page_server.requests == [
+        ("/issue/370657/", None),
+        ("/issue/370657/", '"v1"'),
+        ("/issue/370657/", None),
+    ]
@@ -0,0 +1,97 @@
+import os
+
+import jsonlines
+import pandas as pd
+
+import comics_net.webscraper as webscraper
+from comics_net.compaction import (
+    compact,
+    iter_shards,
+    load_shards,
+    read_manifest,
+    shard_paths,
+)
+
+
+def write_records(path: str, records) -> None:
+    with jsonlines.open(path, mode="a") as writer:
+        for record in records:
+            writer.write(record)
+
+
+def crawls():
+    """
+    Two crawls of the same issues, the second re-scraping one with a new synopsis
+    and pulling one more.
+    """
+    first = [
+        {"title": "Batman #{}".format(i), "on_sale_date": str(1940 + i), "v": 1}
+        for i in range(10)
+    ]
+    second = [
+        {"title": "Batman #3 [Direct]", "on_sale_date": "1943", "v": 2},
+        {"title": "Batman #10", "on_sale_date": "1950", "v": 2},
+    ]
+    return first, second
+
+
+def test_compact_keeps_last_write_of_each_issue(tmp_path):
+    metadata_path = str(tmp_path / "covers.jsonl")
+    first, second = crawls()
+    write_records(metadata_path, first + second)
+
+    manifest = compact(metadata_path, str(tmp_path / "shards"), max_shard_bytes=200)
+    assert manifest["records"] == 11
+    assert manifest["dropped"] == 1
+
+    records = list(iter_shards(str(tmp_path / "shards")))
+    assert records == first[:3] + first[4:] + second
+
+    # every shard but an oversized record fits the bound
+    assert len(manifest["shards"]) > 1
+    for shard, path in zip(manifest["shards"], shard_paths(str(tmp_path / "shards"))):
+        assert shard["bytes"] == os.path.getsize(path) <= 200
+    assert sum(shard["records"] for shard in manifest["shards"]) == 11
+
+
+def test_compact_again_drops_stale_shards(tmp_path):
+    metadata_path = str(tmp_path / "covers.jsonl")
+    out_dir = str(tmp_path / "shards")
+    first, second = crawls()
+    write_records(metadata_path, first)
+    compact(metadata_path, out_dir, max_shard_bytes=100)
+    shards = len(read_manifest(out_dir)["shards"])
+
+    compact(metadata_path, out_dir, max_shard_bytes=10000)
+    assert len(read_manifest(out_dir)["shards"]) == 1
+    assert len(os.listdir(out_dir)) == 2 < shards + 1
+
+
+def test_compact_in_place(tmp_path):
+    metadata_path = str(tmp_path / "covers.jsonl")
+    first, second = crawls()
+    write_records(metadata_path, first + second)
+
+    compact(metadata_path, str(tmp_path / "shards"), in_place=True)
+    assert webscraper.read_jsonl(metadata_path) == first[:3] + first[4:] + second
+
+    # re-crawling the same issues and compacting again doesn't grow the file
+    size = os.path.getsize(metadata_path)
+    write_records(metadata_path, second)
+    compact(metadata_path, str(tmp_path / "shards"), in_place=True)
+    assert os.path.getsize(metadata_path) == size
+
+
+def test_load_shards_in_parallel(tmp_path):
+    metadata_path = str(tmp_path / "covers.jsonl")
+    first, second = crawls()
+    write_records(metadata_path, first + second)
+    compact(metadata_path, str(tmp_path / "shards"), max_shard_bytes=150)
+
+    expected = pd.DataFrame(first[:3] + first[4:] + second)
+    for processes in [1, 3]:
+        df = load_shards(str(tmp_path / "shards"), processes=processes)
+        pd.testing.assert_frame_equal(df, expected)
+
+    df = load_shards(str(tmp_path / "shards"), columns=["title"], processes=2)
+    assert list(df.columns) == ["title"]
@@ -0,0 +1,148 @@
+import os
+import threading
+from unittest import mock
+
+import comics_net.http_client as http_client
+import comics_net.webscraper as webscraper
+import comics_net.webscraper_main as webscraper_main
+from comics_net.distributed import Coordinator, Worker
+from comics_net.downloader import CoverDownloader
+from comics_net.frontier import FAILED, Frontier
+from comics_net.queues import RedisQueue, open_queue
+from comics_net.testing import fake_download, make_specs
+from comics_net.webscraper import URL
+
+
+def start_workers(queue_factory, count: int):
+    """
+    Run `count` workers on threads, each with its own queue connection.
+    """
+    threads = []
+    for _ in range(count):
+        worker = Worker(
+            queue_factory(), CoverDownloader(http_client.HTTPClient()), poll=0.01
+        )
+        thread = threading.Thread(target=worker.run, daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
+
+
+def test_distributed_engine_matches_sync_engine(
+    tmp_path, monkeypatch, crawl, fake_site
+):
+    sync_metadata, sync_covers = crawl(tmp_path / "sync", "sync")
+
+    tmp_path = tmp_path / "distributed"
+    tmp_path.mkdir()
+    monkeypatch.chdir(str(tmp_path))
+    os.makedirs("metadata")
+    os.makedirs("covers")
+
+    specs = make_specs(engine="distributed")
+    with mock.patch.object(webscraper, "simple_get", side_effect=fake_site.get):
+        with mock.patch.object(http_client.HTTPClient, "download", fake_download):
+            threads = start_workers(lambda: open_queue(specs["queue"]), 2)
+            webscraper_main.run_scraper(specs)
+            for thread in threads:
+                thread.join(timeout=10)
+                assert not thread.is_alive()
+
+    assert webscraper.read_jsonl("./metadata/covers.jsonl") == sync_metadata
+    assert sorted(os.listdir("covers")) == sorted(sync_covers)
+
+
+def test_coordinator_over_redis_queue(tmp_path, monkeypatch, fake_site, fake_redis):
+    monkeypatch.chdir(str(tmp_path))
+    os.makedirs("covers")
+    root = URL + "/publisher/54/?page=1"
+
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"))
+    frontier.add(root, "publisher", {"series": None, "issue_count": 2}, root=root)
+    dedup_index = webscraper.DuplicateIndex()
+    coordinator = Coordinator(
+        RedisQueue(fake_redis), frontier, dedup_index, "covers.jsonl", poll=0.01
+    )
+
+    requested = []
+
+    def get(url):
+        requested.append(url)
+        return fake_site.get(url)
+
+    with mock.patch.object(webscraper, "simple_get", side_effect=get):
+        with mock.patch.object(http_client.HTTPClient, "download", fake_download):
+            threads = start_workers(lambda: RedisQueue(fake_redis), 3)
+            assert coordinator.run(root) == 3
+            coordinator.queue.close()
+            for thread in threads:
+                thread.join(timeout=10)
+
+    assert [x["title"] for x in webscraper.read_jsonl("covers.jsonl")] == [
+        "Action Comics #1",
+        "Action Comics #2 [Direct]",
+        "Action Comics #3",
+    ]
+    assert coordinator.queue.stats() == {"done": 7}
+    # the cover and variant pages of the duplicate issue are never fetched
+    assert URL + "/issue/15/" in requested
+    assert URL + "/issue/15/cover/4/" not in requested
+    assert URL + "/issue/1501/" not in requested
+    assert frontier.counts(root) == {"done": 9}
+
+
+def test_coordinator_fails_issue_of_failed_covers_task(
+    tmp_path, monkeypatch, fake_site, fake_redis
+):
+    monkeypatch.chdir(str(tmp_path))
+    os.makedirs("covers")
+    root = URL + "/publisher/54/?page=1"
+
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"))
+    frontier.add(root, "publisher", {"series": None, "issue_count": 2}, root=root)
+    dedup_index = webscraper.DuplicateIndex()
+    coordinator = Coordinator(
+        RedisQueue(fake_redis), frontier, dedup_index, "covers.jsonl", poll=0.01
+    )
+
+    # the cover of the first issue can't be downloaded
+    def download(self, url, save_to):
+        if url.endswith("/11.jpg"):
+            raise ValueError("not an image")
+        fake_download(self, url, save_to)
+
+    with mock.patch.object(webscraper, "simple_get", side_effect=fake_site.get):
+        with mock.patch.object(http_client.HTTPClient, "download", download):
+            threads = start_workers(lambda: RedisQueue(fake_redis, max_attempts=1), 2)
+            assert coordinator.run(root) == 2
+            coordinator.queue.close()
+            for thread in threads:
+                thread.join(timeout=10)
+
+    assert [x["title"] for x in webscraper.read_jsonl("covers.jsonl")] == [
+        "Action Comics #2 [Direct]",
+        "Action Comics #3",
+    ]
+    assert frontier.state(URL + "/issue/11/") == FAILED
+    assert not dedup_index.is_duplicate("Action Comics #1", "1938-04-18")
+
+
+def test_coordinator_gives_up_on_lost_tasks(tmp_path, clock):
+
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"))
+    coordinator = Coordinator(
+        open_queue(str(tmp_path / "queue.sqlite")),
+        frontier,
+        webscraper.DuplicateIndex(),
+        str(tmp_path / "covers.jsonl"),
+        poll=1.0,
+        sleep=clock.sleep,
+        task_timeout=10.0,
+        clock=clock,
+    )
+    # a task no worker ever finishes
+    coordinator.submit("issue", URL + "/issue/1/", {"series_name": "Action Comics"})
+
+    state, result, error = coordinator.wait("issue", URL + "/issue/1/")
+    assert (state, result, error) == ("failed", None, "timed out after 10.0s")
+    assert clock.now == 10.0
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+import requests
+
+from comics_net.downloader import (
+    CoverDownloader,
+    InvalidImage,
+    check_image,
+    is_transient,
+)
+from comics_net.testing import JPEG
+
+
+class FakeClient:
+    """
+    A client whose downloads write the given bodies (or raise the given errors) in
+    turn.
+    """
+
+    def __init__(self, *bodies):
+        self.bodies = list(bodies)
+        self.urls = []
+
+    def download(self, url, save_to):
+        self.urls.append(url)
+        body = self.bodies.pop(0)
+        if isinstance(body, Exception):
+            raise body
+        with open(save_to, "wb") as f:
+            f.write(body)
+
+
+def test_check_image(tmp_path):
+    path = str(tmp_path / "cover.jpg")
+    for body in [b"", b"<html>Not Found</html>", JPEG[:100]]:
+        with open(path, "wb") as f:
+            f.write(body)
+        with pytest.raises(InvalidImage):
+            check_image(path)
+
+    with open(path, "wb") as f:
+        f.write(JPEG)
+    check_image(path)
+
+
+def test_downloader_retries_with_backoff(tmp_path):
+    waits = []
+    client = FakeClient(requests.ConnectionError(), JPEG[:100], JPEG)
+    downloader = CoverDownloader(client, retries=3, backoff=0.5, sleep=waits.append)
+    save_to = str(tmp_path / "cover.jpg")
+    try:
+        assert downloader.submit("https://files1.comics.org/1.jpg", save_to).result()
+
+        assert waits == [0.5, 1.0]
+        assert open(save_to, "rb").read() == JPEG
+        assert os.listdir(str(tmp_path)) == ["cover.jpg"]
+        assert downloader.stats() == {"downloaded": 1, "retried": 2, "failed": 0}
+    finally:
+        downloader.close()
+
+
+def test_downloader_leaves_no_partial_image(tmp_path):
+    client = FakeClient(JPEG[:100], b"")
+    downloader = CoverDownloader(client, retries=1, sleep=lambda x: None)
+    save_to = str(tmp_path / "cover.jpg")
+    try:
+        with pytest.raises(InvalidImage):
+            downloader.submit("https://files1.comics.org/1.jpg", save_to).result()
+
+        assert os.listdir(str(tmp_path)) == []
+        assert downloader.stats() == {"downloaded": 0, "retried": 1, "failed": 1}
+    finally:
+        downloader.close()
+
+
+def http_error(status: int) -> requests.HTTPError:
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError("{} Error".format(status), response=response)
+
+
+def test_is_transient():
+    for error in [
+        requests.ConnectionError(),
+        requests.Timeout(),
+        http_error(429),
+        http_error(503),
+        InvalidImage(),
+        IOError("Got 10 of 20 bytes"),
+    ]:
+        assert is_transient(error)
+    for error in [http_error(404), http_error(403), requests.exceptions.InvalidURL()]:
+        assert not is_transient(error)
+
+
+def test_downloader_fails_client_errors_at_once(tmp_path):
+    waits = []
+    client = FakeClient(http_error(404), JPEG)
+    downloader = CoverDownloader(client, retries=3, sleep=waits.append)
+    save_to = str(tmp_path / "cover.jpg")
+    try:
+        with pytest.raises(requests.HTTPError):
+            downloader.submit("https://files1.comics.org/1.jpg", save_to).result()
+
+        assert waits == []
+        assert client.urls == ["https://files1.comics.org/1.jpg"]
+        assert downloader.stats() == {"downloaded": 0, "retried": 0, "failed": 1}
+    finally:
+        downloader.close()
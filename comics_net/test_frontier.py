@@ -0,0 +1,123 @@
+import os
+from unittest import mock
+
+import requests
+
+import comics_net.frontier as frontier
+import comics_net.http_client as http_client
+import comics_net.webscraper as webscraper
+import comics_net.webscraper_main as webscraper_main
+from comics_net.testing import fake_download, make_specs
+from comics_net.webscraper import URL
+
+ROOT = URL + "/publisher/54/?page=1"
+
+
+def test_frontier_crawls_depth_first(tmp_path):
+    f = frontier.Frontier(str(tmp_path / "frontier.sqlite"))
+    f.add(ROOT, "publisher", {}, root=ROOT)
+
+    assert f.next(ROOT) == (ROOT, "publisher", {})
+    assert f.state(ROOT) == frontier.IN_FLIGHT
+    f.done(ROOT, [("s1", "series", {"n": 1}), ("s2", "series", {"n": 2})])
+
+    assert f.next(ROOT) == ("s1", "series", {"n": 1})
+    f.done("s1", [("i1", "issue", {}), ("i2", "issue", {})])
+
+    # issues found on the first series are crawled before the second series
+    assert f.next(ROOT)[0] == "i1"
+    f.fail("i1", "boom")
+    assert f.next(ROOT)[0] == "i2"
+    f.done("i2")
+    assert f.next(ROOT)[0] == "s2"
+
+    assert f.children("s1") == [("i1", "issue", {}), ("i2", "issue", {})]
+    assert f.counts(ROOT) == {"done": 3, "failed": 1, "in_flight": 1}
+
+
+def test_frontier_resumes_interrupted_crawl(tmp_path):
+    path = str(tmp_path / "frontier.sqlite")
+    f = frontier.Frontier(path)
+    f.add(ROOT, "publisher", {}, root=ROOT)
+    f.next(ROOT)
+    f.done(ROOT, [("s1", "series", {}), ("s2", "series", {})])
+    f.next(ROOT)
+    f.next(ROOT)
+    f.fail("s2", "boom")
+    f.close()
+
+    f = frontier.Frontier(path)
+    f.resume(ROOT)
+    assert f.counts(ROOT) == {"done": 1, "pending": 2}
+    assert [f.next(ROOT)[0], f.next(ROOT)[0], f.next(ROOT)] == ["s1", "s2", None]
+
+    f.reset(ROOT)
+    assert f.counts(ROOT) == {}
+
+
+def test_expand(fake_site):
+    def soup(url):
+        return webscraper.BeautifulSoup(fake_site[url], "html.parser")
+
+    payload = {"series": None, "issue_count": 2}
+    series = frontier.expand(ROOT, "publisher", payload, soup(ROOT))
+    assert series == [
+        (
+            URL + "/series/1/",
+            "series",
+            {"series_name": "Action Comics", "issue_count": 4},
+        )
+    ]
+
+    (gallery,) = frontier.expand(*series[0], soup(series[0][0]))
+    assert gallery[:2] == (URL + "/series/1/covers/", "gallery")
+
+    pages = frontier.expand(*gallery, soup(gallery[0]))
+    assert [page[0] for page in pages] == [
+        URL + "/series/1/covers//?page=1",
+        URL + "/series/1/covers//?page=2",
+    ]
+
+    issues = frontier.expand(*pages[1], soup(pages[1][0]))
+    assert issues == [
+        (URL + "/issue/14/", "issue", {"series_name": "Action Comics"}),
+        (URL + "/issue/15/", "issue", {"series_name": "Action Comics"}),
+    ]
+
+
+def test_resume_retries_failed_issues(tmp_path, monkeypatch, crawl, fake_site):
+    metadata, _ = crawl(tmp_path / "expected", "sync")
+
+    tmp_path = tmp_path / "resumed"
+    tmp_path.mkdir()
+    monkeypatch.chdir(str(tmp_path))
+    os.makedirs("metadata")
+    os.makedirs("covers")
+
+    def flaky_download(self, url, save_to):
+        if "/14.jpg" in url:
+            raise requests.ConnectionError(url)
+        fake_download(self, url, save_to)
+
+    specs = make_specs()
+    with mock.patch.object(webscraper, "simple_get", side_effect=fake_site.get):
+        with mock.patch.object(http_client.HTTPClient, "download", flaky_download):
+            webscraper_main.run_scraper(specs)
+
+    assert len(webscraper.read_jsonl("./metadata/covers.jsonl")) == 2
+
+    # only the failed issue is fetched again when resuming
+    specs.update(resume=True, engine="async")
+    with mock.patch.object(
+        webscraper, "simple_get", side_effect=fake_site.get
+    ) as get:
+        with mock.patch.object(http_client.HTTPClient, "download", fake_download):
+            webscraper_main.run_scraper(specs)
+
+    assert {call[0][0] for call in get.call_args_list} == {
+        URL + "/issue/14/",
+        URL + "/issue/14/cover/4/",
+        URL + "/issue/1401/",
+    }
+    resumed = webscraper.read_jsonl("./metadata/covers.jsonl")
+    assert sorted(x["title"] for x in resumed) == sorted(x["title"] for x in metadata)
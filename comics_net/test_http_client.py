@@ -0,0 +1,65 @@
+import pytest
+
+import comics_net.http_client as http_client
+from comics_net.throttle import RateLimiter
+
+
+def test_client_reuses_connections(page_server):
+    url = page_server.url
+    client = http_client.HTTPClient(pool_maxsize=1, timeout=5)
+    try:
+        for i in range(3):
+            resp = client.get(url + "/issue/{}/".format(i))
+            assert resp.status_code == 200
+            assert resp.content.startswith(b"<html>")
+
+        stats = client.stats()[url]
+        assert stats == {"requests": 3, "hits": 2, "misses": 1}
+    finally:
+        client.close()
+
+
+def test_client_download(tmp_path, page_server):
+    url = page_server.url
+    client = http_client.HTTPClient(timeout=5)
+    save_to = str(tmp_path / "cover.jpg")
+    try:
+        client.download(url + "/cover.jpg", save_to)
+        with open(save_to, "rb") as f:
+            assert f.read() == b"<html><title>Action Comics #854</title></html>"
+    finally:
+        client.close()
+
+
+def test_client_download_fails_on_truncated_body(tmp_path, page_server):
+    url = page_server.url
+    client = http_client.HTTPClient(timeout=5)
+    try:
+        with pytest.raises(IOError):
+            client.download(url + "/truncated.jpg", str(tmp_path / "cover.jpg"))
+    finally:
+        client.close()
+
+
+def test_client_rate_limits_requests(page_server):
+    url = page_server.url
+    limiter = RateLimiter(rate=1000.0, burst=1)
+    client = http_client.HTTPClient(timeout=5, rate_limiter=limiter)
+    try:
+        for i in range(3):
+            client.get(url + "/issue/{}/".format(i))
+        host = "127.0.0.1:{}".format(page_server.server_port)
+        assert limiter.stats()[host]["requests"] == 3
+    finally:
+        client.close()
+
+
+def test_configure(monkeypatch):
+    # the shared client is put back (and left open) once the test is done
+    monkeypatch.setattr(http_client, "_client", None)
+    client = http_client.configure(pool_maxsize=2, timeout=1)
+    try:
+        assert http_client.get_client() is client
+        assert client.timeout == 1
+    finally:
+        client.close()
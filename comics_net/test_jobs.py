@@ -0,0 +1,85 @@
+import os
+from unittest import mock
+
+import jsonlines
+
+import comics_net.http_client as http_client
+import comics_net.jobs as jobs
+import comics_net.webscraper as webscraper
+import comics_net.webscraper_main as webscraper_main
+from comics_net.testing import fake_download, make_specs
+from comics_net.webscraper import URL
+
+
+def add_second_page(site) -> None:
+    """
+    Add a second page of series for the same publisher to the fake comics.org.
+    """
+    site[URL + "/publisher/54/?page=2"] = b"""<html><body><table>
+<tr><td class="name"><a href="/series/3/">Detective Comics</a></td><td class="year">1937</td>
+<td class="issue_count">2 issues</td><td class="published">1937</td></tr>
+</table></body></html>"""
+    site[URL + "/series/3/"] = b'<a href="/series/3/covers/">Cover Gallery</a>'
+    site[URL + "/series/3/covers/"] = b"""
+<a href="/issue/31/">Detective Comics #1</a>
+<a href="/issue/32/">Detective Comics #2</a>"""
+    for id in [31, 32]:
+        site.add_issue(id, "Detective Comics #{}".format(id - 30), "1937-03-01")
+
+
+def test_parse_pages():
+    assert jobs.parse_pages("1-3,7") == [1, 2, 3, 7]
+    assert jobs.parse_pages(5) == [5]
+
+
+def test_get_roots():
+    roots = jobs.get_roots(
+        [
+            {"publisher_id": "54", "publisher_pages": "1-2", "issue_count": "12"},
+            {"publisher_id": "78", "publisher_pages": "43", "series": "Batman"},
+        ]
+    )
+    assert [root[0] for root in roots] == [
+        URL + "/publisher/54/?page=1",
+        URL + "/publisher/54/?page=2",
+        URL + "/publisher/78/?page=43",
+    ]
+    assert roots[1][2] == {"series": None, "issue_count": 12}
+    assert roots[2][2] == {"series": "Batman", "issue_count": 0}
+
+
+def test_merge_shards(tmp_path, monkeypatch):
+    monkeypatch.chdir(str(tmp_path))
+    os.makedirs(jobs.SHARD_DIR)
+    for root in ["b", "a"]:
+        with jsonlines.open(jobs.shard_path(root), mode="w") as writer:
+            writer.write({"title": root})
+
+    assert jobs.merge_shards(["a", "b", "c"], "covers.jsonl") == 2
+    assert webscraper.read_jsonl("covers.jsonl") == [{"title": "a"}, {"title": "b"}]
+    assert os.listdir(jobs.SHARD_DIR) == []
+
+
+def test_run_jobs_merges_shards_in_job_order(tmp_path, monkeypatch, fake_site):
+    monkeypatch.chdir(str(tmp_path))
+    os.makedirs("metadata")
+    os.makedirs("covers")
+    with jsonlines.open("jobs.jsonl", mode="w") as writer:
+        writer.write({"publisher_id": "54", "publisher_pages": "1-2", "issue_count": 2})
+
+    add_second_page(fake_site)
+    specs = make_specs(jobs="jobs.jsonl", workers=2)
+    with mock.patch.object(webscraper, "simple_get", side_effect=fake_site.get):
+        with mock.patch.object(http_client.HTTPClient, "download", fake_download):
+            webscraper_main.run_scraper(specs)
+
+    metadata = webscraper.read_jsonl("./metadata/covers.jsonl")
+    assert [x["title"] for x in metadata] == [
+        "Action Comics #1",
+        "Action Comics #2 [Direct]",
+        "Action Comics #3",
+        "Detective Comics #1",
+        "Detective Comics #2",
+    ]
+    assert len(os.listdir("covers")) == 10
+    assert os.listdir(jobs.SHARD_DIR) == []
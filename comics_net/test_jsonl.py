@@ -0,0 +1,98 @@
+import math
+
+import jsonlines
+import pandas as pd
+import pytest
+
+import comics_net.jsonl as jsonl
+from comics_net.jsonl import iter_frames, iter_jsonl, iter_jsonl_chunks, read_frame
+
+
+def write_records(path: str, records) -> None:
+    with jsonlines.open(path, mode="w") as writer:
+        for record in records:
+            writer.write(record)
+
+
+def test_iter_jsonl_selects_keys(tmp_path):
+    path = str(tmp_path / "covers.jsonl")
+    write_records(
+        path,
+        [
+            {"title": "Batman #1", "on_sale_date": "1940", "synopsis": "x"},
+            {"title": "Batman #2", "synopsis": "y"},
+        ],
+    )
+
+    assert list(iter_jsonl(path, ["title", "on_sale_date"])) == [
+        {"title": "Batman #1", "on_sale_date": "1940"},
+        {"title": "Batman #2"},
+    ]
+    assert next(iter_jsonl(path))["synopsis"] == "x"
+
+
+def test_iter_jsonl_chunks(tmp_path):
+    path = str(tmp_path / "covers.jsonl")
+    write_records(path, [{"i": i} for i in range(7)])
+
+    chunks = list(iter_jsonl_chunks(path, chunk_size=3))
+    assert [[x["i"] for x in chunk] for chunk in chunks] == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_frames_match_whole_file(tmp_path):
+    path = str(tmp_path / "covers.jsonl")
+    records = [{"title": "Batman #{}".format(i), "i": i} for i in range(5)]
+    records.append({"title": "Superman #1", "cover_characters": "Superman"})
+    write_records(path, records)
+
+    frames = list(iter_frames(path, chunk_size=2, columns=["title", "i"]))
+    assert [len(frame) for frame in frames] == [2, 2, 2]
+    assert all(list(frame.columns) == ["title", "i"] for frame in frames)
+
+    pd.testing.assert_frame_equal(
+        read_frame(path, chunk_size=4), pd.DataFrame(records)
+    )
+
+
+def test_read_frame_of_empty_file(tmp_path):
+    path = str(tmp_path / "covers.jsonl")
+    write_records(path, [])
+
+    assert list(read_frame(path, columns=["title"]).columns) == ["title"]
+    assert list(iter_jsonl_chunks(path)) == []
+
+
+def test_orjson_and_json_decode_the_same(monkeypatch):
+    pytest.importorskip("orjson")
+    path = "./comics_net/resources/metadata.jsonl"
+    with jsonlines.open(path, mode="r") as reader:
+        expected = [record for record in reader]
+
+    assert list(iter_jsonl(path)) == expected
+    monkeypatch.setattr(jsonl, "orjson", None)
+    assert list(iter_jsonl(path)) == expected
+
+
+def test_iter_lines_splits_any_file(tmp_path):
+    path = tmp_path / "covers.jsonl"
+    path.write_bytes(b'{"a": 1}\n\n  \n{"b": "\xe2\x98\x85"}\r\n{"c": 2}')
+
+    assert list(jsonl.iter_lines(str(path))) == [
+        b'{"a": 1}',
+        b'{"b": "\xe2\x98\x85"}\r',
+        b'{"c": 2}',
+    ]
+    assert list(iter_jsonl(str(path))) == [{"a": 1}, {"b": "★"}, {"c": 2}]
+
+
+def test_loads_falls_back_to_json():
+    assert math.isnan(jsonl.loads(b'{"issue_pages": NaN}')["issue_pages"])
+
+
+def test_iter_jsonl_raises_on_invalid_line(tmp_path):
+    path = tmp_path / "covers.jsonl"
+    path.write_bytes(b'{"a": 1}\n{"b": \n')
+
+    with pytest.raises(jsonlines.InvalidLineError) as e:
+        list(iter_jsonl(str(path)))
+    assert e.value.lineno == 2
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from comics_net.character_map import aliases
+from comics_net.normalizer import CharacterNormalizer, get_normalizer, name_key
+
+alias_map = {
+    "Abraham Sapien": "Abe Sapien",
+    "Alex Summers [Havok]": "Havok [Alex Summers]",
+    "Flash (Wally West)": "Flash [Wally West]",
+    "Flash [Wally West]": "Flash [Barry Allen]",
+}
+
+
+def test_name_key():
+    assert name_key("Spider-Man [Peter Parker]") == "spider man [ peter parker ]"
+    assert name_key("  spider man[Peter  Parker] ") == "spider man [ peter parker ]"
+    assert name_key('Dr. "Doc" Thirteen') == name_key("dr doc thirteen")
+
+
+def test_normalize():
+    normalizer = CharacterNormalizer(alias_map)
+    names = pd.Series(
+        [
+            "Abraham Sapien",
+            "abraham  sapien",
+            "Alex Summers[Havok]",
+            "havok [alex summers]",
+            "Flash (Wally West)",
+            "Flash [Wally West]",
+            "Batman",
+            None,
+        ],
+        index=range(10, 18),
+    )
+
+    results = normalizer.normalize(names)
+    assert list(results.index) == list(names.index)
+    assert results[:-1].tolist() == [
+        "Abe Sapien",
+        "Abe Sapien",
+        "Havok [Alex Summers]",
+        "Havok [Alex Summers]",
+        # a name of the map maps as with aliases.get, one step
+        "Flash [Wally West]",
+        "Flash [Barry Allen]",
+        "Batman",
+    ]
+    assert pd.isna(results.iloc[-1])
+
+    ids = normalizer.ids(names)
+    assert ids.tolist() == [0, 0, 1, 1, 2, 3, -1, -1]
+    assert [normalizer.names[i] for i in ids[:2]] == ["Abe Sapien", "Abe Sapien"]
+
+
+def test_normalize_lists():
+    normalizer = CharacterNormalizer(alias_map)
+    lists = pd.Series([["Abraham Sapien", "Batman"], np.nan, [], ["ABE SAPIEN"]])
+
+    results = normalizer.normalize_lists(lists)
+    assert results[0] == ["Abe Sapien", "Batman"]
+    assert pd.isna(results[1])
+    assert results[2] == []
+    assert results[3] == ["Abe Sapien"]
+
+
+def test_get_normalizer():
+    normalizer = get_normalizer()
+    assert get_normalizer() is normalizer
+
+    names = list(aliases) + ["Not A Character"]
+    assert normalizer.normalize(names).tolist() == [
+        aliases.get(name, name) for name in names
+    ]
@@ -0,0 +1,39 @@
+from unittest import mock
+
+import pytest
+
+import comics_net.webscraper as webscraper
+from comics_net.parse_pool import ParsePool
+from comics_net.testing import resource_get
+from comics_net.webscraper import URL
+
+
+@pytest.fixture(params=[0, 2], ids=["inline", "processes"])
+def parse_pool(request):
+    pool = ParsePool(request.param)
+    yield pool
+    pool.close()
+
+
+@mock.patch("comics_net.webscraper.simple_get", side_effect=resource_get)
+def test_parse_pool_matches_extractors(mock_get, parse_pool):
+    for id in [21497, 36858, 1179057]:
+        issue_url = URL + "/issue/{}/".format(id)
+        issue_soup = webscraper.get_soup(issue_url)
+        metadata = webscraper.init_issue_metadata(issue_soup, "Action Comics")
+        metadata.update(webscraper.get_all_issue_metadata(issue_soup))
+        metadata = webscraper.to_plain(metadata)
+        cover_url = webscraper.get_issue_cover_url(issue_soup)
+
+        parsed = parse_pool.issue_page(webscraper.simple_get(issue_url), "Action Comics")
+        assert parsed == (metadata, cover_url)
+
+        cover_soup = webscraper.get_soup(URL + "/issue/{}/cover/4/".format(id), "cover")
+        assert parse_pool.cover_credits(
+            URL + "/issue/{}/cover/4/".format(id), metadata
+        ) == webscraper.get_cover_credits_from_cover_page(cover_soup, metadata)
+
+
+def test_parse_pool_raises_parse_errors(parse_pool):
+    with pytest.raises(AttributeError):
+        parse_pool.issue_page(b"<html><body>not an issue</body></html>", "Action")
@@ -0,0 +1,159 @@
+import os
+import threading
+from unittest import mock
+
+import comics_net.http_client as http_client
+import comics_net.webscraper as webscraper
+from comics_net.downloader import CoverDownloader
+from comics_net.frontier import FAILED, Frontier
+from comics_net.pipeline import IssuePipeline, Pipeline, Stage
+from comics_net.testing import fake_download
+from comics_net.webscraper import URL
+
+
+def test_pipeline_engine_matches_sync_engine(tmp_path, crawl):
+    sync_metadata, sync_covers = crawl(tmp_path / "sync", "sync")
+    pipeline_metadata, pipeline_covers = crawl(tmp_path / "pipeline", "pipeline")
+
+    assert pipeline_metadata == sync_metadata
+    assert pipeline_covers == sync_covers
+
+
+def test_ordered_stages_see_items_in_order():
+    # every even item waits for the item after it, so they leave "shuffle" swapped
+    shuffled = [threading.Event() for _ in range(50)]
+
+    def shuffle(x):
+        if x % 2 == 0:
+            assert shuffled[x + 1].wait(5)
+        shuffled[x].set()
+        return x
+
+    seen = []
+    pipeline = Pipeline(
+        [
+            Stage("shuffle", shuffle, workers=8),
+            Stage("drop_odd", lambda x: None if x % 2 else x, workers=4),
+            Stage("collect", seen.append, ordered=True),
+        ],
+        max_in_flight=4,
+    )
+
+    assert pipeline.run(range(50)) == 50
+    assert seen == list(range(0, 50, 2))
+    stats = pipeline.stats()
+    assert stats["drop_odd"]["dropped"] == 25
+    assert stats["collect"]["processed"] == 25
+
+
+def test_pipeline_bounds_items_in_flight():
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def start(x):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+        return x
+
+    def finish(x):
+        with lock:
+            in_flight[0] -= 1
+        return x
+
+    pipeline = Pipeline(
+        [
+            Stage("start", start, workers=4),
+            Stage("identity", lambda x: x),
+            Stage("finish", finish, ordered=True),
+        ],
+        max_in_flight=3,
+    )
+
+    assert pipeline.run(range(30)) == 30
+    assert in_flight[0] == 0
+    assert 1 <= in_flight[1] <= 3
+
+
+def test_failed_stage_skips_item_and_reports_it():
+    errors = []
+
+    def fail_on_three(x):
+        if x == 3:
+            raise ValueError("bad item")
+        return x
+
+    seen = []
+    pipeline = Pipeline(
+        [Stage("check", fail_on_three, workers=2), Stage("collect", seen.append)],
+        on_error=lambda stage, item, e: errors.append((stage.name, item, str(e))),
+    )
+
+    pipeline.run(range(5))
+    assert sorted(seen) == [0, 1, 2, 4]
+    assert errors == [("check", 3, "bad item")]
+    assert pipeline.stats()["check"]["failed"] == 1
+
+
+def test_failures_reach_later_stages_in_order():
+    # every even item waits for the failure of the item after it
+    checked = [threading.Event() for _ in range(10)]
+
+    def fail_on_odd(x):
+        if x % 2 == 0:
+            assert checked[x + 1].wait(5)
+        checked[x].set()
+        if x % 2:
+            raise ValueError("odd")
+        return x
+
+    failures = []
+    seen = []
+    pipeline = Pipeline(
+        [
+            Stage("check", fail_on_odd, workers=4),
+            Stage("collect", seen.append, ordered=True, on_failure=failures.append),
+        ]
+    )
+
+    pipeline.run(range(10))
+    assert seen == [0, 2, 4, 6, 8]
+    assert failures == [1, 3, 5, 7, 9]
+
+
+def test_issue_pipeline_fails_issue_and_releases_claim(
+    tmp_path, monkeypatch, fake_site
+):
+    monkeypatch.chdir(str(tmp_path))
+    os.makedirs("covers")
+    root = URL + "/publisher/54/?page=1"
+
+    frontier = Frontier(str(tmp_path / "frontier.sqlite"))
+    frontier.add(root, "publisher", {"series": None, "issue_count": 2}, root=root)
+    dedup_index = webscraper.DuplicateIndex()
+    downloader = CoverDownloader(http_client.HTTPClient(), workers=2, retries=0)
+    pipeline = IssuePipeline(frontier, dedup_index, downloader, "covers.jsonl")
+
+    # the cover page of the first issue is missing
+    del fake_site[URL + "/issue/11/cover/4/"]
+    with mock.patch.object(webscraper, "simple_get", side_effect=fake_site.get):
+        with mock.patch.object(http_client.HTTPClient, "download", fake_download):
+            assert pipeline.run(root) == 4
+
+    assert frontier.state(URL + "/issue/11/") == FAILED
+    titles = [x["title"] for x in webscraper.read_jsonl("covers.jsonl")]
+    assert titles == [
+        "Action Comics #2 [Direct]",
+        "Action Comics #3",
+        "Action Comics #1 [Direct]",
+    ]
+
+
+def test_pipeline_engine_parses_on_processes(tmp_path, crawl):
+    sync_metadata, sync_covers = crawl(tmp_path / "sync", "sync")
+    pipeline_metadata, pipeline_covers = crawl(
+        tmp_path / "pipeline", "pipeline", parse_processes=2
+    )
+
+    assert pipeline_metadata == sync_metadata
+    assert pipeline_covers == sync_covers
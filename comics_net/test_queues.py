@@ -0,0 +1,124 @@
+import pytest
+
+from comics_net import queues
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_queue(request, tmp_path, fake_redis):
+    def make_queue(**kwargs):
+        if request.param == "sqlite":
+            return queues.SQLiteQueue(str(tmp_path / "queue.sqlite"), **kwargs)
+        return queues.RedisQueue(fake_redis, **kwargs)
+
+    return make_queue
+
+
+def test_queue_leases_tasks_in_order(make_queue):
+    queue = make_queue()
+    assert queue.put("issue:1", {"url": "1"})
+    assert queue.put("issue:2", {"url": "2"})
+    assert not queue.put("issue:1", {"url": "1"})
+
+    lease = queue.lease()
+    assert (lease.key, lease.payload) == ("issue:1", {"url": "1"})
+    assert queue.get("issue:1")[0] == queues.LEASED
+    assert queue.lease().key == "issue:2"
+    assert queue.lease() is None
+
+    assert queue.complete("issue:1", {"title": "Action Comics #1"})
+    assert queue.get("issue:1") == (queues.DONE, {"title": "Action Comics #1"}, None)
+    assert queue.stats() == {queues.DONE: 1, queues.LEASED: 1}
+
+
+def test_queue_completes_tasks_once(make_queue):
+    queue = make_queue()
+    queue.put("issue:1", {})
+    queue.lease()
+
+    assert queue.complete("issue:1", "first")
+    assert not queue.complete("issue:1", "second")
+    assert not queue.put("issue:1", {})
+    assert queue.lease() is None
+    assert queue.get("issue:1")[1] == "first"
+
+
+def test_queue_retries_failed_and_expired_leases(make_queue, clock):
+    queue = make_queue(max_attempts=2, clock=clock)
+    queue.put("issue:1", {})
+
+    lease = queue.lease(lease_seconds=10)
+    queue.fail(lease, "boom")
+    assert queue.get("issue:1")[0] == queues.QUEUED
+
+    # a worker that stalls past its lease loses the task to another worker
+    stalled = queue.lease(lease_seconds=10)
+    clock.now = 11
+    assert queue.lease() is None
+    assert queue.get("issue:1") == (queues.FAILED, None, "lease expired")
+
+    # the stalled worker can no longer fail it, but it can still complete it
+    queue.fail(stalled, "late")
+    assert queue.get("issue:1")[2] == "lease expired"
+
+    queue.retry("issue:1")
+    assert queue.lease().key == "issue:1"
+    assert queue.complete("issue:1", "done")
+    assert queue.get("issue:1")[0] == queues.DONE
+
+
+def test_redis_queue_requeues_tasks_of_dead_leasers(fake_redis, clock):
+    queue = queues.RedisQueue(fake_redis, clock=clock)
+    queue.put("issue:1", {"url": "1"})
+    queue.put("issue:2", {"url": "2"})
+
+    # a worker dies right after taking the task off the queued list
+    assert fake_redis.rpoplpush("comics_net:queued", "comics_net:leasing") == b"issue:1"
+    assert queue.get("issue:1")[0] == queues.QUEUED
+
+    # the task is left alone for a whole lease, as its worker may still be leasing it
+    assert queue.lease(lease_seconds=10).key == "issue:2"
+    assert queue.complete("issue:2", "done")
+    assert queue.lease(lease_seconds=10) is None
+    clock.now = 10
+    lease = queue.lease(lease_seconds=10)
+    assert (lease.key, lease.payload) == ("issue:1", {"url": "1"})
+    assert fake_redis.lrange("comics_net:leasing", 0, -1) == []
+
+    # a worker that dies after leasing the task leaves it to its lease
+    queue.put("issue:3", {})
+    fake_redis.rpoplpush("comics_net:queued", "comics_net:leasing")
+    fake_redis.zadd("comics_net:leases", {"issue:3": 100.0})
+    assert queue.lease() is None
+    assert fake_redis.lrange("comics_net:leasing", 0, -1) == []
+    assert queue.get("issue:3")[0] == queues.LEASED
+
+
+def test_queue_close_and_clear(make_queue):
+    queue = make_queue()
+    queue.put("issue:1", {})
+    assert not queue.is_closed()
+    queue.close()
+    assert queue.is_closed()
+    queue.reopen()
+    assert not queue.is_closed()
+
+    queue.close()
+    queue.clear()
+    assert not queue.is_closed()
+    assert queue.get("issue:1") is None
+    assert queue.lease() is None
+
+
+def test_work_queue_is_abstract():
+    class Incomplete(queues.WorkQueue):
+        def put(self, key, payload):
+            return True
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_open_queue(tmp_path):
+    path = str(tmp_path / "queue.sqlite")
+    assert isinstance(queues.open_queue(path), queues.SQLiteQueue)
+    assert queues.open_queue("sqlite://" + path).path == path
@@ -0,0 +1,76 @@
+import multiprocessing
+
+import jsonlines
+
+import comics_net.webscraper as webscraper
+from comics_net.sink import MetadataSink
+
+
+def test_sink_writes_what_jsonlines_writes(tmp_path):
+    records = [{"title": "Action Comics #1", "characters": "Superman; Lois Lane"}]
+    records.append({"title": "Batman #1 ★", "price": 0.1, "covers": {"Direct": {}}})
+
+    with jsonlines.open(str(tmp_path / "expected.jsonl"), mode="a") as writer:
+        for record in records:
+            writer.write(record)
+    with MetadataSink(str(tmp_path / "sink.jsonl")) as sink:
+        for record in records:
+            sink.write(record)
+
+    expected = (tmp_path / "expected.jsonl").read_bytes()
+    assert (tmp_path / "sink.jsonl").read_bytes() == expected
+
+
+def test_sink_flushes_in_batches(tmp_path):
+    path = str(tmp_path / "covers.jsonl")
+    done = []
+    sink = MetadataSink(path, batch_size=3, flush_seconds=60)
+
+    for i in range(5):
+        sink.write({"i": i}, on_flush=lambda i=i: done.append(i))
+    assert [x["i"] for x in webscraper.read_jsonl(path)] == [0, 1, 2]
+    assert done == [0, 1, 2]
+
+    sink.close()
+    assert [x["i"] for x in webscraper.read_jsonl(path)] == [0, 1, 2, 3, 4]
+    assert done == [0, 1, 2, 3, 4]
+    assert sink.flushes == 2
+
+
+def test_sink_flushes_old_records(tmp_path):
+    path = str(tmp_path / "covers.jsonl")
+    now = [0.0]
+    sink = MetadataSink(path, batch_size=100, flush_seconds=5, clock=lambda: now[0])
+
+    sink.write({"i": 0})
+    now[0] = 4.0
+    sink.write({"i": 1})
+    assert webscraper.read_jsonl(path) == []
+
+    now[0] = 5.0
+    sink.write({"i": 2})
+    assert len(webscraper.read_jsonl(path)) == 3
+    sink.close()
+
+
+def write_records(path: str, writer: int) -> None:
+    with MetadataSink(path, batch_size=7) as sink:
+        for i in range(200):
+            sink.write({"writer": writer, "i": i, "pad": "x" * 500})
+
+
+def test_sinks_of_many_processes_do_not_interleave(tmp_path):
+    path = str(tmp_path / "covers.jsonl")
+    processes = [
+        multiprocessing.Process(target=write_records, args=(path, writer))
+        for writer in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    records = webscraper.read_jsonl(path)
+    assert len(records) == 800
+    for writer in range(4):
+        assert [x["i"] for x in records if x["writer"] == writer] == list(range(200))
@@ -0,0 +1,121 @@
+import pytest
+
+import comics_net.webscraper as webscraper
+from comics_net.store import COVERS, ISSUES, flatten_metadata
+
+pa = pytest.importorskip("pyarrow")
+
+from comics_net.store import MetadataStore, convert_jsonl  # noqa: E402
+
+METADATA_PATH = "./comics_net/resources/metadata.jsonl"
+
+
+def test_flatten_metadata():
+    metadata = {
+        "series_name": "Action Comics",
+        "title": "Action Comics #1",
+        "on_sale_date": "1938-04-18",
+        "synopsis": "Superman!",
+        "covers": {
+            "Direct": {"cover_characters": "Superman", "save_to": "a.jpg"},
+            "Variant": {"cover_pencils": "Alex Ross", "save_to": "b.jpg"},
+        },
+    }
+
+    issue, covers = flatten_metadata(metadata)
+    assert issue == {
+        "series_name": "Action Comics",
+        "title": "Action Comics #1",
+        "on_sale_date": "1938-04-18",
+        "synopsis": "Superman!",
+    }
+    assert covers == [
+        {
+            "series_name": "Action Comics",
+            "title": "Action Comics #1",
+            "on_sale_date": "1938-04-18",
+            "cover_name": "Direct",
+            "cover_characters": "Superman",
+            "save_to": "a.jpg",
+        },
+        {
+            "series_name": "Action Comics",
+            "title": "Action Comics #1",
+            "on_sale_date": "1938-04-18",
+            "cover_name": "Variant",
+            "cover_pencils": "Alex Ross",
+            "save_to": "b.jpg",
+        },
+    ]
+
+
+def test_convert_jsonl(tmp_path):
+    store = MetadataStore(str(tmp_path / "store"))
+    metadata = webscraper.read_jsonl(METADATA_PATH)
+
+    assert convert_jsonl(METADATA_PATH, store, batch_size=1) == len(metadata)
+    assert len(store.parts(ISSUES)) == len(metadata)
+
+    issues = store.read(ISSUES)
+    assert list(issues["title"]) == [x["title"] for x in metadata]
+    assert "variant_covers" not in issues.columns
+    covers = store.read(COVERS)
+    assert len(covers) == sum(
+        len(x.get("variant_covers", {})) + len(x.get("covers", {})) for x in metadata
+    )
+
+
+def test_read_projects_and_filters(tmp_path):
+    store = MetadataStore(str(tmp_path / "store"))
+    store.append(
+        [
+            {"title": "Batman #1", "on_sale_date": "1940-04-24", "synopsis": "x"},
+            {"title": "Batman #2", "on_sale_date": "1940-07-01", "synopsis": "y"},
+        ]
+    )
+    # a column first seen in a later batch
+    store.append(
+        [
+            {
+                "title": "Batman #3",
+                "on_sale_date": "1940-10-01",
+                "cover_characters": "Joker",
+            }
+        ]
+    )
+
+    df = store.read(ISSUES, columns=["title", "cover_characters"])
+    assert list(df.columns) == ["title", "cover_characters"]
+    assert list(df["cover_characters"].fillna("")) == ["", "", "Joker"]
+
+    df = store.read(
+        ISSUES, columns=["title"], filters=[("on_sale_date", ">=", "1940-07-01")]
+    )
+    assert list(df["title"]) == ["Batman #2", "Batman #3"]
+
+    df = store.read(
+        ISSUES,
+        columns=["title"],
+        filters=[
+            ("on_sale_date", "<", "1940-10-01"),
+            ("title", "not in", ["Batman #2"]),
+        ],
+    )
+    assert list(df["title"]) == ["Batman #1"]
+    with pytest.raises(ValueError):
+        store.read(ISSUES, filters=[("title", "like", "Batman%")])
+
+    assert list(store.read(COVERS, columns=["title"]).columns) == ["title"]
+
+
+def test_crawl_writes_store(tmp_path, crawl):
+    store_path = str(tmp_path / "store")
+    metadata, _ = crawl(tmp_path / "sync", "sync", store=store_path)
+
+    store = MetadataStore(store_path)
+    issues = store.read(ISSUES, columns=["title", "on_sale_date"])
+    assert issues.to_dict("records") == [
+        {"title": x["title"], "on_sale_date": x["on_sale_date"]} for x in metadata
+    ]
+    covers = store.read(COVERS, columns=["title", "cover_name", "save_to"])
+    assert len(covers) == sum(len(x["covers"]) for x in metadata)
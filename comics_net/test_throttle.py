@@ -0,0 +1,58 @@
+import comics_net.throttle as throttle
+
+
+def test_token_bucket_paces_requests_after_burst(clock):
+    bucket = throttle.TokenBucket(rate=2.0, burst=3, clock=clock, sleep=clock.sleep)
+
+    waits = [bucket.acquire() for _ in range(5)]
+
+    assert waits == [0.0, 0.0, 0.0, 0.5, 0.5]
+    assert clock.now == 1.0
+    assert bucket.requests == 5
+
+
+def test_token_bucket_slows_down_and_recovers(clock):
+    bucket = throttle.TokenBucket(
+        rate=4.0, burst=1, min_rate=1.0, clock=clock, sleep=clock.sleep
+    )
+
+    bucket.slow_down()
+    assert bucket.rate == 2.0
+    bucket.slow_down()
+    bucket.slow_down()
+    assert bucket.rate == 1.0
+
+    for _ in range(20):
+        bucket.speed_up()
+    assert bucket.rate == 4.0
+
+
+def test_token_bucket_honors_retry_after(clock):
+    bucket = throttle.TokenBucket(rate=10.0, burst=10, clock=clock, sleep=clock.sleep)
+
+    bucket.slow_down(retry_after=30)
+
+    assert bucket.acquire() == 30.0
+    assert clock.now == 30.0
+
+
+def test_rate_limiter_buckets_per_host(clock):
+    limiter = throttle.RateLimiter(rate=1.0, burst=1, clock=clock, sleep=clock.sleep)
+
+    assert limiter.acquire("https://www.comics.org/issue/1/") == 0.0
+    assert limiter.acquire("https://files1.comics.org/1.jpg") == 0.0
+    assert limiter.acquire("https://www.comics.org/issue/2/") == 1.0
+
+    limiter.update("https://www.comics.org/issue/2/", 429, "soon")
+    limiter.update("https://files1.comics.org/1.jpg", 200)
+
+    stats = limiter.stats()
+    assert stats["www.comics.org"]["rate"] == 0.5
+    assert stats["www.comics.org"]["requests"] == 2
+    assert stats["files1.comics.org"]["rate"] == 1.0
+
+
+def test_parse_retry_after():
+    assert throttle.parse_retry_after("120") == 120.0
+    assert throttle.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") is None
+    assert throttle.parse_retry_after(None) is None
@@ -1,9 +1,12 @@
+import threading
 import unittest
 from typing import Union
 from unittest import mock
 
+import pytest
 import requests
 from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
 from pandas import DataFrame
 
 import comics_net.webscraper as webscraper
@@ -123,6 +126,21 @@ def test_get_all_issue_metadata(mock_get):
     assert set(issue_metadata.keys()).difference(expected_keys) == set()
 
 
+@mock.patch("comics_net.webscraper.simple_get", side_effect=mocked_response_get)
+def test_get_all_issue_metadata_matches_get_issue_metadata(mock_get):
+    for id in [370657, 21497, 36858, 1179057, 1248505]:
+        issue_soup = webscraper.get_soup(URL + "/issue/{}/".format(id))
+        issue_metadata = webscraper.get_all_issue_metadata(issue_soup)
+
+        for name in webscraper.ISSUE_METADATA_IDS:
+            assert issue_metadata[name] == webscraper.get_issue_metadata(
+                issue_soup, name
+            )
+        assert issue_metadata["indexer_notes"] == " | ".join(
+            [x.contents[0].replace("\n", "").strip() for x in issue_soup.find_all("p")]
+        )
+
+
 @mock.patch("comics_net.webscraper.simple_get", side_effect=mocked_response_get)
 def test_get_issue_cover_metadata(mock_get):
     issue_url = "https://www.comics.org/issue/370657/"
@@ -219,6 +237,49 @@ def test_get_cover_credits_from_cover_page_2(mock_get):
     assert "Scribblenauts Unmasked Variant Cover" in list(issue_cover_credits['covers'].keys())
 
 
+def test_get_cover_credits_from_cover_page_fetches_variants_concurrently():
+    in_flight = []
+    max_in_flight = []
+    lock = threading.Lock()
+    # both variants must be fetched at once to get past the barrier
+    both_in_flight = threading.Barrier(2, timeout=5)
+    second_done = threading.Event()
+
+    def blocking_response_get(url):
+        with lock:
+            in_flight.append(url)
+            max_in_flight.append(len(in_flight))
+        both_in_flight.wait()
+        # the first variant finishes last
+        if url.endswith("/1179057/"):
+            assert second_done.wait(5)
+        response = mocked_response_get(url)
+        with lock:
+            in_flight.remove(url)
+        second_done.set()
+        return response
+
+    issue_cover_url = "https://www.comics.org/issue/1179057/cover/4/"
+    with mock.patch(
+        "comics_net.webscraper.simple_get", side_effect=mocked_response_get
+    ):
+        issue_cover_soup = webscraper.get_soup(issue_cover_url)
+    metadata = webscraper.read_jsonl("./comics_net/resources/metadata.jsonl")
+
+    with mock.patch(
+        "comics_net.webscraper.simple_get", side_effect=blocking_response_get
+    ):
+        issue_cover_credits = webscraper.get_cover_credits_from_cover_page(
+            issue_cover_soup, metadata[0]
+        )
+
+    assert max(max_in_flight) <= webscraper.VARIANT_WORKERS
+    assert list(issue_cover_credits["covers"].keys()) == [
+        "Original",
+        "Scribblenauts Unmasked Variant Cover",
+    ]
+
+
 def test_get_brackets():
     assert webscraper.get_brackets("Action Comics [Direct]") == "[Direct]"
 
@@ -276,6 +337,22 @@ def test_is_duplicate():
     )
 
 
+def test_duplicate_index():
+    index = webscraper.DuplicateIndex.from_jsonl("./comics_net/resources/metadata.jsonl")
+    assert len(index) == 2
+    assert index.is_duplicate("Action Comics #854", "2007-08-15") is True
+    assert index.is_duplicate("Action Comics #854 [Direct]", "2007-08-15") is True
+    assert index.is_duplicate("Action Comics #855", "2007-08-15") is False
+    assert index.is_duplicate("Action Comics #854", "2007-08-22") is False
+
+    index.add("Action Comics #855 [Direct]", "2007-08-22")
+    assert index.is_duplicate("Action Comics #855", "2007-08-22") is True
+
+    index = webscraper.DuplicateIndex.from_jsonl("./comics_net/resources/missing.jsonl")
+    assert len(index) == 0
+    assert index.is_duplicate("Action Comics #854", "2007-08-15") is False
+
+
 def test_get_variant_cover_name():
     variant_name = webscraper.get_variant_cover_name(
         "Action Comics [Sean MacRae Variant]"
@@ -319,3 +396,84 @@ def test_cover_gallery_pages(mock_get):
     cover_gallery_soup = webscraper.transform_simple_get_html(cover_gallery_html)
 
     assert webscraper.cover_gallery_pages(cover_gallery_soup) == 1
+
+
+def extract_all(parser: str) -> dict:
+    """
+    Run the extraction functions over the saved pages with the given parser.
+    """
+    webscraper.set_parser(parser)
+    metadata = webscraper.read_jsonl("./comics_net/resources/metadata.jsonl")
+
+    results = {}
+    for id in [370657, 21497, 36858, 1179057, 1173524, 1248505, 1837315]:
+        issue_soup = webscraper.get_soup(URL + "/issue/{}/".format(id))
+        results[id] = (
+            webscraper.get_issue_title(issue_soup),
+            webscraper.get_issue_metadata(issue_soup, name="on_sale_date"),
+            webscraper.get_all_issue_metadata(issue_soup),
+        )
+    for id in [21497, 36858, 1179057]:
+        cover_soup = webscraper.get_soup(URL + "/issue/{}/cover/4/".format(id))
+        results["cover", id] = webscraper.get_cover_credits_from_cover_page(
+            cover_soup, metadata[0]
+        )
+    publisher_soup = webscraper.get_soup(URL + "/publisher/54/?page=1")
+    results["publisher"] = webscraper.parse_series_from_publisher_page(
+        publisher_soup
+    ).to_dict()
+    for gallery_url in [URL + "/series/7768/covers/", URL + "/series/31350/covers/"]:
+        gallery_soup = webscraper.get_soup(gallery_url)
+        results[gallery_url] = (
+            webscraper.cover_gallery_pages(gallery_soup),
+            webscraper.get_issue_urls(gallery_soup),
+        )
+    return results
+
+
+@mock.patch("comics_net.webscraper.simple_get", side_effect=mocked_response_get)
+def test_parsers_extract_identical_results(mock_get):
+    parser = webscraper.PARSER
+    try:
+        expected = extract_all("html.parser")
+        for other in webscraper.PARSERS:
+            if builder_registry.lookup(other) is not None:
+                assert extract_all(other) == expected, other
+    finally:
+        webscraper.set_parser(parser)
+
+
+def test_set_parser():
+    with pytest.raises(ValueError):
+        webscraper.set_parser("regex")
+
+
+@mock.patch("comics_net.webscraper.simple_get", side_effect=mocked_response_get)
+def test_strained_pages_extract_identical_results(mock_get):
+    metadata = webscraper.read_jsonl("./comics_net/resources/metadata.jsonl")
+    extractors = {
+        "publisher": lambda soup: webscraper.parse_series_from_publisher_page(
+            soup
+        ).to_dict(),
+        "gallery": lambda soup: (
+            webscraper.cover_gallery_pages(soup),
+            webscraper.get_issue_urls(soup),
+            webscraper.get_cover_gallery_href(soup),
+        ),
+        "cover": lambda soup: webscraper.get_cover_credits_from_cover_page(
+            soup, metadata[0]
+        ),
+    }
+    pages = [
+        ("publisher", URL + "/publisher/54/?page=1"),
+        ("gallery", URL + "/series/7768/covers/"),
+        ("gallery", URL + "/series/31350/covers/"),
+        ("cover", URL + "/issue/21497/cover/4/"),
+        ("cover", URL + "/issue/36858/cover/4/"),
+        ("cover", URL + "/issue/1179057/cover/4/"),
+    ]
+    for page, url in pages:
+        soup = webscraper.get_soup(url)
+        strained_soup = webscraper.get_soup(url, page)
+        assert len(strained_soup.find_all()) < len(soup.find_all())
+        assert extractors[page](strained_soup) == extractors[page](soup), url
@@ -0,0 +1,306 @@
+"Fakes of htpps://www.comics.org and of the clients of the scraper, for the tests"
+
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import comics_net.webscraper as webscraper
+from comics_net.webscraper import URL
+
+# a 1x1 black jpeg
+JPEG = bytes.fromhex(
+    "ffd8ffe000104a46494600010100000100010000ffdb004300ffffffffffffffffffffffffffffff"
+    "ffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffffff"
+    "ffffffffffffffffffffc0000b080001000101011100ffc400140001000000000000000000000000"
+    "00000003ffc40014100100000000000000000000000000000000ffda0008010100003f0037ffd9"
+)
+
+ISSUE_PAGE = """<html><head><title>GCD :: Issue :: {title}</title></head><body>
+<dl><dd id="on_sale_date">{on_sale_date}</dd><dd id="issue_price">0.10 USD</dd>
+<dd id="issue_indicia_publisher"><a href="/indicia_publisher/1/">DC</a></dd></dl>
+<p>Indexed from {title}</p>
+<div class="cover"><div class="coverImage"><a href="/issue/{id}/cover/4/">cover</a></div>
+<span class="credit_label">Characters</span><span class="credit_value">Superman</span>
+<span class="credit_label">Reprints</span><span class="credit_value">none</span></div>
+<span class="credit_label">Synopsis</span><span class="credit_value">{title} synopsis</span>
+</body></html>"""
+
+COVER_PAGE = """<html><body><div class="issue_covers">
+<div><a href="/issue/{id}/"><img src="https://files1.comics.org/{id}.jpg"/></a>
+<a href="/issue/{id}/">{title}</a></div>
+<div><a href="/issue/{id}01/"><img src="https://files1.comics.org/{id}01.jpg"/></a>
+<a href="/issue/{id}01/">{variant_title}</a></div>
+</div></body></html>"""
+
+
+class FakeSite(dict):
+    """
+    A tiny comics.org with one paginated series, a duplicate issue and a series with
+    too few issues to scrape, as a dict of urls to raw pages.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self[URL + "/publisher/54/?page=1"] = b"""<html><body><table>
+<tr><td class="name"><a href="/series/1/">Action Comics</a></td><td class="year">1938</td>
+<td class="issue_count">4 issues</td><td class="published">1938</td></tr>
+<tr><td class="name"><a href="/series/2/">One Shot</a></td><td class="year">1990</td>
+<td class="issue_count">1 issue</td><td class="published">1990</td></tr>
+</table></body></html>"""
+        self[URL + "/series/1/"] = b'<a href="/series/1/covers/">Cover Gallery</a>'
+        self[URL + "/series/1/covers/"] = b"""<a class="btn btn-default btn-sm">1</a>
+<a class="btn btn-default btn-sm">2</a>"""
+        self[URL + "/series/1/covers//?page=1"] = b"""
+<a href="/issue/11/">Action Comics #1</a>
+<a href="/issue/11/cover/4/">Action Comics #1</a>
+<a href="/issue/12/">Action Comics #2 [Direct]</a>
+<a href="/issue/13/">Action Comics #2 [Newsstand]</a>"""
+        self[URL + "/series/1/covers//?page=2"] = b"""
+<a href="/issue/14/">Action Comics #3</a>
+<a href="/issue/15/">Action Comics #1 [Direct]</a>"""
+
+        self.add_issue(11, "Action Comics #1", "1938-04-18")
+        self.add_issue(12, "Action Comics #2 [Direct]", "1938-05-18")
+        self.add_issue(14, "Action Comics #3", "1938-06-18")
+        self.add_issue(15, "Action Comics #1 [Direct]", "1938-04-18")
+
+    def add_issue(self, id: int, title: str, on_sale_date: str) -> None:
+        """
+        Add the issue page, variant issue page and cover page of an issue.
+        """
+        variant_title = webscraper.strip_brackets(title) + " [Alex Ross Variant]"
+        for page_id, page_title in [(id, title), ("{}01".format(id), variant_title)]:
+            self[URL + "/issue/{}/".format(page_id)] = ISSUE_PAGE.format(
+                id=id, title=page_title, on_sale_date=on_sale_date
+            ).encode("utf-8")
+        self[URL + "/issue/{}/cover/4/".format(id)] = COVER_PAGE.format(
+            id=id, title=title, variant_title=variant_title
+        ).encode("utf-8")
+
+
+def fake_download(self, url, save_to):
+    with open(save_to, "wb") as f:
+        f.write(JPEG + url.encode("utf-8"))
+
+
+def make_specs(**kwargs) -> dict:
+    """
+    Return the job specs of a crawl of the fake site, as parsed from the command line.
+    """
+    specs = {
+        "publisher_id": "54",
+        "publisher_page": "1",
+        "issue_count": "2",
+        "series": None,
+        "pool_maxsize": 4,
+        "timeout": 30,
+        "engine": "sync",
+        "concurrency": 3,
+        "fetch_workers": 3,
+        "parse_workers": 2,
+        "max_in_flight": 4,
+        "parse_processes": 0,
+        "max_rps": 1000,
+        "burst": 1000,
+        "cache_dir": "",
+        "cache_max_mb": 1,
+        "cache_replay": False,
+        "store": "",
+        "resume": False,
+        "parser": None,
+        "download_workers": 2,
+        "download_retries": 0,
+        "jobs": None,
+        "workers": 1,
+        "worker": False,
+        "queue": "./metadata/queue.sqlite",
+        "task_timeout": 3600,
+        "lease_seconds": 300,
+    }
+    specs.update(kwargs)
+    return specs
+
+
+def resource_get(url: str) -> bytes:
+    """
+    Return the page saved in comics_net/resources for a url of comics.org, in place
+    of webscraper.simple_get.
+    """
+    path = url.split(URL)[1][1:]
+    if "publisher" in path or "series" in path:
+        name = path.replace("?", "").replace("/", "_").replace("=", "_")
+    else:
+        name = path[:-1].replace("/", "_")
+    with open("./comics_net/resources/{}".format(name), "rb") as f:
+        return f.read()
+
+
+class FakeClock:
+    """
+    A clock that only moves when it is set or something sleeps.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeRedis:
+    """
+    An in-process stand-in for the Redis commands the work queue uses, replying
+    with bytes like a redis-py client.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _bytes(value):
+        return value if isinstance(value, bytes) else str(value).encode("utf-8")
+
+    def _hash(self, name):
+        return self.data.setdefault(name, {})
+
+    def hsetnx(self, name, key, value):
+        with self.lock:
+            if key in self._hash(name):
+                return 0
+            self._hash(name)[key] = self._bytes(value)
+            return 1
+
+    def hset(self, name, key, value):
+        with self.lock:
+            self._hash(name)[key] = self._bytes(value)
+
+    def hget(self, name, key):
+        with self.lock:
+            return self._hash(name).get(key)
+
+    def hdel(self, name, key):
+        with self.lock:
+            return int(self._hash(name).pop(key, None) is not None)
+
+    def hexists(self, name, key):
+        with self.lock:
+            return key in self._hash(name)
+
+    def hlen(self, name):
+        with self.lock:
+            return len(self._hash(name))
+
+    def hincrby(self, name, key, amount):
+        with self.lock:
+            value = int(self._hash(name).get(key, 0)) + amount
+            self._hash(name)[key] = self._bytes(value)
+            return value
+
+    def lpush(self, name, value):
+        with self.lock:
+            self.data.setdefault(name, []).insert(0, self._bytes(value))
+
+    def rpoplpush(self, src, dst):
+        with self.lock:
+            values = self.data.get(src, [])
+            if len(values) == 0:
+                return None
+            value = values.pop()
+            self.data.setdefault(dst, []).insert(0, value)
+            return value
+
+    def lrange(self, name, start, end):
+        with self.lock:
+            values = self.data.get(name, [])
+            return list(values[start : len(values) if end == -1 else end + 1])
+
+    def lrem(self, name, count, value):
+        with self.lock:
+            values = self.data.get(name, [])
+            value = self._bytes(value)
+            if value not in values:
+                return 0
+            values.remove(value)
+            return 1
+
+    def zadd(self, name, mapping):
+        with self.lock:
+            self._hash(name).update(mapping)
+
+    def zrem(self, name, key):
+        with self.lock:
+            return int(self._hash(name).pop(key, None) is not None)
+
+    def zscore(self, name, key):
+        with self.lock:
+            return self._hash(name).get(key)
+
+    def zcard(self, name):
+        return self.hlen(name)
+
+    def zrangebyscore(self, name, min, max):
+        with self.lock:
+            members = sorted(self._hash(name).items(), key=lambda x: x[1])
+            return [self._bytes(key) for key, score in members if score <= max]
+
+    def set(self, name, value):
+        with self.lock:
+            self.data[name] = self._bytes(value)
+
+    def get(self, name):
+        with self.lock:
+            return self.data.get(name)
+
+    def delete(self, name):
+        with self.lock:
+            self.data.pop(name, None)
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """
+    Serve an issue page with an ETag over keep-alive connections, answering
+    conditional GETs with a 304 and paths under /truncated with half a body.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = b"<html><title>Action Comics #854</title></html>"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", '"v1"')
+        if self.path.startswith("/truncated"):
+            self.send_header("Content-Length", str(2 * len(body)))
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        else:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PageServer(ThreadingMixIn, HTTPServer):
+    """
+    A local server of `PageHandler` pages on a free port, recording the path and
+    If-None-Match header of every request.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), PageHandler)
+        self.requests = []
+        self.url = "http://127.0.0.1:{}".format(self.server_port)
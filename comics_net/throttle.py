@@ -0,0 +1,145 @@
+"Per-host rate limiting for requests made to htpps://www.comics.org"
+
+import threading
+import time
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket that refills at `rate` tokens per second up to `burst`.
+
+    Callers take a token per request and sleep off any debt, so concurrent callers
+    queue up behind each other instead of all waking at once. The rate halves
+    (down to `min_rate`) each time the server pushes back and creeps back up to
+    the configured rate as requests succeed.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: float = 1.0,
+        min_rate: Optional[float] = None,
+        backoff: float = 2.0,
+        recovery: float = 1.1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = rate / 16 if min_rate is None else min_rate
+        self.backoff = backoff
+        self.recovery = recovery
+        self.requests = 0
+        self.waited = 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = burst
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """
+        Take a token, sleeping until it is available. Return the time slept.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(-self._tokens / self.rate, self._paused_until - now, 0.0)
+            self.requests += 1
+            self.waited += wait
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def slow_down(self, retry_after: Optional[float] = None) -> None:
+        """
+        Back off after the server pushed back, pausing for `retry_after` seconds if
+        the server said how long to wait.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / self.backoff)
+            if retry_after is not None:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+    def speed_up(self) -> None:
+        """
+        Recover towards the configured rate after a successful request.
+        """
+        with self._lock:
+            self._refill(self._clock())
+            self.rate = min(self.max_rate, self.rate * self.recovery)
+
+
+def parse_retry_after(retry_after: Optional[str]) -> Optional[float]:
+    """
+    Return the seconds to wait from a Retry-After header, if given in seconds.
+    """
+    try:
+        return float(retry_after)  # type: ignore
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Paces every outbound request with a token bucket per host.
+    """
+
+    def __init__(self, rate: float = 2.0, burst: float = 4.0, **kwargs) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.kwargs = kwargs
+        self.buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        """
+        Return the token bucket of the host of `url`.
+        """
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst, **self.kwargs)
+            return self.buckets[host]
+
+    def acquire(self, url: str) -> float:
+        """
+        Wait for our turn to make a request to `url`. Return the time waited.
+        """
+        return self.bucket(url).acquire()
+
+    def update(
+        self, url: str, status_code: int, retry_after: Optional[str] = None
+    ) -> None:
+        """
+        Adapt the pace of requests to the host of `url` to a response status code;
+        slow down on 429 (Too Many Requests) and 5xx, recover otherwise.
+        """
+        if status_code == 429 or status_code >= 500:
+            self.bucket(url).slow_down(parse_retry_after(retry_after))
+        else:
+            self.bucket(url).speed_up()
+
+    def stats(self) -> dict:
+        """
+        Return the current rate, request count and time spent waiting per host.
+        """
+        return {
+            host: {
+                "rate": round(bucket.rate, 3),
+                "requests": bucket.requests,
+                "waited": round(bucket.waited, 3),
+            }
+            for host, bucket in self.buckets.items()
+        }
@@ -1,36 +1,55 @@
 "Methods for scraping comic book covers and metadata from htpps://www.comics.org"
 
 import datetime
+import logging
 import random
 import re
 import urllib.request
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import closing
-from functools import reduce
 from os import path
 from re import search
 from time import sleep
-from typing import List, Optional, Union
+from typing import List, Optional, Set, Tuple, Union
 
-import jsonlines
 import pandas as pd
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer, Tag
+from bs4.builder import builder_registry
 from pandas import DataFrame
-from requests import get
 from requests.exceptions import RequestException
 
+from comics_net.downloader import CoverDownloader
+from comics_net.http_client import get_client
+from comics_net.jsonl import gc_paused, iter_jsonl
+from comics_net.sink import MetadataSink
+
 # gloabl vals
 URL = "https://www.comics.org"
 
+# max number of variant pages of an issue fetched at once
+VARIANT_WORKERS = 8
+
+# bs4 tree builders we can parse pages with, fastest first
+PARSERS = ["lxml", "html.parser"]
+
+# the only tags the extractors read from each kind of page, so only those subtrees
+# are built when parsing it
+STRAINERS = {
+    "publisher": SoupStrainer("td"),
+    "series": SoupStrainer("a"),
+    "gallery": SoupStrainer("a"),
+    "gallery_page": SoupStrainer("a"),
+    "cover": SoupStrainer("div", {"class": "issue_covers"}),
+}
 
-def read_jsonl(path: str) -> List[dict]:
+
+def read_jsonl(path: str, keys: Optional[List[str]] = None) -> List[dict]:
     """
-    Read a jsonlines file and return a list of dicts.
+    Read a jsonlines file and return a list of dicts, with only the given keys. To
+    go through a big file in bounded memory, use jsonl.iter_jsonl instead.
     """
-    data = []
-    with jsonlines.open(path, mode="r") as reader:
-        for item in reader:
-            data.append(item)
-    return data
+    with gc_paused():
+        return list(iter_jsonl(path, keys))
 
 
 def log_error(e):
@@ -44,9 +63,12 @@ def log_error(e):
 
 def simple_get(url: str) -> Union[bytes, None]:
     """
-    Attempts to get the content at `url` by making an HTTP GET request.
-    If the content-type of response is some kind of HTML/XML, return the
-    text content, otherwise return None.
+    Attempts to get the content at `url` by making an HTTP GET request with the
+    shared pooled client. If the content-type of response is some kind of HTML/XML,
+    return the text content, otherwise return None.
+
+    If the client has a response cache, fresh pages are served from disk and stale
+    ones are revalidated with a conditional GET.
     """
 
     def is_good_response(resp):
@@ -60,32 +82,85 @@ def simple_get(url: str) -> Union[bytes, None]:
             and content_type.find("html") > -1
         )
 
+    client = get_client()
+    cache = client.cache
+    entry = None if cache is None else cache.lookup(url)
+
+    headers = {}
+    if cache is not None and entry is not None:
+        if not cache.is_fresh(entry):
+            headers = entry.validators()
+        else:
+            content = cache.hit(entry)
+            if content is not None:
+                return content
+
     try:
-        with closing(get(url, stream=True)) as resp:
-            if is_good_response(resp):
-                return resp.content
-            else:
-                return None
+        while True:
+            with closing(client.get(url, headers=headers, stream=True)) as resp:
+                if resp.status_code == 304 and len(headers) > 0:
+                    content = cache.revalidated(entry)
+                    if content is not None:
+                        return content
+                    # get the page again, unconditionally this time
+                    log_error("Cached body of {0} was evicted".format(url))
+                    headers = {}
+                elif is_good_response(resp):
+                    if cache is not None:
+                        cache.store(url, resp.content, resp.headers)
+                    return resp.content
+                else:
+                    return None
     except RequestException as e:
         log_error("Error during requests to {0} : {1}".format(url, str(e)))
         return None
 
 
+def default_parser() -> str:
+    """
+    Return the fastest of the supported tree builders that is installed.
+    """
+    for parser in PARSERS:
+        if builder_registry.lookup(parser) is not None:
+            return parser
+    return "html.parser"
+
+
+PARSER = default_parser()
+
+
+def set_parser(parser: str) -> None:
+    """
+    Select the tree builder every page is parsed with, e.g. "lxml" or "html.parser".
+    """
+    global PARSER
+    if parser not in PARSERS:
+        raise ValueError(
+            "Unknown parser {}, expected one of {}".format(parser, PARSERS)
+        )
+    if builder_registry.lookup(parser) is None:
+        raise ValueError("Parser {} is not installed".format(parser))
+    PARSER = parser
+
+
 # TODO: deprecate this...
-def transform_simple_get_html(raw_html: Optional[bytes]) -> BeautifulSoup:
+def transform_simple_get_html(
+    raw_html: Optional[bytes], page: Optional[str] = None
+) -> BeautifulSoup:
     """
     Takes the raw HTML response of a GET request and returns a tree-based
-    interface for parsing HTML.
+    interface for parsing HTML. If the kind of `page` is given, only the parts of
+    it the extractors read are parsed.
     """
-    return BeautifulSoup(raw_html, "html.parser")
+    return BeautifulSoup(raw_html, PARSER, parse_only=STRAINERS.get(page))
 
 
-def get_soup(url: str) -> BeautifulSoup:
+def get_soup(url: str, page: Optional[str] = None) -> BeautifulSoup:
     """
     Given a url returns a tree-based interface for parsing HTML.
     """
     html = simple_get(url)
-    return BeautifulSoup(html, "html.parser")
+    return transform_simple_get_html(html, page)
 
 
 # TODO: rename this method
@@ -125,51 +200,77 @@ def get_issue_title(issue_soup: BeautifulSoup) -> str:
     )
 
 
+# ids of the <dd> tags holding the metadata of an issue, in output order
+ISSUE_METADATA_IDS = [
+    "on_sale_date",
+    "indicia_frequency",
+    "issue_indicia_publisher",
+    "issue_brand",
+    "issue_price",
+    "issue_pages",
+    "format_color",
+    "format_dimensions",
+    "format_paper_stock",
+    "format_binding",
+    "format_publishing_format",
+    "rating",
+]
+
+
+def get_dd_value(dd: Tag, name: str) -> str:
+    """
+    Return the value of a metadata <dd> tag; publishers and brands are links.
+    """
+    if (name != "issue_indicia_publisher") & (name != "issue_brand"):
+        return dd.contents[0].strip()
+    else:
+        try:
+            return dd.find("a").contents[0]
+        except:
+            return ""
+
+
 #  TODO: rename name -> key
 def get_issue_metadata(issue_soup: BeautifulSoup, name: str) -> str:
     """
     Return the value of the key
     """
-    if len(issue_soup.find_all("dd", id=name)) > 0:
-        if (name != "issue_indicia_publisher") & (name != "issue_brand"):
-            return issue_soup.find_all("dd", id=name)[0].contents[0].strip()
-        else:
-            try:
-                return issue_soup.find_all("dd", id=name)[0].find("a").contents[0]
-            except:
-                return ""
+    dd = issue_soup.find("dd", id=name)
+    if dd is not None:
+        return get_dd_value(dd, name)
     else:
         return ""
 
 
 def get_all_issue_metadata(issue_soup) -> dict:
+    """
+    Return the metadata, indexer notes and synopsis of an issue, collecting the
+    tags they are read from in a single walk of the page.
+    """
+    dds = dict()
+    paragraphs = []
+    credit_labels = []
+    credit_values = []
+    for tag in issue_soup.find_all(["dd", "p", "span"]):
+        if tag.name == "dd":
+            dds.setdefault(tag.get("id"), tag)
+        elif tag.name == "p":
+            paragraphs.append(tag)
+        else:
+            classes = tag.get("class") or []
+            if "credit_label" in classes:
+                credit_labels.append(tag)
+            if "credit_value" in classes:
+                credit_values.append(tag)
+
     d = dict()
-    d["on_sale_date"] = get_issue_metadata(issue_soup, "on_sale_date")
-    d["indicia_frequency"] = get_issue_metadata(issue_soup, "indicia_frequency")
-    d["issue_indicia_publisher"] = get_issue_metadata(
-        issue_soup, "issue_indicia_publisher"
-    )
-    d["issue_brand"] = get_issue_metadata(issue_soup, "issue_brand")
-    d["issue_price"] = get_issue_metadata(issue_soup, "issue_price")
-    d["issue_pages"] = get_issue_metadata(issue_soup, "issue_pages")
-    d["format_color"] = get_issue_metadata(issue_soup, "format_color")
-    d["format_dimensions"] = get_issue_metadata(issue_soup, "format_dimensions")
-    d["format_paper_stock"] = get_issue_metadata(issue_soup, "format_paper_stock")
-    d["format_binding"] = get_issue_metadata(issue_soup, "format_binding")
-    d["format_publishing_format"] = get_issue_metadata(
-        issue_soup, "format_publishing_format"
-    )
-    d["rating"] = get_issue_metadata(issue_soup, "rating")
+    for name in ISSUE_METADATA_IDS:
+        d[name] = get_dd_value(dds[name], name) if name in dds else ""
     d["indexer_notes"] = " | ".join(
-        [x.contents[0].replace("\n", "").strip() for x in issue_soup.find_all("p")]
+        [x.contents[0].replace("\n", "").strip() for x in paragraphs]
     )
 
-    all_issue_credits = list(
-        zip(
-            issue_soup.find_all("span", {"class": "credit_label"}),
-            issue_soup.find_all("span", {"class": "credit_value"}),
-        )
-    )
+    all_issue_credits = list(zip(credit_labels, credit_values))
 
     try:
         d["synopsis"] = " | ".join(
@@ -217,7 +318,11 @@ def get_issue_cover_metadata(issue_soup):
 
 
 # get image divs from cover page
-def get_cover_credits_from_cover_page(cover_img_soup, metadata) -> dict:
+def get_covers_from_cover_page(cover_img_soup) -> dict:
+    """
+    Return the cover page url and image url of every cover on a cover page, by
+    cover name.
+    """
     cover_divs = cover_img_soup.find_all("div", {"class": "issue_covers"})[0].find_all(
         "div"
     )
@@ -242,63 +347,85 @@ def get_cover_credits_from_cover_page(cover_img_soup, metadata) -> dict:
         covers_dict[name] = {}
         covers_dict[name]["cover_url"] = url
         covers_dict[name]["image_url"] = image
+    return covers_dict
 
-    issue_cover_credits: dict = dict()
-    issue_cover_credits["covers"] = {}
 
-    for variant_name in covers_dict:
-        if is_reprinting(variant_name) | is_newsstand_or_canadian(variant_name):
-            pass
-        else:
-            issue_url = covers_dict[variant_name]["cover_url"]
-            image_url = covers_dict[variant_name]["image_url"]
+def get_variant_names(covers_dict: dict) -> List[str]:
+    """
+    Return the names of the covers worth pulling, skipping reprints, newsstand and
+    canadian editions.
+    """
+    return [
+        x
+        for x in covers_dict
+        if not (is_reprinting(x) | is_newsstand_or_canadian(x))
+    ]
 
-            # get issue page
-            issue_html = simple_get(issue_url)
-            issue_soup = transform_simple_get_html(issue_html)
 
-            cover = issue_soup.find("div", {"class": "cover"})
+def get_variant_cover_credits(
+    issue_soup: BeautifulSoup, metadata: dict, variant_name: str, image_url: str
+) -> Tuple[str, dict]:
+    """
+    Return the cover name and cover credits on the issue page of a variant.
+    """
+    cover = issue_soup.find("div", {"class": "cover"})
 
-            cover_credits_list = list(
-                zip(
-                    [
-                        x.contents[0]
-                        for x in cover.find_all("span", {"class": "credit_label"})
-                    ],
-                    [
-                        x.contents[0]
-                        for x in cover.find_all("span", {"class": "credit_value"})
-                    ],
-                )
-            )
+    cover_credits_list = list(
+        zip(
+            [x.contents[0] for x in cover.find_all("span", {"class": "credit_label"})],
+            [x.contents[0] for x in cover.find_all("span", {"class": "credit_value"})],
+        )
+    )
+
+    issue_title = get_issue_title(issue_soup)
+    issue_title_variant = get_variant_cover_name(issue_title)
 
-            issue_title = get_issue_title(issue_soup)
-            issue_title_variant = get_variant_cover_name(issue_title)
+    cover_credits: dict = {
+        "cover_{}".format(x[0].lower()): x[1] for x in cover_credits_list
+    }
+    cover_credits.pop("cover_reprints", None)
+    cover_credits.pop("cover_awards", None)
 
-            cover_credits: dict = {
-                "cover_{}".format(x[0].lower()): x[1] for x in cover_credits_list
-            }
-            cover_credits.pop("cover_reprints", None)
-            cover_credits.pop("cover_awards", None)
+    save_as = "{}: {} {} ({})".format(
+        metadata["series_name"],
+        strip_brackets(metadata["title"]),
+        variant_name,
+        metadata["on_sale_date"],
+    ).replace("/", "|")
+    # Example of save_as...
+    # Aquaman: Aquaman #2 Direct (1985-11-19)
 
-            save_as = "{}: {} {} ({})".format(
-                metadata["series_name"],
-                strip_brackets(metadata["title"]),
-                variant_name,
-                metadata["on_sale_date"],
-            ).replace("/", "|")
-            # Example of save_as...
-            # Aquaman: Aquaman #2 Direct (1985-11-19)
+    save_to = "./covers/" + save_as + ".jpg"
 
-            save_to = "./covers/" + save_as + ".jpg"
+    # cover_credits["cover_image_file_name"] = save_as
+    cover_credits["save_to"] = save_to
+
+    cover_credits["image_url"] = image_url
+
+    return issue_title_variant, cover_credits
+
+
+def get_cover_credits_from_cover_page(cover_img_soup, metadata) -> dict:
+    covers_dict = get_covers_from_cover_page(cover_img_soup)
 
-            # cover_credits["cover_image_file_name"] = save_as
-            cover_credits["save_to"] = save_to
+    issue_cover_credits: dict = dict()
+    issue_cover_credits["covers"] = {}
 
-            cover_credits["image_url"] = image_url
+    variant_names = get_variant_names(covers_dict)
 
-            issue_cover_credits["covers"][issue_title_variant] = cover_credits
+    # get the issue page of each variant concurrently, keeping variant order
+    variant_urls = [covers_dict[x]["cover_url"] for x in variant_names]
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(VARIANT_WORKERS, len(variant_urls)))
+    ) as executor:
+        issue_soups = list(executor.map(get_soup, variant_urls))
 
+    for variant_name, issue_soup in zip(variant_names, issue_soups):
+        image_url = covers_dict[variant_name]["image_url"]
+        issue_title_variant, cover_credits = get_variant_cover_credits(
+            issue_soup, metadata, variant_name, image_url
+        )
+        issue_cover_credits["covers"][issue_title_variant] = cover_credits
 
     return issue_cover_credits
 
@@ -406,28 +533,70 @@ def is_redundant(title: str) -> bool:
         ) | (("cover" in title.lower()) & ("direct" not in title.lower()))
 
 
-def is_duplicate(title: str, on_sale_date: str, metadata_path: str) -> bool:
+class DuplicateIndex:
     """
-    Check if an issue is a redundant to a direct sale issue.
+    An index of scraped issues keyed by bracket-stripped title and on sale date.
+
+    Build it once per run with `DuplicateIndex.from_jsonl` and `add` each issue as
+    its metadata is written, so duplicate checks are a set lookup instead of a scan
+    over the whole metadata file.
     """
-    metadata = read_jsonl(metadata_path)
-    df = pd.DataFrame(metadata)
-    titles = list(df["title"].unique())
 
-    # check if title is duplicate
-    title_is_duplicate = reduce(
-        lambda x, y: x | y, [strip_brackets(title) in strip_brackets(x) for x in titles]
-    )
+    # keys of the metadata of an issue the index is built from
+    KEYS = ["title", "on_sale_date"]
 
-    # check if
-    if title_is_duplicate:
-        on_sale_dates = df[df["title"].apply(strip_brackets) == strip_brackets(title)][
-            "on_sale_date"
-        ].values
-        date_is_duplicate = on_sale_date in on_sale_dates
-        return title_is_duplicate & date_is_duplicate
-    else:
-        return False
+    def __init__(self) -> None:
+        self._keys: Set[Tuple[str, str]] = set()
+
+    @classmethod
+    def from_jsonl(cls, metadata_path: str) -> "DuplicateIndex":
+        """
+        Build an index from a jsonlines metadata file; a missing file is empty.
+        """
+        index = cls()
+        if path.exists(metadata_path):
+            for item in iter_jsonl(metadata_path, DuplicateIndex.KEYS):
+                index.add(item["title"], item["on_sale_date"])
+        return index
+
+    @staticmethod
+    def key(title: str, on_sale_date: str) -> Tuple[str, str]:
+        """
+        Return the index key of an issue.
+        """
+        return strip_brackets(title), on_sale_date
+
+    def add(self, title: str, on_sale_date: str) -> None:
+        """
+        Add an issue to the index.
+        """
+        self._keys.add(self.key(title, on_sale_date))
+
+    def discard(self, title: str, on_sale_date: str) -> None:
+        """
+        Remove an issue from the index, if it is there.
+        """
+        self._keys.discard(self.key(title, on_sale_date))
+
+    def is_duplicate(self, title: str, on_sale_date: str) -> bool:
+        """
+        Check if an issue with the same title and on sale date is in the index.
+        """
+        return self.key(title, on_sale_date) in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+def is_duplicate(title: str, on_sale_date: str, metadata_path: str) -> bool:
+    """
+    Check if an issue is a redundant to a direct sale issue.
+
+    A title only counts as a duplicate if some scraped title matches it exactly
+    once brackets are stripped and the on sale dates agree, which is what the
+    `DuplicateIndex` key encodes. Prefer a `DuplicateIndex` when checking many issues.
+    """
+    return DuplicateIndex.from_jsonl(metadata_path).is_duplicate(title, on_sale_date)
 
 
 def get_variant_cover_name(cover_name: str) -> str:
@@ -476,3 +645,166 @@ def parse_series_from_publisher_page(publisher_soup:  BeautifulSoup, series: str
         return df
     else:
         return df[df["name"] == series]
+
+
+def get_cover_gallery_href(series_page_soup: BeautifulSoup) -> Optional[str]:
+    """
+    Return the href of the cover gallery linked from a series page, if any.
+    """
+    cover_gallery_link = series_page_soup.find("a", href=True, text="Cover Gallery")
+    if cover_gallery_link is None:
+        return None
+    else:
+        return cover_gallery_link["href"]
+
+
+def get_cover_gallery_page_urls(
+    cover_gallery_href: str, cover_gallery_range: int
+) -> List[str]:
+    """
+    Return the urls of each page of a paginated cover gallery.
+    """
+    return [
+        str(URL + cover_gallery_href + "/?page={}").format(i)
+        for i in range(1, cover_gallery_range + 1)
+    ]
+
+
+def get_issue_urls(cover_gallery_soup: BeautifulSoup) -> List[str]:
+    """
+    Return the non-redundant issue urls from a cover gallery page.
+    """
+    cover_refs = get_non_redundant_hrefs_from_cover_gallery(cover_gallery_soup)
+    return [URL + x[1] for x in cover_refs]
+
+
+def init_issue_metadata(issue_soup: BeautifulSoup, series_name: str) -> dict:
+    """
+    Return the metadata used to identify (and dedup) an issue.
+    """
+    metadata: dict = {}
+    metadata["series_name"] = series_name.replace("/", "|")
+
+    # post process the issue title removing extraneous characters
+    metadata["title"] = get_issue_title(issue_soup)
+    metadata["on_sale_date"] = get_issue_metadata(issue_soup, name="on_sale_date")
+    return metadata
+
+
+def get_issue_cover_url(issue_soup: BeautifulSoup) -> str:
+    """
+    Return the url of the cover page linked from the cover section of an issue page.
+    """
+    issue_cover_section = issue_soup.find("div", {"class": "cover"})
+    issue_cover_href = issue_cover_section.find("div", {"coverImage"}).a["href"]
+    return URL + issue_cover_href
+
+
+def to_plain(value):
+    """
+    Replace the bs4 strings in extracted values with plain strings, as they hold on
+    to the whole tree they came from.
+    """
+    if isinstance(value, dict):
+        return {to_plain(k): to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(to_plain(x) for x in value)
+    if isinstance(value, str):
+        return str(value)
+    return value
+
+
+def parse_issue_page(raw_html: bytes, series_name: str) -> Tuple[dict, str]:
+    """
+    Parse the raw HTML of an issue page into the metadata on it and the url of its
+    cover page.
+    """
+    issue_soup = transform_simple_get_html(raw_html)
+    metadata = init_issue_metadata(issue_soup, series_name)
+    metadata.update(get_all_issue_metadata(issue_soup))
+    return to_plain((metadata, get_issue_cover_url(issue_soup)))
+
+
+def parse_cover_page(raw_html: bytes) -> dict:
+    """
+    Parse the raw HTML of a cover page into its covers, by cover name.
+    """
+    return to_plain(
+        get_covers_from_cover_page(transform_simple_get_html(raw_html, "cover"))
+    )
+
+
+def parse_variant_page(
+    raw_html: bytes, metadata: dict, variant_name: str, image_url: str
+) -> Tuple[str, dict]:
+    """
+    Parse the raw HTML of the issue page of a variant into its cover name and
+    cover credits.
+    """
+    return to_plain(
+        get_variant_cover_credits(
+            transform_simple_get_html(raw_html), metadata, variant_name, image_url
+        )
+    )
+
+
+def save_cover_images(metadata: dict, downloader: CoverDownloader) -> List[Future]:
+    """
+    Queue the download of the image of every cover in the metadata.
+    """
+    return downloader.submit_all(
+        [(x["image_url"], x["save_to"]) for x in metadata["covers"].values()]
+    )
+
+
+def save_metadata(metadata: dict, metadata_path: str) -> None:
+    """
+    Append the issue metadata to a jsonlines metadata file. To save many issues,
+    keep a MetadataSink open instead.
+    """
+    with MetadataSink(metadata_path) as sink:
+        sink.write(metadata)
+
+
+def get_issue_details(issue_soup: BeautifulSoup, metadata: dict) -> dict:
+    """
+    Add the metadata on the issue page and the credits and image urls of its covers
+    to the metadata of an issue.
+    """
+    # get metadata from issue page
+    metadata.update(get_all_issue_metadata(issue_soup))
+
+    # get cover page
+    issue_cover_soup = get_soup(get_issue_cover_url(issue_soup), "cover")
+
+    # get image urls from cover page
+    cover_credits = get_cover_credits_from_cover_page(issue_cover_soup, metadata)
+
+    metadata.update(cover_credits)
+    return metadata
+
+
+def scrape_issue(
+    issue_url: str, series_name: str, dedup_index: DuplicateIndex
+) -> Optional[dict]:
+    """
+    Scrape the metadata of an issue and claim it in the dedup index, unless it is
+    a duplicate of an issue we already pulled. Return the metadata, if any.
+    """
+    # get issue page
+    issue_soup = get_soup(issue_url)
+
+    metadata = init_issue_metadata(issue_soup, series_name)
+
+    logging.info("Scraping {} from {}".format(metadata["title"], issue_url))
+
+    # check if issue is redundant to an issue  already we pulled (variant)
+    if dedup_index.is_duplicate(metadata["title"], metadata["on_sale_date"]):
+        logging.info("Not pulling {} because it is a duplicate".format(metadata["title"]))
+        return None
+
+    get_issue_details(issue_soup, metadata)
+
+    dedup_index.add(metadata["title"], metadata["on_sale_date"])
+
+    return metadata
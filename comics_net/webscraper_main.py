@@ -4,16 +4,198 @@ import argparse
 import configparser
 import datetime
 import logging
+import multiprocessing
 import os
 import pickle
-import random
-import urllib
-from time import sleep
+import sys
+from collections import deque
+from concurrent.futures import Future
+from functools import partial
+from typing import Deque, List, Optional, Tuple
 from uuid import uuid4
 
-import jsonlines
-
+import comics_net.async_scraper as async_scraper
+import comics_net.http_client as http_client
+import comics_net.jobs as jobs
 import comics_net.webscraper as webscraper
+from comics_net.cache import ResponseCache
+from comics_net.downloader import CoverDownloader
+from comics_net.distributed import Coordinator, Worker
+from comics_net.frontier import Frontier, Item, expand
+from comics_net.jsonl import iter_jsonl
+from comics_net.parse_pool import ParsePool
+from comics_net.pipeline import IssuePipeline
+from comics_net.queues import WorkQueue, open_queue
+from comics_net.sink import MetadataSink
+from comics_net.store import MetadataStore
+from comics_net.throttle import RateLimiter
+
+
+# init global vals
+URL = "https://www.comics.org"
+METADATA_PATH = "./metadata/covers.jsonl"
+FRONTIER_PATH = "./metadata/frontier.sqlite"
+
+
+def log_client_stats(client: http_client.HTTPClient) -> None:
+    """
+    Log the connection pool, rate limiting and cache stats of the HTTP client.
+    """
+    logging.info("HTTP connection pool stats = {}".format(client.stats()))
+    if client.rate_limiter is not None:
+        logging.info("HTTP rate limit stats = {}".format(client.rate_limiter.stats()))
+    if client.cache is not None:
+        logging.info("HTTP cache stats = {}".format(client.cache.stats()))
+
+
+def configure(specs: dict, workers: int = 1) -> http_client.HTTPClient:
+    """
+    Configure the HTML parser, the page cache and the shared HTTP client per the job
+    specs, splitting the politeness budget between `workers` processes.
+    """
+    # parse pages with the selected tree builder
+    if specs["parser"]:
+        webscraper.set_parser(specs["parser"])
+
+    # cache pages on disk so re-crawls only revalidate them
+    if specs["cache_dir"]:
+        cache = ResponseCache(
+            specs["cache_dir"],
+            max_bytes=int(specs["cache_max_mb"]) * 1024 ** 2,
+            replay=specs["cache_replay"],
+        )
+    else:
+        cache = None
+
+    # share one pooled HTTP client across every page and image request, pacing
+    # the requests to each host with a token bucket
+    return http_client.configure(
+        pool_maxsize=int(specs["pool_maxsize"]),
+        timeout=float(specs["timeout"]),
+        rate_limiter=RateLimiter(
+            rate=float(specs["max_rps"]) / workers,
+            burst=max(1.0, float(specs["burst"]) / workers),
+        ),
+        cache=cache,
+    )
+
+
+def configure_logging() -> None:
+    """
+    Log to stdout.
+    """
+    # TODO: refactor this...
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setLevel(logging.INFO)
+    root.addHandler(handler)
+
+
+def start_crawl(frontier: Frontier, root: Item, resume: bool) -> None:
+    """
+    Queue the crawl from a publisher page, or pick up where it stopped.
+    """
+    publisher_url, kind, payload = root
+    if resume:
+        frontier.resume(publisher_url)
+    else:
+        frontier.reset(publisher_url)
+    frontier.add(publisher_url, kind, payload, root=publisher_url)
+
+
+def crawl_with_engine(
+    specs: dict,
+    root: str,
+    frontier: Frontier,
+    dedup_index: webscraper.DuplicateIndex,
+    downloader: CoverDownloader,
+    metadata_path: str,
+) -> None:
+    """
+    Crawl the frontier from `root` with the engine selected in the job specs.
+    """
+    store = MetadataStore(specs["store"]) if specs["store"] else None
+    if specs["engine"] == "async":
+        parse_pool = ParsePool(int(specs["parse_processes"]))
+        try:
+            async_scraper.run_async_scraper(
+                root,
+                frontier,
+                dedup_index,
+                downloader,
+                metadata_path,
+                concurrency=int(specs["concurrency"]),
+                parse_pool=parse_pool,
+                store=store,
+            )
+        finally:
+            parse_pool.close()
+    elif specs["engine"] == "distributed":
+        coordinator = Coordinator(
+            open_queue(specs["queue"]),
+            frontier,
+            dedup_index,
+            metadata_path,
+            store=store,
+            task_timeout=float(specs["task_timeout"]),
+        )
+        coordinator.run(root)
+    elif specs["engine"] == "pipeline":
+        parse_pool = ParsePool(int(specs["parse_processes"]))
+        try:
+            pipeline = IssuePipeline(
+                frontier,
+                dedup_index,
+                downloader,
+                metadata_path,
+                fetch_workers=int(specs["fetch_workers"]),
+                parse_workers=int(specs["parse_workers"]),
+                max_in_flight=int(specs["max_in_flight"]),
+                parse_pool=parse_pool,
+                store=store,
+            )
+            pipeline.run(root)
+        finally:
+            parse_pool.close()
+    else:
+        crawl(root, frontier, dedup_index, downloader, metadata_path, store)
+
+
+def open_work_queue(specs: dict) -> Optional[WorkQueue]:
+    """
+    Open the work queue of a distributed crawl, emptied unless the crawl resumes.
+    """
+    if specs["engine"] != "distributed":
+        return None
+    queue = open_queue(specs["queue"])
+    if specs["resume"]:
+        queue.reopen()
+    else:
+        queue.clear()
+    return queue
+
+
+def run_worker(specs: dict) -> None:
+    """
+    Work on the tasks of a distributed crawl until its coordinator is done.
+    """
+    client = configure(specs)
+    configure_logging()
+
+    downloader = CoverDownloader(
+        client,
+        workers=int(specs["download_workers"]),
+        retries=int(specs["download_retries"]),
+    )
+    worker = Worker(
+        open_queue(specs["queue"]), downloader, float(specs["lease_seconds"])
+    )
+    logging.info("Working on tasks from {}".format(specs["queue"]))
+    done = worker.run()
+    downloader.close()
+    logging.info("Done {} task(s)".format(done))
+    log_client_stats(client)
 
 
 def run_scraper(specs: dict) -> None:
@@ -26,8 +208,16 @@ def run_scraper(specs: dict) -> None:
     ###############################################################
 
     # persist job specs to file
-    with jsonlines.open("./metadata/log.jsonl", mode="a") as writer:
-        writer.write(specs)
+    with MetadataSink("./metadata/log.jsonl") as sink:
+        sink.write(specs)
+
+    if specs["worker"]:
+        run_worker(specs)
+        return
+
+    if specs["jobs"]:
+        run_jobs(specs)
+        return
 
     # unpack job specs
     publisher_id = specs["publisher_id"]
@@ -35,363 +225,366 @@ def run_scraper(specs: dict) -> None:
     issue_count = int(specs["issue_count"])
     series = specs["series"]
 
-    # init global vals
-    URL = "https://www.comics.org"
-    publisher_url = (
-        URL + "/publisher/{}/".format(publisher_id) + "?page={}".format(publisher_page)
-    )
+    client = configure(specs)
+
+    publisher_url = jobs.get_publisher_url(publisher_id, publisher_page)
 
     ###############################################################
     # Configure logger
     ###############################################################
 
-    # TODO: refactor this...
-    root = logging.getLogger()
-    root.setLevel(logging.INFO)
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setLevel(logging.INFO)
-    root.addHandler(handler)
+    configure_logging()
 
     logging.info("Starting scraper on page {}".format(publisher_url))
 
-    # get publisher page
-    publisher_soup = webscraper.get_soup(publisher_url)
+    # load the index of issues we already pulled once, then keep it up to date
+    dedup_index = webscraper.DuplicateIndex.from_jsonl(METADATA_PATH)
 
-    # parse series table from publisher page
-    series_df = webscraper.parse_series_from_publisher_page(publisher_soup, series)
+    # queue the crawl from the publisher page, or pick up where it stopped
+    frontier = Frontier(FRONTIER_PATH)
+    start_crawl(
+        frontier,
+        (publisher_url, "publisher", {"series": series, "issue_count": issue_count}),
+        specs["resume"],
+    )
 
-    # iterate over series dataframe and get issue covers and metadata
-    for series_name, series_page_href, issue_count_int in zip(
-        series_df["name"], series_df["href"], series_df["issue_count_int"]
-    ):
-        if issue_count_int < issue_count:
-            pass
-        else:
-            # construct series page url
-            series_page_url = URL + series_page_href
-
-            # log series info to stdout
-            logging.info(
-                "Scraping {} issue(s) of {} from {}".format(
-                    issue_count_int, series_name, series_page_url
-                )
-            )
+    # download cover images on a pool of their own, in the background
+    downloader = CoverDownloader(
+        client,
+        workers=int(specs["download_workers"]),
+        retries=int(specs["download_retries"]),
+    )
 
-            # get series page
-            series_page_soup = webscraper.get_soup(series_page_url)
+    queue = open_work_queue(specs)
+    crawl_with_engine(
+        specs, publisher_url, frontier, dedup_index, downloader, METADATA_PATH
+    )
+    if queue is not None:
+        # let the workers go
+        queue.close()
+        logging.info("Work queue stats = {}".format(queue.stats()))
 
-            # get cover gallery url for series
-            if series_page_soup.find("a", href=True, text="Cover Gallery") is None:
-                logging.info("No cover gallery found at {}".format(series_page_url))
-                pass
-            else:
-                cover_gallery_href = series_page_soup.find(
-                    "a", href=True, text="Cover Gallery"
-                )["href"]
-                cover_gallery_url = URL + cover_gallery_href
+    downloader.close()
+    logging.info("Cover download stats = {}".format(downloader.stats()))
+    logging.info("Frontier stats = {}".format(frontier.counts(publisher_url)))
+    frontier.close()
+    log_client_stats(client)
 
-                logging.info("Cover gallery url = {}".format(cover_gallery_url))
 
-                # get cover gallery page
-                cover_gallery_soup = webscraper.get_soup(cover_gallery_url)
+# state of a job worker process, see init_job_worker
+_worker: dict = {}
 
-                # if cover gallery for series is not paginated...
-                if webscraper.cover_gallery_pages(cover_gallery_soup) == 1:
-                    cover_refs = webscraper.get_non_redundant_hrefs_from_cover_gallery(
-                        cover_gallery_soup
-                    )
 
-                    # construct non-redundant issue urls from hrefs
-                    issue_hrefs = [x[1] for x in cover_refs]
-                    issue_urls = [URL + issue_href for issue_href in issue_hrefs]
-
-                    # scrape issues
-                    for issue_url in issue_urls:
-
-                        # get issue page
-                        issue_soup = webscraper.get_soup(issue_url)
-
-                        # metadata
-                        metadata = {}
-                        metadata["series_name"] = series_name.replace("/", "|")
-
-                        # post process the issue title removing extraneous characters
-                        metadata["title"] = webscraper.get_issue_title(issue_soup)
-                        metadata["on_sale_date"] = webscraper.get_issue_metadata(
-                            issue_soup, name="on_sale_date"
-                        )
-
-                        logging.info(
-                            "Scraping {} from {}".format(metadata["title"], issue_url)
-                        )
-                        # check if issue is redundant to an issue  already we pulled (variant)
-                        if os.path.exists("./metadata/covers.jsonl"):
-                            is_duplicate = webscraper.is_duplicate(
-                                title=metadata["title"],
-                                on_sale_date=metadata["on_sale_date"],
-                                metadata_path="./metadata/covers.jsonl",
-                            )
-
-                            if is_duplicate:
-                                logging.info(
-                                    "Not pulling {} because it is a duplicate".format(
-                                        metadata["title"]
-                                    )
-                                )
-                                pass
-                            else:
-                                # get metadata from issue page
-                                issue_metadata = webscraper.get_all_issue_metadata(
-                                    issue_soup
-                                )
-
-                                # update metadata
-                                metadata.update(issue_metadata)
-
-                                # get the cover url
-                                issue_cover_section = issue_soup.find(
-                                    "div", {"class": "cover"}
-                                )
-
-                                issue_cover_href = issue_cover_section.find(
-                                    "div", {"coverImage"}
-                                ).a["href"]
-                                issue_cover_url = URL + issue_cover_href
-
-                                # get cover page
-                                issue_cover_soup = webscraper.get_soup(issue_cover_url)
-
-                                cover_credits = webscraper.get_cover_credits_from_cover_page(
-                                    issue_cover_soup, metadata
-                                )
-
-                                metadata.update(cover_credits)
-
-                                # save cover images
-                                for variant_name in metadata["covers"]:
-                                    urllib.request.urlretrieve(
-                                        metadata["covers"][variant_name]["image_url"],
-                                        metadata["covers"][variant_name]["save_to"],
-                                    )
-
-                                # save metadata
-                                with jsonlines.open(
-                                    "./metadata/covers.jsonl", mode="a"
-                                ) as writer:
-                                    writer.write(metadata)
-
-                                # slow down the requests
-                                sleep(random.uniform(1, 2))
-
-                        else:
-                            # get metadata from issue page
-                            issue_metadata = webscraper.get_all_issue_metadata(
-                                issue_soup
-                            )
-
-                            # update metadata
-                            metadata.update(issue_metadata)
-
-                            # get the cover url
-                            issue_cover_section = issue_soup.find(
-                                "div", {"class": "cover"}
-                            )
-
-                            issue_cover_href = issue_cover_section.find(
-                                "div", {"coverImage"}
-                            ).a["href"]
-                            issue_cover_url = URL + issue_cover_href
-
-                            # get cover page
-                            issue_cover_soup = webscraper.get_soup(issue_cover_url)
-
-                            # get image urls from cover page
-                            cover_credits = webscraper.get_cover_credits_from_cover_page(
-                                issue_cover_soup, metadata
-                            )
-
-                            metadata.update(cover_credits)
-
-                            # save cover images
-                            for variant_name in metadata["covers"]:
-                                urllib.request.urlretrieve(
-                                    metadata["covers"][variant_name]["image_url"],
-                                    metadata["covers"][variant_name]["save_to"],
-                                )
-
-                            # save metadata
-                            with jsonlines.open(
-                                "./metadata/covers.jsonl", mode="a"
-                            ) as writer:
-                                writer.write(metadata)
-
-                            # slow down the requests
-                            sleep(random.uniform(1, 2))
-
-                # if cover gallery for series is paginated...
-                elif webscraper.cover_gallery_pages(cover_gallery_soup) > 1:
-
-                    cover_gallery_range = webscraper.cover_gallery_pages(
-                        cover_gallery_soup
+def init_job_worker(specs: dict, workers: int) -> None:
+    """
+    Set up the shared client, frontier and cover downloader of a job worker.
+    """
+    client = configure(specs, workers)
+    _worker["specs"] = specs
+    _worker["frontier"] = Frontier(FRONTIER_PATH)
+    _worker["downloader"] = CoverDownloader(
+        client,
+        workers=int(specs["download_workers"]),
+        retries=int(specs["download_retries"]),
+    )
+
+
+def run_job(root: str) -> Tuple[str, dict]:
+    """
+    Crawl the frontier from a publisher page into its own metadata shard. Return
+    the page and the frontier stats of its crawl.
+    """
+    shard_path = jobs.shard_path(root)
+
+    # issues already pulled are in the merged metadata, or in the shard of this
+    # page if an earlier run of it was interrupted
+    dedup_index = webscraper.DuplicateIndex.from_jsonl(METADATA_PATH)
+    if os.path.exists(shard_path):
+        for item in iter_jsonl(shard_path, webscraper.DuplicateIndex.KEYS):
+            dedup_index.add(item["title"], item["on_sale_date"])
+
+    logging.info("Starting scraper on page {}".format(root))
+    crawl_with_engine(
+        _worker["specs"],
+        root,
+        _worker["frontier"],
+        dedup_index,
+        _worker["downloader"],
+        shard_path,
+    )
+    return root, _worker["frontier"].counts(root)
+
+
+def run_jobs(specs: dict) -> None:
+    """
+    Crawl every publisher page of the job specs file, sharded across worker
+    processes that share the frontier, then merge their metadata in job order.
+    """
+    configure_logging()
+
+    roots = jobs.get_roots(jobs.read_job_specs(specs["jobs"]))
+    workers = max(1, min(int(specs["workers"]), len(roots)))
+    logging.info(
+        "Crawling {} publisher page(s) with {} worker(s)".format(len(roots), workers)
+    )
+
+    # queue every crawl before forking, so the workers only take from the frontier
+    frontier = Frontier(FRONTIER_PATH)
+    for root in roots:
+        start_crawl(frontier, root, specs["resume"])
+    frontier.close()
+    os.makedirs(jobs.SHARD_DIR, exist_ok=True)
+
+    root_urls = [root[0] for root in roots]
+    queue = open_work_queue(specs)
+    with multiprocessing.Pool(
+        workers, initializer=init_job_worker, initargs=(specs, workers)
+    ) as pool:
+        for root, counts in pool.imap_unordered(run_job, root_urls):
+            logging.info("Finished {} with frontier stats = {}".format(root, counts))
+    if queue is not None:
+        queue.close()
+
+    merged = jobs.merge_shards(root_urls, METADATA_PATH)
+    logging.info("Merged {} shard(s) into {}".format(merged, METADATA_PATH))
+
+
+def save_downloaded(
+    pending: Deque[Tuple[str, dict, List[Future]]],
+    frontier: Frontier,
+    dedup_index: webscraper.DuplicateIndex,
+    sink: MetadataSink,
+    max_pending: int = 0,
+) -> None:
+    """
+    Save the metadata of the issues at the head of `pending` whose cover images
+    are downloaded, in crawl order, waiting on the head while more than
+    `max_pending` issues are queued.
+    """
+    while len(pending) > 0 and (
+        len(pending) > max_pending or all(x.done() for x in pending[0][2])
+    ):
+        issue_url, metadata, downloads = pending.popleft()
+        try:
+            for download in downloads:
+                download.result()
+        except Exception as e:
+            logging.exception("Failed to download the covers of {}".format(issue_url))
+            frontier.fail(issue_url, repr(e))
+            dedup_index.discard(metadata["title"], metadata["on_sale_date"])
+        else:
+            sink.write(metadata, partial(frontier.done, issue_url))
+
+
+def crawl(
+    root: str,
+    frontier: Frontier,
+    dedup_index: webscraper.DuplicateIndex,
+    downloader: CoverDownloader,
+    metadata_path: str = METADATA_PATH,
+    store: Optional[MetadataStore] = None,
+) -> None:
+    """
+    Crawl the frontier from `root` one url after another, depth first, while the
+    cover images of the issues scraped download in the background. Metadata is
+    written in batches (and appended to the metadata store, if given), and an issue
+    is only marked done once its metadata is.
+    """
+    pending: Deque[Tuple[str, dict, List[Future]]] = deque()
+    with MetadataSink(metadata_path, store=store) as sink:
+        item = frontier.next(root)
+        while item is not None:
+            url, kind, payload = item
+            try:
+                if kind == "issue":
+                    # scrape non-redundant issues
+                    metadata = webscraper.scrape_issue(
+                        url, payload["series_name"], dedup_index
                     )
+                    if metadata is None:
+                        frontier.done(url)
+                    else:
+                        downloads = webscraper.save_cover_images(metadata, downloader)
+                        pending.append((url, metadata, downloads))
+                else:
+                    soup = webscraper.get_soup(url, kind)
+                    frontier.done(url, expand(url, kind, payload, soup))
+            except Exception as e:
+                logging.exception("Failed to crawl {}".format(url))
+                frontier.fail(url, repr(e))
+
+            save_downloaded(
+                pending, frontier, dedup_index, sink, 2 * downloader.workers
+            )
+            item = frontier.next(root)
 
-                    logging.info("Cover gallery range = {}".format(cover_gallery_range))
-
-                    # iterate over cover gallery pages
-                    for i in range(1, cover_gallery_range + 1):
-                        cover_gallery_url = str(
-                            URL + cover_gallery_href + "/?page={}"
-                        ).format(i)
-
-                        logging.info("Cover gallery url = {}".format(cover_gallery_url))
-
-                        cover_gallery_soup = webscraper.get_soup(cover_gallery_url)
-
-                        # get non-redundnat issue hrefs from cover gallery
-                        cover_refs = webscraper.get_non_redundant_hrefs_from_cover_gallery(
-                            cover_gallery_soup
-                        )
-
-                        # construct non-redundant issue urls from hrefs
-                        issue_hrefs = [x[1] for x in cover_refs]
-                        issue_urls = [URL + issue_href for issue_href in issue_hrefs]
-
-                        # scrape issues
-                        for issue_url in issue_urls:
-
-                            # get issue page
-                            issue_soup = webscraper.get_soup(issue_url)
-
-                            # metadata
-                            metadata = {}
-                            metadata["series_name"] = series_name.replace("/", "|")
-
-                            # post process the issue title removing extraneous characters
-                            metadata["title"] = webscraper.get_issue_title(issue_soup)
-                            metadata["on_sale_date"] = webscraper.get_issue_metadata(
-                                issue_soup, name="on_sale_date"
-                            )
-
-                            logging.info(
-                                "Scraping {} from {}".format(
-                                    metadata["title"], issue_url
-                                )
-                            )
-                            # check if issue is redundant to an issue  already we pulled (variant)
-                            if os.path.exists("./metadata/covers.jsonl"):
-                                is_duplicate = webscraper.is_duplicate(
-                                    title=metadata["title"],
-                                    on_sale_date=metadata["on_sale_date"],
-                                    metadata_path="./metadata/covers.jsonl",
-                                )
-
-                                if is_duplicate:
-                                    logging.info(
-                                        "{} is duplicate".format(metadata["title"])
-                                    )
-                                    pass
-                                else:
-                                    # get metadata from issue page
-                                    issue_metadata = webscraper.get_all_issue_metadata(
-                                        issue_soup
-                                    )
-
-                                    # update metadata
-                                    metadata.update(issue_metadata)
-
-                                    # get the cover url
-                                    issue_cover_section = issue_soup.find(
-                                        "div", {"class": "cover"}
-                                    )
-
-                                    issue_cover_href = issue_cover_section.find(
-                                        "div", {"coverImage"}
-                                    ).a["href"]
-                                    issue_cover_url = URL + issue_cover_href
-
-                                    # get cover page
-                                    issue_cover_soup = webscraper.get_soup(
-                                        issue_cover_url
-                                    )
-
-                                    cover_credits = webscraper.get_cover_credits_from_cover_page(
-                                        issue_cover_soup, metadata
-                                    )
-
-                                    metadata.update(cover_credits)
-
-                                    # save cover images
-                                    for variant_name in metadata["covers"]:
-                                        urllib.request.urlretrieve(
-                                            metadata["covers"][variant_name][
-                                                "image_url"
-                                            ],
-                                            metadata["covers"][variant_name]["save_to"],
-                                        )
-
-                                    # save metadata
-                                    with jsonlines.open(
-                                        "./metadata/covers.jsonl", mode="a"
-                                    ) as writer:
-                                        writer.write(metadata)
-
-                                    # slow down the requests
-                                    sleep(random.uniform(1, 2))
-
-                            else:
-                                # get metadata from issue page
-                                issue_metadata = webscraper.get_all_issue_metadata(
-                                    issue_soup
-                                )
-
-                                # update metadata
-                                metadata.update(issue_metadata)
-
-                                # get the cover url
-                                issue_cover_section = issue_soup.find(
-                                    "div", {"class": "cover"}
-                                )
-
-                                issue_cover_href = issue_cover_section.find(
-                                    "div", {"coverImage"}
-                                ).a["href"]
-                                issue_cover_url = URL + issue_cover_href
-
-                                # get cover page soup
-                                issue_cover_soup = webscraper.get_soup(issue_cover_url)
-
-                                cover_credits = webscraper.get_cover_credits_from_cover_page(
-                                    issue_cover_soup, metadata
-                                )
-
-                                metadata.update(cover_credits)
-
-                                # save cover images
-                                for variant_name in metadata["covers"]:
-                                    urllib.request.urlretrieve(
-                                        metadata["covers"][variant_name]["image_url"],
-                                        metadata["covers"][variant_name]["save_to"],
-                                    )
-
-                                # save metadata
-                                with jsonlines.open(
-                                    "./metadata/covers.jsonl", mode="a"
-                                ) as writer:
-                                    writer.write(metadata)
-
-                                # slow down the requests
-                                sleep(random.uniform(1, 2))
+        save_downloaded(pending, frontier, dedup_index, sink)
 
 
 def main(main_args):
     parser = argparse.ArgumentParser()
 
-    parser.add_argument("--publisher_id", required=True, help="")
-    parser.add_argument("--publisher_page", required=True, help="")
+    parser.add_argument("--publisher_id", required=False, help="")
+    parser.add_argument("--publisher_page", required=False, help="")
     parser.add_argument("--issue_count", required=False, help="")
     parser.add_argument("--series", required=False, help="")
+    parser.add_argument(
+        "--pool_maxsize",
+        required=False,
+        default=4,
+        help="max number of pooled connections per host",
+    )
+    parser.add_argument(
+        "--timeout", required=False, default=30, help="HTTP request timeout in seconds"
+    )
+    parser.add_argument(
+        "--engine",
+        required=False,
+        default="sync",
+        choices=["sync", "async", "pipeline", "distributed"],
+        help="crawl issues one after another (sync), concurrently (async), in "
+        "stages on threads (pipeline) or with --worker processes (distributed), "
+        "each pacing its own requests",
+    )
+    parser.add_argument(
+        "--concurrency",
+        required=False,
+        default=4,
+        help="max number of requests in flight with --engine async",
+    )
+    parser.add_argument(
+        "--fetch_workers",
+        required=False,
+        default=4,
+        help="number of issue and cover pages to fetch at once with --engine pipeline",
+    )
+    parser.add_argument(
+        "--parse_workers",
+        required=False,
+        default=2,
+        help="number of issue pages to parse at once with --engine pipeline",
+    )
+    parser.add_argument(
+        "--max_in_flight",
+        required=False,
+        default=16,
+        help="max number of issues between stages with --engine pipeline",
+    )
+    parser.add_argument(
+        "--parse_processes",
+        required=False,
+        default=0,
+        help="number of processes to parse pages on with --engine async or pipeline, "
+        "or 0 to parse them on the crawl's threads",
+    )
+    parser.add_argument(
+        "--max_rps",
+        required=False,
+        default=2,
+        help="max requests per second to each host",
+    )
+    parser.add_argument(
+        "--burst",
+        required=False,
+        default=4,
+        help="max number of requests to each host sent at once before pacing",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        required=False,
+        default="./http_cache",
+        help="directory to cache pages in, or empty to not cache pages",
+    )
+    parser.add_argument(
+        "--cache_max_mb",
+        required=False,
+        default=1024,
+        help="max size of the cached pages in MB",
+    )
+    parser.add_argument(
+        "--cache_replay",
+        action="store_true",
+        help="serve cached pages without revalidating them",
+    )
+
+    parser.add_argument(
+        "--store",
+        required=False,
+        default="",
+        help="directory of a Parquet metadata store to also write the metadata to, "
+        "or empty to only write covers.jsonl (needs pyarrow)",
+    )
+
+    parser.add_argument(
+        "--download_workers",
+        required=False,
+        default=4,
+        help="number of cover images to download at once",
+    )
+    parser.add_argument(
+        "--download_retries",
+        required=False,
+        default=3,
+        help="number of times to retry a failed cover image download",
+    )
+    parser.add_argument(
+        "--parser",
+        required=False,
+        default=None,
+        choices=webscraper.PARSERS,
+        help="HTML parser to use, defaults to the fastest one installed",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="resume the last crawl of the publisher page instead of starting over",
+    )
+
+    parser.add_argument(
+        "--jobs",
+        required=False,
+        default=None,
+        help="jsonlines file of publishers and page ranges to crawl instead of one "
+        "publisher page",
+    )
+    parser.add_argument(
+        "--workers",
+        required=False,
+        default=os.cpu_count(),
+        help="number of worker processes to shard the --jobs crawl across",
+    )
+
+    parser.add_argument(
+        "--worker",
+        action="store_true",
+        help="work on the tasks of a distributed crawl instead of crawling",
+    )
+    parser.add_argument(
+        "--queue",
+        required=False,
+        default="./metadata/queue.sqlite",
+        help="work queue of a distributed crawl, an SQLite file or redis://host:port",
+    )
+    parser.add_argument(
+        "--lease_seconds",
+        required=False,
+        default=300,
+        help="seconds a worker has to finish a task before it is handed out again",
+    )
+    parser.add_argument(
+        "--task_timeout",
+        required=False,
+        default=3600,
+        help="seconds the coordinator waits on a task before failing its issue",
+    )
 
     args = parser.parse_args(main_args[1:])
+    if (
+        not args.worker
+        and args.jobs is None
+        and (args.publisher_id is None or args.publisher_page is None)
+    ):
+        parser.error("--publisher_id and --publisher_page are required without --jobs")
 
     specs = {i: args.__getattribute__(i) for i in args.__dir__() if i[0] != "_"}
 
@@ -399,6 +592,4 @@ def main(main_args):
 
 
 if __name__ == "__main__":
-    import sys
-
     sys.exit(main(sys.argv))